@@ -1,4 +1,6 @@
-from Modules.MainNodeClient import MainNodeClient, ImportantNodesDisconnected
+from Modules.MainNodeClient import MainNodeClient, \
+    ImportantNodesDisconnected, WORKERS
+from Modules.connection_pool import POOL_SIZE
 import argparse
 import struct
 import socket
@@ -6,6 +8,7 @@ import shlex
 from Modules.socket_controller import recv
 
 MAX_GROUP_LENGTH = 4
+LIST_PAGE = 1000
 
 
 def get_user_parser():
@@ -18,6 +21,18 @@ def get_user_parser():
                         help='reads value by KEY')
     parser.add_argument('-e', '--empty', metavar='KEY',
                         help='deletes value by KEY')
+    parser.add_argument('-l', '--list', action='store_true', default=False,
+                        help='prints one page of keys in sorted order')
+    parser.add_argument('--prefix', metavar='PREFIX', default='',
+                        help='if used with -l, prints only keys which start '
+                             'with PREFIX')
+    parser.add_argument('--start_after', metavar='KEY', default=None,
+                        help='if used with -l, prints keys which follow KEY '
+                             '(the last key of previous page)')
+    parser.add_argument('--limit', metavar='COUNT', type=int,
+                        default=LIST_PAGE,
+                        help=f'if used with -l, prints at most COUNT keys '
+                             f'({LIST_PAGE} by default)')
     return parser
 
 
@@ -39,8 +54,10 @@ def get_administrator_parser():
 
 
 class MainServer:
-    def __init__(self, directory, host_port, create_new=False):
-        self.client = MainNodeClient(directory, create_new)
+    def __init__(self, directory, host_port, create_new=False,
+                 pool_size=POOL_SIZE, workers=WORKERS):
+        self.client = MainNodeClient(directory, create_new, pool_size,
+                                     workers)
         self.socket = socket.socket()
         self.socket.bind(host_port)
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -89,10 +106,12 @@ class MainServer:
             result = self.process_args(args)
         except ImportantNodesDisconnected as e:
             result = str(e)
-        if result is None:
-            self._send(connection, '')
-            return
-        self._send(connection, result)
+        if isinstance(result, list):
+            for line in result:
+                self._send(connection, line)
+        elif result is not None:
+            self._send(connection, result)
+        self._send(connection, '')
 
     def process_args(self, args):
         try:
@@ -107,6 +126,9 @@ class MainServer:
             elif args.empty is not None:
                 self.client.delete_key(args.empty)
                 return None
+            elif args.list:
+                return self.client.scan(args.prefix, args.start_after,
+                                        args.limit)
             elif args.connect is not None:
                 self.client.connect_to_node(int(args.connect[0]))
                 return None
@@ -146,6 +168,14 @@ if __name__ == '__main__':
                         help='socket host', default='localhost')
     parser.add_argument('-c', '--create_new', action='store_true',
                         default=False)
+    parser.add_argument('--pool_size', metavar='CONNECTIONS', type=int,
+                        default=POOL_SIZE,
+                        help='maximum number of connections to every node '
+                             f'({POOL_SIZE} by default)')
+    parser.add_argument('--workers', metavar='THREADS', type=int,
+                        default=WORKERS,
+                        help='number of threads which send requests '
+                             f'to nodes ({WORKERS} by default)')
     args = parser.parse_args()
     server = MainServer(args.DIRECTORY, (args.host, args.PORT),
-                        args.create_new)
+                        args.create_new, args.pool_size, args.workers)
@@ -1,18 +1,30 @@
 import socket
-import struct
-import multiprocessing.dummy as mult
-import multiprocessing
-from Modules.socket_controller import recv
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from Modules.storage_controller import Storage
-import shlex
+from Modules.connection_pool import ConnectionPool, POOL_SIZE
+from Modules.node_connection import connect
+import Modules.protocol as protocol
 import os
 
-lock = multiprocessing.Lock()
+WORKERS = 16
+# message of node which has no requested key
+MISSING_KEY = "key doesn't exists"
 
 
 class MainNodeClient:
-    def __init__(self, directory, create_new=False):
+    def __init__(self, directory, create_new=False, pool_size=POOL_SIZE,
+                 workers=WORKERS):
         self.nodes = []
+        self.pool_size = pool_size
+        if workers < 1:
+            raise ValueError('number of workers must be positive')
+        self.workers = workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._pending = 0
+        self.max_pending = 0
+        self.submitted = 0
         self.path = directory
         if not os.path.isdir(self.path):
             raise NotADirectoryError(f'no such directory as {directory}')
@@ -27,7 +39,8 @@ class MainNodeClient:
 
     def add_inactive_index(self, index):
         self.inactive_indexes.add(index)
-        self.nodes[index].close()
+        if self.nodes[index] is not None:
+            self.nodes[index].close()
 
     def get_capacities(self):
         return self.storage.capacities
@@ -69,7 +82,7 @@ class MainNodeClient:
                 node_index = list(self.get_active_indexes())[active_node_index]
             boundary = get_boundary(local_index)
             if boundary[0] == boundary[1]:
-                return ''
+                return b''
             return self.get_key_part(node_index, key, boundary)
 
         def get_nones(result_list):
@@ -79,17 +92,17 @@ class MainNodeClient:
                     yield i, none_number
                     none_number += 1
 
-        p = mult.Pool()
-        result = p.map(lambda a: get_real_key(a), range(len(indexes)))
+        result = self.map(get_real_key, range(len(indexes)))
         while None in result:
             def assign(index, value):
                 result[index] = value
             active_nodes = self.get_active_composition(key)
             if not active_nodes:
                 raise ImportantNodesDisconnected("no active nodes were found")
-            p.map(lambda args: assign(
-                args[0], get_real_key(args[0], args[1])), get_nones(result))
-        return ''.join(result)
+            self.map(lambda args: assign(
+                args[0], get_real_key(args[0], args[1])),
+                list(get_nones(result)))
+        return b''.join(result).decode('utf8')
 
     def get_key_part(self, index, key, boundary=None):
         if key not in self:
@@ -97,33 +110,68 @@ class MainNodeClient:
         if index in self.inactive_indexes:
             return None
         try:
-            if boundary is None:
-                answer = self.get_answer(index, f'-r {shlex.quote(key)}')
-            else:
-                answer = self.get_answer(
-                    index,
-                    f'-r {shlex.quote(key)} -g {boundary[0]} {boundary[1]}')
+            with self.get_connection(index) as connection:
+                return connection.read(key, boundary)
         except socket.error:
             self.add_inactive_index(index)
             return None
-        return answer[0]
+        except ValueError as e:
+            raise ValueError(f'failed to read {key} from node {index}: '
+                             f'{e}') from e
 
     def disconnect_all(self, total=False):
-        for i in self.get_active_indexes():
+        for i in list(self.get_active_indexes()):
             self.disconnect(i, total)
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def map(self, function, iterable):
+        """returns list of results of <function> called for every item
+        of <iterable> on executor shared by all operations. executor of
+        <workers> threads is started by the first call"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers)
+            futures = [self._executor.submit(self._run_task, function, item)
+                       for item in iterable]
+            self._pending += len(futures)
+            self.submitted += len(futures)
+            self.max_pending = max(self.max_pending, self._pending)
+        return [future.result() for future in futures]
+
+    def _run_task(self, function, item):
+        try:
+            return function(item)
+        finally:
+            with self._executor_lock:
+                self._pending -= 1
+
+    def get_stats(self):
+        """returns counters of executor: tasks submitted, waiting or
+        running now and the most of them at once"""
+        with self._executor_lock:
+            return {'workers': self.workers, 'pending': self._pending,
+                    'max_pending': self.max_pending,
+                    'submitted': self.submitted}
 
     def disconnect(self, index, total=False):
         active_indexes = list(self.get_active_indexes())
         if index not in active_indexes:
             raise ValueError("incorrect index")
-        s = self.nodes[index]
         if total:
-            s.sendall(struct.pack('i', -1))
-        s.close()
+            with self.get_connection(index) as connection:
+                connection.shut()
         self.add_inactive_index(index)
 
     def add_key_with_composition(self, key, value, composition=(0,)):
+        """writes <value> (str or bytes) by <key> to nodes by indexes
+        in <composition>"""
+        if isinstance(value, str):
+            value = value.encode('utf8')
         was_added = False
+        errors = []
         if key in self:
             self.delete_key(key)
 
@@ -132,16 +180,19 @@ class MainNodeClient:
             if node_index in self.inactive_indexes:
                 return
             try:
-                self.get_answer(node_index,
-                                f'-w {shlex.quote(key)} {shlex.quote(value)}')
+                with self.get_connection(node_index) as connection:
+                    connection.write(key, value)
                 self.storage.add_index(key, node_index)
                 self.storage.add_capacity(node_index, len(value))
                 was_added = True
             except socket.error:
                 self.add_inactive_index(node_index)
+            except ValueError as e:
+                errors.append(f'node {node_index}: {e}')
 
-        p = mult.Pool()
-        p.map(add, composition)
+        self.map(add, composition)
+        if not was_added and errors:
+            raise ValueError(f'failed to write {key}: ' + ', '.join(errors))
         if not was_added:
             raise ImportantNodesDisconnected("no nodes found")
         self.storage.key_length[key] = len(value)
@@ -154,101 +205,136 @@ class MainNodeClient:
         def delete(node_index):
             self.storage.remove_capacity(node_index,
                                          self.storage.key_length[key])
-            self.delete_pure_keys(node_index, key)
+            self._report_errors(node_index,
+                                self.delete_pure_keys(node_index, key))
 
-        p = mult.Pool()
-        p.map(delete, self.storage.get_all_indexes(key))
-        self.storage.key_indexes.pop(key)
-        self.storage.key_length.pop(key)
-        self.storage.dump()
+        self.map(delete, self.storage.get_all_indexes(key))
+        self.storage.delete_key(key)
+
+    def scan(self, prefix='', start_after=None, limit=None):
+        return self.storage.scan(prefix, start_after, limit)
 
     def delete_pure_keys(self, index, *keys):
+        """deletes <keys> from node by <index>. keys which node does not
+        have are already deleted. keys which were not deleted are kept to
+        be deleted when node is connected again. returns {key: error} of
+        keys which node failed to delete"""
         if not keys:
-            return
+            return {}
         if index in self.inactive_indexes:
             self.storage.add_keys_to_delete(index, *keys)
-        delete_data = '-D '
-        for key in keys:
-            delete_data += f'{shlex.quote(key)} '
-
-        delete_data = delete_data.rstrip()
+            return {}
+        errors = {}
         try:
-            self.get_answer(index, delete_data)
+            with self.get_connection(index) as connection:
+                try:
+                    connection.delete(keys)
+                    return {}
+                except ValueError:
+                    # node stops deleting at the first failed key,
+                    # so keys are deleted one by one to tell which failed
+                    pass
+                for key in keys:
+                    try:
+                        connection.delete([key])
+                    except ValueError as e:
+                        if str(e) != MISSING_KEY:
+                            errors[key] = str(e)
         except socket.error:
             self.add_inactive_index(index)
             self.storage.add_keys_to_delete(index, *keys)
+            return {}
+        if errors:
+            self.storage.add_keys_to_delete(index, *errors)
+        return errors
+
+    def _report_errors(self, index, errors):
+        for key, error in errors.items():
+            print(f'failed to delete {key} from {self.nodes_data[index]}: '
+                  f'{error}')
 
     def ping(self):
-        for index in self.get_active_indexes():
+        """pings active nodes. pings are sent to all nodes with shared
+        connections before answers are waited for"""
+        pings = {}
+        for index in list(self.get_active_indexes()):
+            try:
+                with self.get_connection(index) as connection:
+                    if connection.shared:
+                        pings[index] = connection.submit(protocol.OP_PING)
+                    else:
+                        connection.ping()
+            except socket.error:
+                self.add_inactive_index(index)
+        for index, answer in pings.items():
             try:
-                self.get_answer(index, 'ping')
+                answer.result()
             except socket.error:
                 self.add_inactive_index(index)
 
-    def get_answer(self, index, request):
+    def get_connection(self, index):
+        """returns context manager which takes connection to node
+        by <index> from its pool for the block. binary connection is
+        shared by all threads, so requests to one node are pipelined"""
         if index < 0 or index >= len(self.nodes):
             raise ValueError("index is out of range")
-        msg = request.encode('utf8')
-        sock = self.nodes[index]
-        sock.sendall(struct.pack('i', len(msg)) + msg)
-        answers = []
-        while True:
-            data = recv(sock, 4, True)
-            length, = struct.unpack('i', data)
-            if length <= 0:
-                break
-            main_data = recv(sock, length, True)
-            answer = main_data.decode('utf8')
-            answers.append(answer)
-        return answers
+        return self.nodes[index].connection()
+
+    def open_pool(self, index):
+        """replaces pool of connections to node by <index> with new one
+        and returns it"""
+        if self.nodes[index] is not None:
+            self.nodes[index].close()
+        address = self.nodes_data[index]
+        self.nodes[index] = ConnectionPool(lambda: connect(address),
+                                           self.pool_size)
+        return self.nodes[index]
 
     def connect_to_new_node(self, host, port):
         if (host, port) in self.nodes_data:
             raise ValueError("this node is already exists")
-        sock = socket.socket()
         index = len(self.nodes)
+        self.nodes.append(None)
+        self.nodes_data.append((host, port))
         try:
-            sock.connect((host, port))
-            self.nodes.append(sock)
-            self.nodes_data.append((host, port))
+            with self.open_pool(index).connection() as connection:
+                connection.clear()
             self.storage.add_nodes_data(host, port)
-            self.get_answer(index, '-e')
             self.cleared_indexes.append(index)
         except socket.error:
-            if sock in self.nodes:
-                self.nodes.remove(sock)
-            if (host, port) in self.nodes_data:
-                self.nodes_data.remove((host, port))
-                self.storage.del_nodes_data(index)
+            self.nodes.pop().close()
+            self.nodes_data.pop()
             return False
         return True
 
     def connect_to_node(self, index):
-        sock = socket.socket()
         empty = self.clear and index not in self.cleared_indexes
         if not 0 <= index < len(self.nodes_data):
             raise ValueError('index is out of range')
         try:
-            sock.connect(self.nodes_data[index])
-            self.nodes[index] = sock
+            with self.open_pool(index).connection() as connection:
+                connection.ping()
             if index < len(self.nodes):
                 if index in self.inactive_indexes:
                     self.inactive_indexes.remove(index)
                 if empty:
-                    self.get_answer(index, '-e')
+                    with self.get_connection(index) as connection:
+                        connection.clear()
                     self.storage.clear_keys_to_delete(index)
                     self.cleared_indexes.append(index)
                 else:
                     keys_to_delete = self.storage.get_keys_to_delete(index)
-                    self.delete_pure_keys(index, *keys_to_delete)
-                    self.storage.delete_keys_to_delete(index, *keys_to_delete)
+                    errors = self.delete_pure_keys(index, *keys_to_delete)
+                    self._report_errors(index, errors)
+                    if index not in self.inactive_indexes:
+                        self.storage.delete_keys_to_delete(
+                            index, *[key for key in keys_to_delete
+                                     if key not in errors])
             if index in self.inactive_indexes:
                 self.inactive_indexes.remove(index)
             print(f'successfully connected to {self.nodes_data[index]} '
                   f'by index {index}')
         except socket.error:
-            if sock not in self.nodes:
-                self.nodes[index] = sock
             self.add_inactive_index(index)
             print(f'failed to connected to {self.nodes_data[index]} '
                   f'by index {index}')
@@ -0,0 +1,188 @@
+import mmap
+import os
+import struct
+
+
+def get_parts(data):
+    """returns list of bytes-like objects given as <data> to write()"""
+    return data if isinstance(data, list) else [data]
+
+
+class FileBlockIO:
+    """I/O over storage file in <path> which reopens the file
+    for every operation. data region of <data_length> bytes starts
+    from <data_offset> and tables are stored after it"""
+
+    def __init__(self, path, data_length, data_offset=0):
+        self.path = path
+        self.data_length = data_length
+        self.data_offset = data_offset
+        self.tables_offset = data_offset + data_length
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def create(self, data, tables):
+        """creates file starting with <data> (the rest of data region
+        is filled with zeros) followed by <tables>"""
+        with open(self.path, 'xb') as file:
+            file.write(data)
+            file.seek(self.tables_offset)
+            file.write(tables)
+
+    def read(self, index, length):
+        """returns <length> bytes of data region starting from <index>"""
+        with open(self.path, 'rb') as file:
+            file.seek(self.data_offset + index)
+            return file.read(length)
+
+    def read_tables(self):
+        """returns bytes stored after data region"""
+        with open(self.path, 'rb') as file:
+            file.seek(self.tables_offset)
+            return file.read()
+
+    def write(self, index, data, tables=None):
+        """writes <data> (bytes-like object or list of them written one
+        after another) to data region by <index> and replaces bytes after
+        data region with <tables> if they are given"""
+        with open(self.path, 'rb+') as file:
+            if data:
+                file.seek(self.data_offset + index)
+                for part in get_parts(data):
+                    file.write(part)
+            if tables is not None:
+                file.seek(self.tables_offset)
+                file.write(tables)
+                file.truncate()
+
+    def sync(self):
+        """flushes written data of file to disk"""
+        with open(self.path, 'rb+') as file:
+            os.fsync(file.fileno())
+
+
+class MappedBlockIO(FileBlockIO):
+    """I/O over storage file in <path> which keeps one descriptor
+    and mmap of data region opened until close()"""
+
+    def __init__(self, path, data_length, data_offset=0):
+        super().__init__(path, data_length, data_offset)
+        self._file = None
+        self._map = None
+
+    def open(self):
+        if self._file is not None:
+            return
+        self._file = open(self.path, 'rb+', buffering=0)
+        try:
+            self._map = mmap.mmap(self._file.fileno(), self.tables_offset)
+        except (ValueError, OSError):
+            self._file.close()
+            self._file = None
+            raise
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def exists(self):
+        return self._file is not None or super().exists()
+
+    def read(self, index, length):
+        index += self.data_offset
+        return self._map[index:index + length]
+
+    def read_tables(self):
+        self._file.seek(self.tables_offset)
+        return self._file.readall()
+
+    def write(self, index, data, tables=None):
+        if data:
+            index += self.data_offset
+            for part in get_parts(data):
+                part = memoryview(part).cast('B')
+                self._map[index:index + len(part)] = part
+                index += len(part)
+        if tables is not None:
+            self._file.seek(self.tables_offset)
+            self._file.write(tables)
+            self._file.truncate()
+
+    def sync(self):
+        if self._map is None:
+            return super().sync()
+        self._map.flush()
+        os.fsync(self._file.fileno())
+
+
+class SlotBlockIO(FileBlockIO):
+    """I/O over slot of pack file in <path> which starts from
+    <slot_offset>. tables are stored after data region with their
+    length and may take at most <tables_capacity> bytes, so the slot
+    takes data_offset + data_length + 4 + tables_capacity bytes.
+    keeps one descriptor opened until close()"""
+    LENGTH_STRUCT = struct.Struct('<I')
+
+    def __init__(self, path, data_length, data_offset=0, slot_offset=0,
+                 tables_capacity=0):
+        super().__init__(path, data_length, slot_offset + data_offset)
+        self.slot_offset = slot_offset
+        self.tables_capacity = tables_capacity
+        self._file = None
+
+    def open(self):
+        if self._file is None:
+            self._file = open(self.path, 'rb+', buffering=0)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def create(self, data, tables):
+        """writes <data> to the beginning of slot and <tables> after
+        data region. pack file must exist"""
+        with open(self.path, 'rb+') as file:
+            file.seek(self.slot_offset)
+            file.write(data)
+            self._write_tables(file, tables)
+
+    def read(self, index, length):
+        self._file.seek(self.data_offset + index)
+        return self._file.read(length)
+
+    def read_tables(self):
+        self._file.seek(self.tables_offset)
+        (length,) = self.LENGTH_STRUCT.unpack(
+            self._file.read(self.LENGTH_STRUCT.size))
+        return self._file.read(length)
+
+    def write(self, index, data, tables=None):
+        if data:
+            self._file.seek(self.data_offset + index)
+            for part in get_parts(data):
+                self._file.write(part)
+        if tables is not None:
+            self._write_tables(self._file, tables)
+
+    def sync(self):
+        if self._file is None:
+            return super().sync()
+        os.fsync(self._file.fileno())
+
+    def _write_tables(self, file, tables):
+        if len(tables) > self.tables_capacity:
+            raise ValueError('tables do not fit into slot')
+        file.seek(self.tables_offset)
+        file.write(self.LENGTH_STRUCT.pack(len(tables)) + tables)
@@ -31,8 +31,11 @@ class ClientLogic:
         length = struct.pack('i', len(data) + 1)
         is_adm = struct.pack('?', is_administrator)
         sock.sendall(length + is_adm + data)
-        answer = recv(sock, 4)
-        if answer:
+        while True:
+            answer = recv(sock, 4)
+            if not answer:
+                print('connection was failed')
+                return
             length, = struct.unpack('i', answer)
             if length <= 0:
                 return
@@ -41,5 +44,3 @@ class ClientLogic:
                 print('connection was failed')
                 return
             print(data.decode('utf8'))
-        else:
-            print('connection was failed')
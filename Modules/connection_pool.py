@@ -0,0 +1,187 @@
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+POOL_SIZE = 4
+IDLE_TIMEOUT = 60.0
+CHECK_INTERVAL = 5.0
+
+
+class ConnectionPool:
+    """pool of at most <size> connections to one node opened by
+    <connect>(). connection is taken by one thread at a time with
+    checkout() and returned with checkin(). connections which were idle
+    for <check_interval> seconds are pinged before they are given out,
+    ones idle for <idle_timeout> seconds are closed. connection whose
+    attribute shared is true (pipelined NodeConnection) is not taken
+    exclusively: connection() gives it to all threads at once"""
+
+    def __init__(self, connect, size=POOL_SIZE, idle_timeout=IDLE_TIMEOUT,
+                 check_interval=CHECK_INTERVAL):
+        if size < 1:
+            raise ValueError('size of connection pool must be positive')
+        self._connect = connect
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self._idle = []
+        self._shared = None
+        self._opened = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self.created = 0
+        self.reaped = 0
+        self.broken = 0
+        self.waits = 0
+
+    def checkout(self):
+        """returns idle connection, opens new one if all connections are
+        taken and there are less than size of them or waits for one.
+        raises socket.error if node can not be reached"""
+        while True:
+            connection, since = self._take()
+            if connection is None:
+                return self._open()
+            if time.monotonic() - since < self.check_interval \
+                    or self._is_alive(connection):
+                return connection
+            self.checkin(connection, True)
+
+    def checkin(self, connection, broken=False):
+        """returns <connection> taken by checkout(). broken connection
+        is closed"""
+        with self._condition:
+            if broken or self._closed:
+                self._opened -= 1
+                self.broken += broken
+                connection.close()
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """takes connection for the block. connection is closed if
+        socket error occurs in the block"""
+        connection = self._get_shared()
+        if connection is None:
+            connection = self.checkout()
+            if getattr(connection, 'shared', False):
+                connection = self._share(connection)
+        if connection is self._shared:
+            try:
+                yield connection
+            except socket.error:
+                self._drop_shared(connection)
+                raise
+            return
+
+        try:
+            yield connection
+        except socket.error:
+            self.checkin(connection, True)
+            raise
+        except BaseException:
+            self.checkin(connection)
+            raise
+        self.checkin(connection)
+
+    def _get_shared(self):
+        with self._condition:
+            if self._closed:
+                raise socket.error('connection pool is closed')
+            return self._shared
+
+    def _share(self, connection):
+        """makes checked out <connection> the shared one and returns it.
+        if another thread has shared its connection meanwhile, <connection>
+        is closed and that one is returned"""
+        with self._condition:
+            if self._shared is None:
+                self._shared = connection
+                return connection
+            self._opened -= 1
+            connection.close()
+            self._condition.notify()
+            return self._shared
+
+    def _drop_shared(self, connection):
+        """closes shared <connection> which was broken"""
+        with self._condition:
+            if self._shared is not connection:
+                return
+            self._shared = None
+            self._opened -= 1
+            self.broken += 1
+            connection.close()
+            self._condition.notify()
+
+    def close(self):
+        """closes idle connections, taken ones are closed when they are
+        returned"""
+        with self._condition:
+            self._closed = True
+            for connection, _ in self._idle:
+                connection.close()
+            self._opened -= len(self._idle)
+            self._idle = []
+            if self._shared is not None:
+                self._shared.close()
+                self._shared = None
+                self._opened -= 1
+            self._condition.notify_all()
+
+    def get_stats(self):
+        with self._condition:
+            return {'opened': self._opened, 'idle': len(self._idle),
+                    'shared': self._shared is not None,
+                    'size': self.size, 'created': self.created,
+                    'reaped': self.reaped, 'broken': self.broken,
+                    'waits': self.waits}
+
+    def _take(self):
+        """returns (idle connection, time of its checkin) or (None, None)
+        if new connection may be opened"""
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise socket.error('connection pool is closed')
+                self._reap()
+                if self._idle:
+                    return self._idle.pop()
+                if self._opened < self.size:
+                    self._opened += 1
+                    return None, None
+                self.waits += 1
+                self._condition.wait()
+
+    def _open(self):
+        try:
+            connection = self._connect()
+        except BaseException:
+            with self._condition:
+                self._opened -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.created += 1
+        return connection
+
+    def _reap(self):
+        """closes connections idle for longer than idle timeout. the last
+        returned connection is at the end of idle list"""
+        deadline = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < deadline:
+            connection, _ = self._idle.pop(0)
+            connection.close()
+            self._opened -= 1
+            self.reaped += 1
+
+    @staticmethod
+    def _is_alive(connection):
+        try:
+            connection.ping()
+        except (socket.error, ValueError):
+            return False
+        return True
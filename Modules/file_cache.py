@@ -0,0 +1,83 @@
+import os
+from collections import OrderedDict
+
+FILE_CACHE_SIZE = 64
+
+
+class FileCache:
+    """bounded LRU of opened storage files keyed by file index. inode of
+    path of file is remembered when it is opened, validate() closes files
+    deleted or replaced by somebody else since then, so they are reopened"""
+
+    def __init__(self, capacity=FILE_CACHE_SIZE):
+        if capacity < 1:
+            raise ValueError('capacity of file cache must be positive')
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._files = OrderedDict()
+
+    def __len__(self):
+        return len(self._files)
+
+    @staticmethod
+    def _get_signature(path):
+        stat = os.stat(path)
+        return stat.st_dev, stat.st_ino
+
+    def get(self, index, path, open_file, check=False):
+        """returns cached file by <index> or file in <path> opened by
+        <open_file>() if it is not cached. path of cached file is checked
+        only if <check>, then FileNotFoundError is raised if there is no
+        file in <path> and replaced file is reopened"""
+        cached = self._files.get(index)
+        if cached is not None and check:
+            try:
+                signature = self._get_signature(path)
+            except FileNotFoundError:
+                self.invalidate(index)
+                raise
+            if cached[2] != signature:
+                cached = None
+        if cached is not None:
+            self._files.move_to_end(index)
+            self.hits += 1
+            return cached[0]
+
+        self.misses += 1
+        return self.put(index, path, open_file())
+
+    def put(self, index, path, file):
+        """caches opened <file> in <path> by <index> and returns it"""
+        self.invalidate(index)
+        self._files[index] = (file, path, self._get_signature(path))
+        if len(self._files) > self.capacity:
+            _, (old_file, _, _) = self._files.popitem(last=False)
+            old_file.close()
+        return file
+
+    def validate(self):
+        """closes cached files whose paths were deleted or replaced after
+        they were opened and returns their indexes"""
+        changed = []
+        for index, (_, path, signature) in list(self._files.items()):
+            try:
+                if self._get_signature(path) == signature:
+                    continue
+            except FileNotFoundError:
+                pass
+            self.invalidate(index)
+            changed.append(index)
+        return changed
+
+    def invalidate(self, index=None):
+        """closes and forgets file by <index> (all files if None)"""
+        indexes = list(self._files) if index is None else [index]
+        for index in indexes:
+            cached = self._files.pop(index, None)
+            if cached is not None:
+                cached[0].close()
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'files': len(self._files), 'capacity': self.capacity}
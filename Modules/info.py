@@ -1,22 +1,49 @@
 import json
+import os
+import struct
+import sys
+from array import array
+from Modules.key_index import KeyIndex
+
+JOURNAL_SUFFIX = '.journal'
+INDEX_SUFFIX = '.index'
+CHECKPOINT_RECORDS = 10000
+SIZES_STRUCT = struct.Struct('<Q')
 
 
 class Info:
-    def __init__(self, json_path, write_new=False):
+    """metadata of node: snapshot and journal of changes made after it.
+    snapshot consists of parameters of node in <json_path> and binary
+    file next to it with sizes of storage files and key index (see
+    Modules/key_index.py), which also serves alternatives of keys. every
+    change is a record of the new value of one key of transitions or
+    sizes, records are appended to journal by commit() and replayed at
+    start. when journal gets <checkpoint_records> records, snapshot
+    is rewritten and journal is removed. snapshots of older versions
+    kept everything in <json_path> and are converted by the next dump"""
+
+    def __init__(self, json_path, write_new=False, block_size=None,
+                 volume=False, checkpoint_records=CHECKPOINT_RECORDS):
         self.path = json_path
-        if write_new:
-            data = {'sizes': [],
-                    'transitions': {},
-                    'alternatives': {}}
+        self.journal_path = json_path + JOURNAL_SUFFIX
+        self.index_path = json_path + INDEX_SUFFIX
+        self.checkpoint_records = checkpoint_records
+        self._pending = []
+        self._journal_records = 0
 
-            with open(self.path, 'w') as file:
-                json.dump(data, file, indent=4)
+        if write_new:
+            self._set_index(KeyIndex(), array('q'))
+            self.block_size = block_size
+            self.volume = volume
+            self.dump()
         else:
-            data = self.load()
+            self.load()
+            self._replay_journal()
 
-        self.transitions = data['transitions']
-        self.sizes = data['sizes']
-        self.alternatives = data['alternatives']
+    def _set_index(self, index, sizes):
+        self.transitions = index
+        self.alternatives = index.alternatives
+        self.sizes = sizes
 
     def contains_key(self, key):
         return key in self.transitions
@@ -28,13 +55,149 @@ class Info:
         for index in self.transitions[global_index]:
             yield index
 
+    def set_transitions(self, key, indexes):
+        self.transitions[key] = indexes
+        self._pending.append(['transitions', key, indexes])
+
+    def del_transitions(self, key):
+        del self.transitions[key]
+        self._pending.append(['transitions', key, None])
+
+    def set_size(self, index, size):
+        """sets size of file by <index>, index of the next new file
+        appends it"""
+        if index == len(self.sizes):
+            self.sizes.append(size)
+        else:
+            self.sizes[index] = size
+        self._pending.append(['sizes', index, size])
+
+    def reset(self):
+        """removes all keys and files"""
+        self._set_index(KeyIndex(), array('q'))
+        self.dump()
+
+    def commit(self):
+        """appends records of changes made since the last commit to journal
+        and makes checkpoint if journal is long enough"""
+        if not self._pending:
+            return
+
+        lines = ''.join(json.dumps(record) + '\n' for record in self._pending)
+        with open(self.journal_path, 'a') as file:
+            file.write(lines)
+        self._journal_records += len(self._pending)
+        self._pending = []
+
+        if self._journal_records >= self.checkpoint_records:
+            self.dump()
+
+    def sync(self):
+        """flushes committed records of journal to disk. journal removed
+        by checkpoint meanwhile needs no flush"""
+        try:
+            with open(self.journal_path, 'rb+') as file:
+                os.fsync(file.fileno())
+        except FileNotFoundError:
+            pass
+
+    def checkpoint(self):
+        """rewrites snapshot if there are uncheckpointed changes"""
+        if self._pending or self._journal_records:
+            self.dump()
+
+    def _apply(self, record):
+        table, key, value = record
+        if table == 'sizes':
+            if key == len(self.sizes):
+                self.sizes.append(value)
+            else:
+                self.sizes[key] = value
+            return
+
+        # alternatives are kept by key index, their records
+        # of older versions are skipped
+        if table != 'transitions':
+            return
+        if value is None:
+            self.transitions.pop(key, None)
+        else:
+            self.transitions[key] = value
+
+    def _replay_journal(self):
+        """applies records of journal to snapshot. torn record at the end
+        of journal (left by crash during commit) is cut off"""
+        if not os.path.isfile(self.journal_path):
+            return
+
+        with open(self.journal_path, 'rb') as file:
+            journal = file.read()
+
+        valid_length = 0
+        for line in journal.splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            self._apply(record)
+            self._journal_records += 1
+            valid_length += len(line)
+
+        if valid_length != len(journal):
+            with open(self.journal_path, 'rb+') as file:
+                file.truncate(valid_length)
+
     def dump(self):
-        data = {'alternatives': self.alternatives,
-                'transitions': self.transitions, 'sizes': self.sizes}
+        """writes snapshot of all metadata and removes journal"""
+        def write_index(file):
+            sizes = array('q', self.sizes)
+            if sys.byteorder != 'little':
+                sizes.byteswap()
+            file.write(SIZES_STRUCT.pack(len(sizes)))
+            sizes.tofile(file)
+            self.transitions.dump(file)
+
+        self._replace(self.index_path, write_index, 'wb')
+        data = {'block_size': self.block_size, 'volume': self.volume}
+        self._replace(self.path, lambda file: file.write(json.dumps(data)))
 
-        with open(self.path, 'w') as file:
-            json.dump(data, file, indent=4)
+        if os.path.isfile(self.journal_path):
+            os.remove(self.journal_path)
+        self._pending = []
+        self._journal_records = 0
+
+    @staticmethod
+    def _replace(path, write, mode='w'):
+        """atomically replaces file in <path> with file written
+        by <write>(file)"""
+        temp_path = path + '.tmp'
+        with open(temp_path, mode) as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
 
     def load(self):
+        """reads snapshot. snapshot of older version is converted
+        to key index"""
         with open(self.path, 'r') as file:
-            return json.load(file)
+            data = json.load(file)
+        self.block_size = data.get('block_size')
+        self.volume = data.get('volume', False)
+
+        if 'transitions' in data:
+            index = KeyIndex()
+            for key, locations in data['transitions'].items():
+                index[key] = locations
+            self._set_index(index, array('q', data['sizes']))
+            return
+
+        with open(self.index_path, 'rb') as file:
+            (length,) = SIZES_STRUCT.unpack(file.read(SIZES_STRUCT.size))
+            sizes = array('q')
+            sizes.fromfile(file, length)
+            if sys.byteorder != 'little':
+                sizes.byteswap()
+            self._set_index(KeyIndex.load(file), sizes)
@@ -0,0 +1,448 @@
+import struct
+import sys
+import zlib
+from array import array
+
+ENCODING = 'utf-8'
+EMPTY = -1
+DELETED = -2
+NO_LOCAL_INDEX = 0xffffffff
+MIN_SLOTS = 8
+MIN_GARBAGE = 1024
+ORDER_BLOCK = 512
+
+HEADER_STRUCT = struct.Struct('<2sBB14Q')
+MAGIC = b'KI'
+VERSION = 1
+
+
+class KeyIndex:
+    """compact mapping of keys of node to lists of locations of their
+    chunks: [file index, local index, size] or file index only (metadata
+    of older versions). bytes of keys are kept in one bytearray, fields
+    of entries and locations in arrays and keys are found by open
+    addressing table of entry numbers, so there are no Python objects
+    per key. keys with the same casefolded form are linked into chain
+    (in order they were added) found by second table, it serves as index
+    of alternatives. entry numbers are also kept sorted by bytes of keys
+    for ordered scans in blocks of ORDER_BLOCK - 2 * ORDER_BLOCK numbers,
+    so adding a key shifts one block only. removed entries and replaced
+    locations stay in arrays until they take more space than alive ones"""
+
+    def __init__(self):
+        self._keys = bytearray()
+        self._key_offsets = array('Q')
+        self._key_lengths = array('i')
+        self._location_offsets = array('I')
+        self._location_counts = array('I')
+        self._next = array('i')
+        self._locations = array('I')
+        self._slots = array('i', [EMPTY]) * MIN_SLOTS
+        self._alternative_slots = array('i', [EMPTY]) * MIN_SLOTS
+        self._order_blocks = []
+        self._count = 0
+        self._location_count = 0
+        self._used_slots = 0
+        self._used_alternative_slots = 0
+        self.alternatives = Alternatives(self)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return self._find(key.encode(ENCODING))[1] != EMPTY
+
+    def __iter__(self):
+        for entry in range(len(self._key_lengths)):
+            if self._key_lengths[entry] >= 0:
+                yield self._get_key(entry)
+
+    def __getitem__(self, key):
+        entry = self._find(key.encode(ENCODING))[1]
+        if entry == EMPTY:
+            raise KeyError(key)
+        return self._get_locations(entry)
+
+    def __setitem__(self, key, locations):
+        key_bytes = key.encode(ENCODING)
+        slot, entry = self._find(key_bytes)
+        if entry == EMPTY:
+            self._add(key, key_bytes, slot, locations)
+            return
+
+        values = self._encode_locations(locations)
+        if len(locations) == self._location_counts[entry]:
+            start = self._location_offsets[entry] * 3
+            self._locations[start:start + len(values)] = values
+            return
+
+        self._location_count += len(locations) - self._location_counts[entry]
+        self._location_offsets[entry] = len(self._locations) // 3
+        self._location_counts[entry] = len(locations)
+        self._locations.extend(values)
+        self._compact_if_needed()
+
+    def __delitem__(self, key):
+        slot, entry = self._find(key.encode(ENCODING))
+        if entry == EMPTY:
+            raise KeyError(key)
+
+        self._unlink_alternative(entry, key.casefold())
+        self._remove_order(key.encode(ENCODING))
+        self._slots[slot] = DELETED
+        self._key_lengths[entry] = -1
+        self._location_count -= self._location_counts[entry]
+        self._count -= 1
+        self._compact_if_needed()
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for entry in range(len(self._key_lengths)):
+            if self._key_lengths[entry] >= 0:
+                yield self._get_key(entry), self._get_locations(entry)
+
+    def get(self, key, default=None):
+        entry = self._find(key.encode(ENCODING))[1]
+        return default if entry == EMPTY else self._get_locations(entry)
+
+    def pop(self, key, default=None):
+        if key not in self:
+            return default
+        locations = self[key]
+        del self[key]
+        return locations
+
+    def scan(self, prefix='', start_after=None, limit=None):
+        """returns keys which start with <prefix> and follow <start_after>
+        in order of their utf-8 bytes (the same as order of strings),
+        at most <limit> ones"""
+        prefix_bytes = prefix.encode(ENCODING)
+        if start_after is not None and start_after >= prefix:
+            number, position = self._locate(start_after.encode(ENCODING),
+                                            True)
+        else:
+            number, position = self._locate(prefix_bytes)
+
+        keys = []
+        blocks = self._order_blocks
+        while number < len(blocks) and (limit is None or len(keys) < limit):
+            if position == len(blocks[number]):
+                number, position = number + 1, 0
+                continue
+            key_bytes = self._get_key_bytes(blocks[number][position])
+            if not key_bytes.startswith(prefix_bytes):
+                break
+            keys.append(str(key_bytes, ENCODING))
+            position += 1
+        return keys
+
+    def _bisect(self, count, get_entry, key_bytes, right=False):
+        """returns number of the first of <count> sorted entries given by
+        <get_entry>(number) whose key is not less (greater if <right>)
+        than <key_bytes>"""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            middle_bytes = self._get_key_bytes(get_entry(middle))
+            if middle_bytes < key_bytes \
+                    or right and middle_bytes == key_bytes:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _locate(self, key_bytes, right=False):
+        """returns (number of block, position in block) of the first entry
+        in order whose key is not less (greater if <right>) than
+        <key_bytes>"""
+        blocks = self._order_blocks
+        number = self._bisect(len(blocks), lambda i: blocks[i][0],
+                              key_bytes, right) - 1
+        if number < 0:
+            return 0, 0
+        block = blocks[number]
+        position = self._bisect(len(block), block.__getitem__, key_bytes,
+                                right)
+        if position == len(block) and number + 1 < len(blocks):
+            return number + 1, 0
+        return number, position
+
+    def _insert_order(self, entry, key_bytes):
+        if not self._order_blocks:
+            self._order_blocks.append(array('i', [entry]))
+            return
+        number, position = self._locate(key_bytes)
+        block = self._order_blocks[number]
+        block.insert(position, entry)
+        if len(block) > 2 * ORDER_BLOCK:
+            self._order_blocks[number:number + 1] = \
+                [block[:ORDER_BLOCK], block[ORDER_BLOCK:]]
+
+    def _remove_order(self, key_bytes):
+        number, position = self._locate(key_bytes)
+        block = self._order_blocks[number]
+        del block[position]
+        if not block:
+            del self._order_blocks[number]
+
+    def _get_order(self):
+        order = array('i')
+        for block in self._order_blocks:
+            order.extend(block)
+        return order
+
+    @staticmethod
+    def _split_order(order):
+        return [order[start:start + ORDER_BLOCK]
+                for start in range(0, len(order), ORDER_BLOCK)]
+
+    def _get_key_bytes(self, entry):
+        offset = self._key_offsets[entry]
+        return self._keys[offset:offset + self._key_lengths[entry]]
+
+    def _get_key(self, entry):
+        return str(self._get_key_bytes(entry), ENCODING)
+
+    def _get_locations(self, entry):
+        start = self._location_offsets[entry] * 3
+        values = self._locations[start:
+                                 start + 3 * self._location_counts[entry]]
+        return [values[i] if values[i + 1] == NO_LOCAL_INDEX
+                else list(values[i:i + 3])
+                for i in range(0, len(values), 3)]
+
+    @staticmethod
+    def _encode_locations(locations):
+        values = array('I')
+        for location in locations:
+            if isinstance(location, int):
+                values.extend((location, NO_LOCAL_INDEX, 0))
+            else:
+                values.extend(location)
+        return values
+
+    def _find(self, key_bytes):
+        """returns (slot, entry) of key with <key_bytes>. if there is no
+        such key, entry is EMPTY and slot is the one to place it into"""
+        mask = len(self._slots) - 1
+        slot = zlib.crc32(key_bytes) & mask
+        free_slot = None
+        while True:
+            entry = self._slots[slot]
+            if entry == EMPTY:
+                return (slot if free_slot is None else free_slot), EMPTY
+            if entry == DELETED:
+                if free_slot is None:
+                    free_slot = slot
+            elif self._key_lengths[entry] == len(key_bytes):
+                offset = self._key_offsets[entry]
+                if self._keys[offset:offset + len(key_bytes)] == key_bytes:
+                    return slot, entry
+            slot = (slot + 1) & mask
+
+    def _find_alternative(self, lower_key):
+        """returns (slot, first entry of chain) of <lower_key> like
+        _find()"""
+        mask = len(self._alternative_slots) - 1
+        slot = zlib.crc32(lower_key.encode(ENCODING)) & mask
+        free_slot = None
+        while True:
+            entry = self._alternative_slots[slot]
+            if entry == EMPTY:
+                return (slot if free_slot is None else free_slot), EMPTY
+            if entry == DELETED:
+                if free_slot is None:
+                    free_slot = slot
+            elif self._get_key(entry).casefold() == lower_key:
+                return slot, entry
+            slot = (slot + 1) & mask
+
+    def _add(self, key, key_bytes, slot, locations):
+        entry = len(self._key_lengths)
+        self._key_offsets.append(len(self._keys))
+        self._key_lengths.append(len(key_bytes))
+        self._keys.extend(key_bytes)
+        self._location_offsets.append(len(self._locations) // 3)
+        self._location_counts.append(len(locations))
+        self._locations.extend(self._encode_locations(locations))
+        self._next.append(EMPTY)
+        self._insert_order(entry, key_bytes)
+        self._count += 1
+        self._location_count += len(locations)
+
+        if self._slots[slot] == EMPTY:
+            self._used_slots += 1
+        self._slots[slot] = entry
+        self._link_alternative(entry, key.casefold())
+
+        if 3 * self._used_slots >= 2 * len(self._slots) \
+                or 3 * self._used_alternative_slots \
+                >= 2 * len(self._alternative_slots):
+            self._rebuild_tables()
+
+    def _link_alternative(self, entry, lower_key):
+        """appends <entry> to the end of chain of <lower_key>"""
+        slot, first = self._find_alternative(lower_key)
+        if first == EMPTY:
+            if self._alternative_slots[slot] == EMPTY:
+                self._used_alternative_slots += 1
+            self._alternative_slots[slot] = entry
+            return
+
+        while self._next[first] != EMPTY:
+            first = self._next[first]
+        self._next[first] = entry
+
+    def _unlink_alternative(self, entry, lower_key):
+        slot, first = self._find_alternative(lower_key)
+        following = self._next[entry]
+        self._next[entry] = EMPTY
+        if first == entry:
+            self._alternative_slots[slot] = \
+                DELETED if following == EMPTY else following
+            return
+
+        while self._next[first] != entry:
+            first = self._next[first]
+        self._next[first] = following
+
+    def _get_alternatives(self, lower_key):
+        entry = self._find_alternative(lower_key)[1]
+        keys = []
+        while entry != EMPTY:
+            keys.append(self._get_key(entry))
+            entry = self._next[entry]
+        return keys
+
+    def _rebuild_tables(self):
+        """rebuilds hash tables for alive entries dropping deleted slots"""
+        size = MIN_SLOTS
+        while 3 * self._count >= size:
+            size *= 2
+        self._slots = array('i', [EMPTY]) * size
+        self._alternative_slots = array('i', [EMPTY]) * size
+        self._used_slots = 0
+        self._used_alternative_slots = 0
+
+        for entry in range(len(self._key_lengths)):
+            if self._key_lengths[entry] < 0:
+                continue
+            offset = self._key_offsets[entry]
+            key_bytes = bytes(
+                self._keys[offset:offset + self._key_lengths[entry]])
+            slot, _ = self._find(key_bytes)
+            self._slots[slot] = entry
+            self._used_slots += 1
+            self._next[entry] = EMPTY
+            self._link_alternative(entry, str(key_bytes, ENCODING).casefold())
+
+    def _compact_if_needed(self):
+        """rewrites arrays without removed entries and replaced locations
+        when they take more space than alive ones"""
+        removed_entries = len(self._key_lengths) - self._count
+        removed_locations = len(self._locations) // 3 - self._location_count
+        if removed_entries > max(self._count, MIN_GARBAGE) \
+                or removed_locations > max(self._location_count, MIN_GARBAGE):
+            self._compact()
+
+    def _compact(self):
+        index = KeyIndex()
+        numbers = array('i', [EMPTY]) * len(self._key_lengths)
+        for entry in range(len(self._key_lengths)):
+            length = self._key_lengths[entry]
+            if length < 0:
+                continue
+            numbers[entry] = len(index._key_lengths)
+            offset = self._key_offsets[entry]
+            index._key_offsets.append(len(index._keys))
+            index._key_lengths.append(length)
+            index._keys.extend(self._keys[offset:offset + length])
+            start = self._location_offsets[entry] * 3
+            count = self._location_counts[entry]
+            index._location_offsets.append(len(index._locations) // 3)
+            index._location_counts.append(count)
+            index._locations.extend(self._locations[start:start + 3 * count])
+            index._next.append(EMPTY)
+        index._order_blocks = self._split_order(array(
+            'i', (numbers[entry] for entry in self._get_order())))
+        index._count = self._count
+        index._location_count = self._location_count
+        index._rebuild_tables()
+        alternatives = self.alternatives
+        self.__dict__.update(index.__dict__)
+        self.alternatives = alternatives
+
+    def _get_arrays(self):
+        return (self._key_offsets, self._key_lengths, self._location_offsets,
+                self._location_counts, self._next, self._locations,
+                self._slots, self._alternative_slots)
+
+    def dump(self, file):
+        """writes index to binary <file>"""
+        arrays = self._get_arrays() + (self._get_order(),)
+        file.write(HEADER_STRUCT.pack(
+            MAGIC, VERSION, sys.byteorder == 'little', self._count,
+            self._location_count, self._used_slots,
+            self._used_alternative_slots, len(self._keys),
+            *map(len, arrays)))
+        file.write(self._keys)
+        for values in arrays:
+            values.tofile(file)
+
+    @classmethod
+    def load(cls, file):
+        """returns index read from binary <file> written by dump()"""
+        magic, version, little_endian, count, location_count, used_slots, \
+            used_alternative_slots, keys_length, *lengths = \
+            HEADER_STRUCT.unpack(file.read(HEADER_STRUCT.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('file is not key index')
+
+        index = cls()
+        index._count = count
+        index._location_count = location_count
+        index._used_slots = used_slots
+        index._used_alternative_slots = used_alternative_slots
+        index._keys = bytearray(file.read(keys_length))
+        index._slots = array('i')
+        index._alternative_slots = array('i')
+        order = array('i')
+        arrays = index._get_arrays() + (order,)
+        for values, length in zip(arrays, lengths):
+            values.fromfile(file, length)
+            if little_endian != (sys.byteorder == 'little'):
+                values.byteswap()
+        index._order_blocks = index._split_order(order)
+        return index
+
+
+class Alternatives:
+    """read only mapping of casefolded keys of <index> to lists of keys"""
+
+    def __init__(self, index):
+        self._index = index
+
+    def __contains__(self, lower_key):
+        return self._index._find_alternative(lower_key)[1] != EMPTY
+
+    def __getitem__(self, lower_key):
+        keys = self._index._get_alternatives(lower_key)
+        if not keys:
+            raise KeyError(lower_key)
+        return keys
+
+    def __iter__(self):
+        seen = set()
+        for key in self._index:
+            lower_key = key.casefold()
+            if lower_key not in seen:
+                seen.add(lower_key)
+                yield lower_key
+
+    def keys(self):
+        return iter(self)
+
+    def get(self, lower_key, default=None):
+        return self._index._get_alternatives(lower_key) or default
@@ -0,0 +1,54 @@
+import asyncio
+
+
+class KeyOrder:
+    """orders concurrent operations of asyncio tasks. operations on the
+    same key run one after another in order of arrival, operations on
+    different keys run at once, so do operations without keys (empty
+    keys). operation with keys None is exclusive: it waits for all previous
+    operations and all next ones wait for it"""
+
+    def __init__(self):
+        self._tails = {}
+        self._keyless = set()
+        self._barrier = None
+
+    async def run(self, keys, coroutine):
+        """awaits <coroutine> after previous operations on <keys>
+        (iterable of keys or None) and returns its result"""
+        done = asyncio.get_running_loop().create_future()
+        if keys is None:
+            waits = list(self._tails.values())
+            waits.extend(self._keyless)
+            waits.append(self._barrier)
+            self._tails.clear()
+            self._keyless.clear()
+            self._barrier = done
+        else:
+            keys = set(keys)
+            waits = [self._tails.get(key, self._barrier) for key in keys]
+            if not keys:
+                waits.append(self._barrier)
+                self._keyless.add(done)
+            for key in keys:
+                self._tails[key] = done
+
+        try:
+            waits = {wait for wait in waits if wait is not None}
+            if waits:
+                try:
+                    await asyncio.wait(waits)
+                except BaseException:
+                    coroutine.close()
+                    raise
+            return await coroutine
+        finally:
+            done.set_result(None)
+            if keys is None:
+                if self._barrier is done:
+                    self._barrier = None
+            else:
+                self._keyless.discard(done)
+                for key in keys:
+                    if self._tails.get(key) is done:
+                        del self._tails[key]
@@ -0,0 +1,368 @@
+import os
+import struct
+import threading
+import zlib
+
+# crc32, flags, key length, value length
+RECORD_HEADER = struct.Struct('<IBHI')
+# flags, key length, value offset, value length
+HINT_ENTRY = struct.Struct('<BHQI')
+SEGMENT_ID = struct.Struct('<Q')
+
+PUT = 0
+DELETE = 1
+
+SEGMENT_SIZE = 64 * 1024 * 1024
+DATA_SUFFIX = '.data'
+HINT_SUFFIX = '.hint'
+MERGE_SUFFIX = '.merge'
+DONE_SUFFIX = '.done'
+
+
+class LogStorage:
+    """append-only key-value storage in directory <dir_path>.
+    records are appended to the active segment file, every key is kept
+    in memory as key -> (segment id, value offset, value length).
+    when segment grows over <segment_size> it is closed and hint file
+    with locations of its records is written next to it, so that
+    the index is restored from hint files at start"""
+
+    def __init__(self, dir_path, segment_size=SEGMENT_SIZE):
+        self.dir_path = dir_path
+        self.segment_size = segment_size
+        self.index = {}
+        self.total_bytes = {}
+        self.dead_bytes = {}
+        self._readers = {}
+        self._active = None
+        self._active_id = None
+        self._active_size = 0
+        self._active_hints = []
+        self._lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+
+        os.makedirs(dir_path, exist_ok=True)
+        self._finish_merges()
+        ids = self._segment_ids()
+        for segment_id in ids:
+            if os.path.isfile(self._path(segment_id, HINT_SUFFIX)):
+                self._load_hints(segment_id)
+            else:
+                self._scan_segment(segment_id, segment_id == ids[-1])
+
+        if ids and not os.path.isfile(self._path(ids[-1], HINT_SUFFIX)):
+            self._open_active(ids[-1])
+        else:
+            self._open_active(ids[-1] + 1 if ids else 1)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def close(self):
+        with self._lock:
+            for reader in self._readers.values():
+                reader.close()
+            self._readers = {}
+            if self._active is not None:
+                self._active.close()
+                self._active = None
+
+    def clear(self):
+        with self._merge_lock, self._lock:
+            self.close()
+            for name in os.listdir(self.dir_path):
+                os.remove(os.path.join(self.dir_path, name))
+            self.index = {}
+            self.total_bytes = {}
+            self.dead_bytes = {}
+            self._open_active(1)
+
+    def get(self, key, start=None, end=None):
+        """returns bytes of value by <key> sliced by <start> and <end>
+        or None if there is no such key"""
+        with self._lock:
+            if key not in self.index:
+                return None
+            segment_id, offset, length = self.index[key]
+            start, end, _ = slice(start, end).indices(length)
+            if end <= start:
+                return b''
+            reader = self._reader(segment_id)
+            reader.seek(offset + start)
+            return reader.read(end - start)
+
+    def put(self, key, value):
+        with self._lock:
+            key_bytes = key.encode('utf-8')
+            offset = self._append(PUT, key_bytes, value)
+            self._forget(key)
+            self.index[key] = (self._active_id, offset, len(value))
+
+    def delete(self, key):
+        with self._lock:
+            if key not in self.index:
+                raise KeyError(key)
+            key_bytes = key.encode('utf-8')
+            self._append(DELETE, key_bytes, b'')
+            self.dead_bytes[self._active_id] += \
+                RECORD_HEADER.size + len(key_bytes)
+            self._forget(key)
+            del self.index[key]
+
+    def garbage_ratio(self):
+        """returns part of bytes in closed segments taken by overwritten
+        and deleted records"""
+        with self._lock:
+            closed = [i for i in self.total_bytes if i != self._active_id]
+            total = sum(self.total_bytes[i] for i in closed)
+            if not total:
+                return 0
+            return sum(self.dead_bytes[i] for i in closed) / total
+
+    def merge(self, budget=None):
+        """rewrites live records of the oldest closed segments (as many as
+        fit into <budget> bytes, all closed segments if it is None) into one
+        segment and removes them. returns number of reclaimed bytes"""
+        with self._merge_lock:
+            return self._merge(budget)
+
+    def _merge(self, budget):
+        with self._lock:
+            ids = []
+            size = 0
+            for segment_id in sorted(self.total_bytes):
+                if segment_id == self._active_id:
+                    break
+                size += self.total_bytes[segment_id]
+                if ids and budget is not None and size > budget:
+                    break
+                ids.append(segment_id)
+            if not ids or not any(self.dead_bytes[i] for i in ids):
+                return 0
+            merged = set(ids)
+            live = [(key, location) for key, location in self.index.items()
+                    if location[0] in merged]
+            old_size = sum(self.total_bytes[i] for i in ids)
+
+        target = ids[-1]
+        new_locations = self._write_merged(target, ids, live)
+
+        with self._lock:
+            dead = 0
+            for key, old_location in live:
+                if self.index.get(key) == old_location:
+                    self.index[key] = new_locations[key]
+                else:
+                    dead += RECORD_HEADER.size \
+                        + len(key.encode('utf-8')) + old_location[2]
+            for segment_id in ids:
+                reader = self._readers.pop(segment_id, None)
+                if reader is not None:
+                    reader.close()
+                del self.total_bytes[segment_id]
+                del self.dead_bytes[segment_id]
+            self._install_merge(target, ids)
+            new_size = os.path.getsize(self._path(target, DATA_SUFFIX))
+            self.total_bytes[target] = new_size
+            self.dead_bytes[target] = dead
+            return old_size - new_size
+
+    def _write_merged(self, target, ids, live):
+        """writes <live> records into merge file of segment <target>,
+        commits it with done file listing merged <ids> and returns
+        new locations of records"""
+        readers = {}
+        hints = []
+        new_locations = {}
+        position = 0
+        try:
+            merged_path = self._path(target, DATA_SUFFIX + MERGE_SUFFIX)
+            with open(merged_path, 'wb') as file:
+                for key, (segment_id, offset, length) in live:
+                    if segment_id not in readers:
+                        readers[segment_id] = open(
+                            self._path(segment_id, DATA_SUFFIX), 'rb')
+                    readers[segment_id].seek(offset)
+                    value = readers[segment_id].read(length)
+                    key_bytes = key.encode('utf-8')
+                    record = self._encode_record(PUT, key_bytes, value)
+                    file.write(record)
+                    value_offset = position + RECORD_HEADER.size \
+                        + len(key_bytes)
+                    hints.append(HINT_ENTRY.pack(
+                        PUT, len(key_bytes), value_offset, length) + key_bytes)
+                    new_locations[key] = (target, value_offset, length)
+                    position += len(record)
+                file.flush()
+                os.fsync(file.fileno())
+        finally:
+            for reader in readers.values():
+                reader.close()
+
+        self._write_file(self._path(target, HINT_SUFFIX + MERGE_SUFFIX),
+                         b''.join(hints))
+        self._write_file(self._path(target, DONE_SUFFIX),
+                         b''.join(SEGMENT_ID.pack(i) for i in ids))
+        return new_locations
+
+    def _install_merge(self, target, ids):
+        """replaces merged segments with merge file of segment <target>"""
+        for segment_id in ids:
+            if segment_id == target:
+                continue
+            for suffix in (DATA_SUFFIX, HINT_SUFFIX):
+                if os.path.isfile(self._path(segment_id, suffix)):
+                    os.remove(self._path(segment_id, suffix))
+        for suffix in (DATA_SUFFIX, HINT_SUFFIX):
+            merged_path = self._path(target, suffix + MERGE_SUFFIX)
+            if os.path.isfile(merged_path):
+                os.replace(merged_path, self._path(target, suffix))
+        os.remove(self._path(target, DONE_SUFFIX))
+
+    def _finish_merges(self):
+        """completes merges which were committed but not installed and
+        removes files of unfinished ones"""
+        names = os.listdir(self.dir_path)
+        for name in names:
+            if name.endswith(DONE_SUFFIX):
+                target = int(name[:-len(DONE_SUFFIX)])
+                with open(os.path.join(self.dir_path, name), 'rb') as file:
+                    ids = [i for (i,) in SEGMENT_ID.iter_unpack(file.read())]
+                self._install_merge(target, ids)
+        for name in os.listdir(self.dir_path):
+            if name.endswith(MERGE_SUFFIX):
+                os.remove(os.path.join(self.dir_path, name))
+
+    def _append(self, flags, key_bytes, value):
+        """appends record to active segment and returns offset of value"""
+        record = self._encode_record(flags, key_bytes, value)
+        if self._active_size and \
+                self._active_size + len(record) > self.segment_size:
+            self._rotate()
+
+        self._active.write(record)
+        value_offset = self._active_size + RECORD_HEADER.size + len(key_bytes)
+        self._active_hints.append(HINT_ENTRY.pack(
+            flags, len(key_bytes), value_offset, len(value)) + key_bytes)
+        self._active_size += len(record)
+        self.total_bytes[self._active_id] += len(record)
+        return value_offset
+
+    def _forget(self, key):
+        """marks record stored by <key> as dead"""
+        if key in self.index:
+            segment_id, _, length = self.index[key]
+            self.dead_bytes[segment_id] += RECORD_HEADER.size \
+                + len(key.encode('utf-8')) + length
+
+    def _rotate(self):
+        """closes active segment writing its hint file and opens new one"""
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        self._active.close()
+        self._write_file(self._path(self._active_id, HINT_SUFFIX),
+                         b''.join(self._active_hints))
+        self._open_active(self._active_id + 1)
+
+    def _open_active(self, segment_id):
+        self._active_id = segment_id
+        self._active = open(self._path(segment_id, DATA_SUFFIX), 'ab',
+                            buffering=0)
+        self._active_size = self._active.tell()
+        self.total_bytes.setdefault(segment_id, self._active_size)
+        self.dead_bytes.setdefault(segment_id, 0)
+        if not self._active_size:
+            self._active_hints = []
+
+    def _reader(self, segment_id):
+        if segment_id not in self._readers:
+            self._readers[segment_id] = open(
+                self._path(segment_id, DATA_SUFFIX), 'rb')
+        return self._readers[segment_id]
+
+    def _apply(self, segment_id, flags, key, value_offset, length):
+        record_length = RECORD_HEADER.size + len(key.encode('utf-8')) + length
+        self.total_bytes[segment_id] += record_length
+        self._forget(key)
+        if flags == DELETE:
+            self.dead_bytes[segment_id] += record_length
+            self.index.pop(key, None)
+        else:
+            self.index[key] = (segment_id, value_offset, length)
+
+    def _load_hints(self, segment_id):
+        self.total_bytes[segment_id] = 0
+        self.dead_bytes[segment_id] = 0
+        with open(self._path(segment_id, HINT_SUFFIX), 'rb') as file:
+            data = file.read()
+
+        position = 0
+        while position < len(data):
+            flags, key_length, value_offset, length = \
+                HINT_ENTRY.unpack_from(data, position)
+            position += HINT_ENTRY.size
+            key = data[position:position + key_length].decode('utf-8')
+            position += key_length
+            self._apply(segment_id, flags, key, value_offset, length)
+
+    def _scan_segment(self, segment_id, is_last):
+        """reads records of segment one by one; torn record at the end of
+        the last segment is cut off"""
+        self.total_bytes[segment_id] = 0
+        self.dead_bytes[segment_id] = 0
+        hints = []
+        path = self._path(segment_id, DATA_SUFFIX)
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        position = 0
+        while position + RECORD_HEADER.size <= len(data):
+            crc, flags, key_length, length = \
+                RECORD_HEADER.unpack_from(data, position)
+            end = position + RECORD_HEADER.size + key_length + length
+            if end > len(data) or crc != zlib.crc32(
+                    data[position + 4:end]):
+                break
+            key_start = position + RECORD_HEADER.size
+            key_bytes = data[key_start:key_start + key_length]
+            value_offset = key_start + key_length
+            self._apply(segment_id, flags, key_bytes.decode('utf-8'),
+                        value_offset, length)
+            hints.append(HINT_ENTRY.pack(
+                flags, key_length, value_offset, length) + key_bytes)
+            position = end
+
+        if position < len(data):
+            if not is_last:
+                raise ValueError(f'segment {path} is corrupted')
+            with open(path, 'rb+') as file:
+                file.truncate(position)
+        if is_last:
+            self._active_hints = hints
+
+    def _segment_ids(self):
+        return sorted(int(name[:-len(DATA_SUFFIX)])
+                      for name in os.listdir(self.dir_path)
+                      if name.endswith(DATA_SUFFIX))
+
+    def _path(self, segment_id, suffix):
+        return os.path.join(self.dir_path, f'{segment_id:06d}{suffix}')
+
+    @staticmethod
+    def _encode_record(flags, key_bytes, value):
+        body = struct.pack('<BHI', flags, len(key_bytes), len(value))
+        crc = zlib.crc32(value, zlib.crc32(key_bytes, zlib.crc32(body)))
+        return b''.join((struct.pack('<I', crc), body, key_bytes, value))
+
+    @staticmethod
+    def _write_file(path, data):
+        with open(path, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
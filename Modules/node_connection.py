@@ -0,0 +1,201 @@
+import shlex
+import socket
+import struct
+import threading
+from concurrent.futures import Future
+from Modules.socket_controller import recv
+import Modules.protocol as protocol
+
+MAX_REQUEST_ID = 2 ** 32
+ERROR_PREFIX = 'Error: '
+
+
+def connect(address):
+    """opens connection to node by (host, port) <address>. returns
+    NodeConnection if node supports binary protocol and TextConnection
+    otherwise"""
+    sock = socket.create_connection(address)
+    try:
+        connection = TextConnection(sock)
+        if f'protocol {protocol.VERSION}' in connection.request('ping'):
+            connection.request(f'binary {protocol.VERSION}')
+            return NodeConnection(sock)
+        return connection
+    except BaseException:
+        sock.close()
+        raise
+
+
+class TextConnection:
+    """connection to node which sends command lines of node.py
+    and waits for answer to each of them"""
+    shared = False
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def request(self, message):
+        """sends command line <message> and returns lines of answer"""
+        data = message.encode('utf8')
+        self.sock.sendall(struct.pack('i', len(data)) + data)
+        answers = []
+        while True:
+            length, = struct.unpack('i', recv(self.sock, 4, True))
+            if length <= 0:
+                break
+            answers.append(recv(self.sock, length, True).decode('utf8'))
+        return answers
+
+    def checked_request(self, message):
+        """sends command line <message> and returns lines of answer.
+        raises ValueError with message of node if it answered with error"""
+        answers = self.request(message)
+        if answers and answers[0].startswith(ERROR_PREFIX):
+            raise ValueError(answers[0][len(ERROR_PREFIX):])
+        return answers
+
+    def ping(self):
+        self.request('ping')
+
+    def write(self, key, value):
+        self.checked_request(f'-w {shlex.quote(key)} '
+                             f'{shlex.quote(value.decode("utf8"))}')
+
+    def read(self, key, boundary=None):
+        """returns bytes of value of <key> in <boundary>"""
+        if boundary is None:
+            answer = self.checked_request(f'-r {shlex.quote(key)}')
+        else:
+            answer = self.checked_request(f'-r {shlex.quote(key)} '
+                                          f'-g {boundary[0]} {boundary[1]}')
+        return answer[0].encode('utf8')
+
+    def read_all(self, key, boundary=None):
+        """returns list of bytes of values of all keys which are equal
+        to <key> ignoring register"""
+        message = f'-r {shlex.quote(key)} -i'
+        if boundary is not None:
+            message += f' -g {boundary[0]} {boundary[1]}'
+        return [line.encode('utf8')
+                for line in self.checked_request(message)]
+
+    def delete(self, keys):
+        self.checked_request('-D ' + ' '.join(map(shlex.quote, keys)))
+
+    def clear(self):
+        self.checked_request('-e')
+
+    def shut(self):
+        """turns node off"""
+        self.sock.sendall(struct.pack('i', -1))
+
+    def close(self):
+        self.sock.close()
+
+
+class NodeConnection:
+    """connection to node switched to binary protocol (see
+    Modules/protocol.py). requests may be sent from many threads without
+    waiting for answers to previous ones, answers are read by background
+    thread and matched to requests by their ids, so one connection
+    is shared by all threads"""
+    shared = True
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._waiting = {}
+        self._error = None
+        self._reader = threading.Thread(target=self._read_answers,
+                                        daemon=True)
+        self._reader.start()
+
+    def submit(self, opcode, key='', value=b'', flags=0):
+        """sends request and returns Future of payload of its answer.
+        the future raises ValueError with message of node if request was
+        failed and socket.error if connection was lost. it can not be
+        cancelled, as request is already sent"""
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            request_id = self._next_id
+            self._next_id = (self._next_id + 1) % MAX_REQUEST_ID
+            self._waiting[request_id] = future
+            try:
+                self.sock.sendall(protocol.pack_request(
+                    request_id, opcode, key.encode('utf8'), value, flags))
+            except socket.error:
+                del self._waiting[request_id]
+                raise
+        return future
+
+    def request(self, opcode, key='', value=b'', flags=0):
+        """sends request and returns payload of its answer"""
+        return self.submit(opcode, key, value, flags).result()
+
+    def ping(self):
+        self.request(protocol.OP_PING)
+
+    def write(self, key, value):
+        self.request(protocol.OP_WRITE, key, value)
+
+    def read(self, key, boundary=None):
+        if boundary is None:
+            return self.request(protocol.OP_READ, key)
+        return self.request(protocol.OP_READ, key,
+                            protocol.pack_range(boundary), protocol.FLAG_RANGE)
+
+    def read_all(self, key, boundary=None):
+        """returns list of bytes of values of all keys which are equal
+        to <key> ignoring register"""
+        if boundary is None:
+            payload = self.request(protocol.OP_READ, key,
+                                   flags=protocol.FLAG_IGNORE_REGISTER)
+        else:
+            payload = self.request(
+                protocol.OP_READ, key, protocol.pack_range(boundary),
+                protocol.FLAG_RANGE | protocol.FLAG_IGNORE_REGISTER)
+        return protocol.unpack_values(payload)
+
+    def delete(self, keys):
+        self.request(protocol.OP_DELETE_MULTIPLE,
+                     value=protocol.pack_keys(keys))
+
+    def clear(self):
+        self.request(protocol.OP_CLEAR)
+
+    def shut(self):
+        """turns node off without waiting for answer"""
+        with self._lock:
+            self.sock.sendall(protocol.pack_request(0, protocol.OP_SHUT))
+
+    def close(self):
+        self.sock.close()
+
+    def _read_answers(self):
+        try:
+            while True:
+                request_id, status, length = protocol.ANSWER_STRUCT.unpack(
+                    recv(self.sock, protocol.ANSWER_STRUCT.size, True))
+                payload = recv(self.sock, length, True)
+                with self._lock:
+                    future = self._waiting.pop(request_id, None)
+                if future is None:
+                    continue
+                if status == protocol.STATUS_OK:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(ValueError(
+                        payload.decode('utf8', 'replace')))
+        except Exception as e:
+            # answers can not be matched to requests after any failure,
+            # so all waiting requests are failed
+            with self._lock:
+                self._error = socket.error(f'connection was lost: {e}')
+                waiting = list(self._waiting.values())
+                self._waiting.clear()
+            for future in waiting:
+                future.set_exception(self._error)
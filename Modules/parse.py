@@ -1,52 +1,49 @@
 import struct
 from Modules.single_file_controller import NUMBER_OF_KBYTES
 import hashlib
+import functools
 
 ENCODING = 'utf-8'
 
 
 def encode_pair(key, value):
-    key_data = encode_key(key)
-    value_bytes = encode_value(value)
-    key_data.extend(value_bytes)
-    return key_data
+    return encode_key(key) + encode_value(value)
 
 
 def encode_value(value):
-    return bytearray(value.encode(ENCODING))
+    return value.encode(ENCODING)
 
 
 def encode_key(key):
-    key_bytes = bytearray(key.encode(ENCODING))
+    key_bytes = key.encode(ENCODING)
     if len(key_bytes) >= NUMBER_OF_KBYTES * 1024 - 1:
         raise ValueError('key is to big')
 
-    key_len = bytearray(struct.pack('h', len(key_bytes)))
-    key_len.extend(key_bytes)
-    return key_len
+    return struct.pack('h', len(key_bytes)) + key_bytes
 
 
 def get_key(b):
-    (length,) = struct.unpack('h', b[:2])
-    return b[2:2+length].decode(ENCODING)
+    (length,) = struct.unpack_from('h', b)
+    return str(b[2:2+length], ENCODING)
 
 
 def get_value_bytes(b):
-    (length,) = struct.unpack('h', b[:2])
-    value = b[2+length:]
-    return value
+    """returns view of value bytes of encoded pair <b> without copying"""
+    (length,) = struct.unpack_from('h', b)
+    return memoryview(b)[2+length:]
 
 
 def decode_pair(b):
     key = get_key(b)
-    value = get_value_bytes(b).decode(ENCODING)
+    value = get_value(get_value_bytes(b))
     return key, value
 
 
 def get_value(b):
-    return b.decode(ENCODING)
+    return str(b, ENCODING)
 
 
+@functools.lru_cache(maxsize=4096)
 def get_index(key):
     key_hash = int(hashlib.md5(key.encode(ENCODING)).hexdigest(), 16)
     index = key_hash % (2**32)
@@ -0,0 +1,91 @@
+import struct
+
+# binary protocol between main server and nodes. connection starts in
+# text protocol: request is a frame of int32 length and utf-8 command line,
+# answer is frames of lines ended by an empty frame. node which supports
+# binary protocol adds line 'protocol VERSION' to answer to 'ping', then
+# main server sends 'binary VERSION' and after answer to it both sides use
+# binary frames on the connection:
+#     request: id, opcode, flags, key length, value length, key, value
+#     answer: id of request, status, payload length, payload
+# keys are utf-8, values are raw bytes. many requests may be sent without
+# waiting for answers, answers may come in any order. request which fails
+# is answered with STATUS_ERROR and message of error as payload
+
+VERSION = 2
+REQUEST_STRUCT = struct.Struct('<IBBIQ')
+ANSWER_STRUCT = struct.Struct('<IBQ')
+RANGE_STRUCT = struct.Struct('<QQ')
+KEY_LENGTH_STRUCT = struct.Struct('<I')
+VALUE_LENGTH_STRUCT = struct.Struct('<Q')
+
+OP_PING = 0
+OP_WRITE = 1
+OP_READ = 2
+OP_DELETE = 3
+OP_DELETE_MULTIPLE = 4
+OP_CLEAR = 5
+OP_CONTAINS = 6
+OP_SHUT = 7
+
+FLAG_IGNORE_REGISTER = 1
+FLAG_RANGE = 2
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+def pack_request(request_id, opcode, key=b'', value=b'', flags=0):
+    return REQUEST_STRUCT.pack(request_id, opcode, flags, len(key),
+                               len(value)) + key + value
+
+
+def pack_range(boundary):
+    """returns value of OP_READ request of bytes in <boundary>"""
+    return RANGE_STRUCT.pack(*boundary)
+
+
+def unpack_range(value):
+    return RANGE_STRUCT.unpack(value)
+
+
+def pack_keys(keys):
+    """returns value of OP_DELETE_MULTIPLE request of <keys>"""
+    parts = []
+    for key in keys:
+        key_bytes = key.encode('utf8')
+        parts.append(KEY_LENGTH_STRUCT.pack(len(key_bytes)))
+        parts.append(key_bytes)
+    return b''.join(parts)
+
+
+def unpack_keys(value):
+    keys = []
+    offset = 0
+    while offset < len(value):
+        (length,) = KEY_LENGTH_STRUCT.unpack_from(value, offset)
+        offset += KEY_LENGTH_STRUCT.size
+        keys.append(str(value[offset:offset + length], 'utf8'))
+        offset += length
+    return keys
+
+
+def pack_values(values):
+    """returns payload of answer to OP_READ request with
+    FLAG_IGNORE_REGISTER of <values> of all keys which match it"""
+    parts = []
+    for value in values:
+        parts.append(VALUE_LENGTH_STRUCT.pack(len(value)))
+        parts.append(value)
+    return b''.join(parts)
+
+
+def unpack_values(payload):
+    values = []
+    offset = 0
+    while offset < len(payload):
+        (length,) = VALUE_LENGTH_STRUCT.unpack_from(payload, offset)
+        offset += VALUE_LENGTH_STRUCT.size
+        values.append(bytes(payload[offset:offset + length]))
+        offset += length
+    return values
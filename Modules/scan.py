@@ -0,0 +1,18 @@
+from bisect import bisect_left, bisect_right
+
+
+def scan_sorted(keys, prefix='', start_after=None, limit=None):
+    """returns keys of sorted list <keys> which start with <prefix> and
+    are greater than <start_after>, at most <limit> ones"""
+    if start_after is not None and start_after >= prefix:
+        position = bisect_right(keys, start_after)
+    else:
+        position = bisect_left(keys, prefix)
+    found = []
+    while position < len(keys) and (limit is None or len(found) < limit):
+        key = keys[position]
+        if not key.startswith(prefix):
+            break
+        found.append(key)
+        position += 1
+    return found
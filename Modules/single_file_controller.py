@@ -1,38 +1,154 @@
-import os
 import struct
+from bisect import bisect_left, insort
+from Modules.block_io import FileBlockIO, MappedBlockIO, SlotBlockIO
 
 NUMBER_OF_KBYTES = 3
+TRANSITION_STRUCT = struct.Struct('ih')
+
+MAGIC = b'SF'
+HEADER_STRUCT = struct.Struct('<2sBxI')
+DESCRIPTOR_V2_STRUCT = struct.Struct('<BI')
+TRANSITION_V2_STRUCT = struct.Struct('<iI')
+MIN_BLOCK_SIZE = 1024
+MAX_BLOCK_SIZE = 2 ** 32 - 1
+
+
+def get_capacity(block_size=None):
+    """returns maximal size of data that fits into storage file with
+    given <block_size> (None stands for 3 KB files of the first version)"""
+    if block_size is None:
+        return NUMBER_OF_KBYTES * 1024 - 2
+    return block_size - DESCRIPTOR_V2_STRUCT.size
+
+
+def get_descriptor_size(block_size=None):
+    """returns size of descriptor which precedes every record and empty
+    spot of storage file with given <block_size>"""
+    if block_size is None:
+        return 2
+    return DESCRIPTOR_V2_STRUCT.size
+
+
+def get_tables_capacity(block_size=None):
+    """returns maximal size of tables of storage file with given
+    <block_size>: every spot takes at least one byte and descriptor"""
+    if block_size is None:
+        number_of_spots = NUMBER_OF_KBYTES * 1024 // 3
+        return 2 + 3 * ((number_of_spots + 1) // 2) \
+            + TRANSITION_STRUCT.size * number_of_spots
+
+    number_of_spots = block_size // (DESCRIPTOR_V2_STRUCT.size + 1)
+    return 4 + (4 + TRANSITION_V2_STRUCT.size) * number_of_spots
+
+
+def get_slot_size(block_size=None):
+    """returns size of slot of pack file which holds storage file
+    with given <block_size> (see SlotBlockIO)"""
+    if block_size is None:
+        header_size, data_length = 0, NUMBER_OF_KBYTES * 1024
+    else:
+        header_size, data_length = HEADER_STRUCT.size, block_size
+    return header_size + data_length + SlotBlockIO.LENGTH_STRUCT.size \
+        + get_tables_capacity(block_size)
 
 
 class SFC:
-    def __init__(self, path, size=NUMBER_OF_KBYTES * 1024 - 2,
-                 create_new=False):
+    """storage file. files of the first version have 3 KB data region and
+    2-byte descriptors with 12-bit sizes. files of the second version start
+    with header (b'SF', version, block size), their data region has size
+    chosen on creation and descriptors and tables have 32-bit fields.
+    if <offset> is given, storage file is a slot of pack file in <path>
+    starting from <offset> (see Modules/volume.py)"""
+
+    def __init__(self, path, size=None, create_new=False, mapped=False,
+                 block_size=None, offset=None):
         self.path = path
-        self.size = size
-        self.file_length = NUMBER_OF_KBYTES * 1024
+        self.offset = offset
 
         if create_new:
-            if os.path.isfile(path):
-                raise FileExistsError(f'given file {path} is already exists')
+            self._set_format(block_size, mapped)
             self.create_storage_file()
+        else:
+            self._set_format(self._read_block_size(), mapped)
 
-        if not os.path.isfile(path):
-            raise FileNotFoundError(f'no such file as {path}')
-
+        self.size = self.capacity if size is None else size
+        # {old local index: new one} of records moved by every compaction
+        # or recomposition, taken by owner of file
+        self.moves = []
+        self._io.open()
         self.empties, self.transitions = self.get_tables_from_file()
+        self._load_free_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """releases descriptor and mapping held in mapped mode"""
+        self._io.close()
+
+    def sync(self):
+        """flushes written data and tables to disk"""
+        self._io.sync()
+
+    def _set_format(self, block_size, mapped):
+        """sets layout of file: first version if <block_size> is None
+        and second one otherwise"""
+        if block_size is None:
+            self.version = 1
+            self.file_length = NUMBER_OF_KBYTES * 1024
+            self.descriptor_size = 2
+            header_size = 0
+            self._encode_descriptor = SFC._get_encoded_boundary_descriptor
+            self._decode_descriptor = SFC._get_info_from_bytes
+            self._encode_tables = SFC._get_encoded_tables
+            self._decode_tables = SFC._get_tables_from_bytes
+        else:
+            if not MIN_BLOCK_SIZE <= block_size <= MAX_BLOCK_SIZE:
+                raise ValueError(f'block size out of range({MIN_BLOCK_SIZE}, '
+                                 f'{MAX_BLOCK_SIZE})')
+            self.version = 2
+            self.file_length = block_size
+            self.descriptor_size = DESCRIPTOR_V2_STRUCT.size
+            header_size = HEADER_STRUCT.size
+            self._encode_descriptor = SFC._get_encoded_boundary_descriptor_v2
+            self._decode_descriptor = SFC._get_info_from_bytes_v2
+            self._encode_tables = SFC._get_encoded_tables_v2
+            self._decode_tables = SFC._get_tables_from_bytes_v2
+
+        self.block_size = block_size
+        self.capacity = get_capacity(block_size)
+        if self.offset is not None:
+            self._io = SlotBlockIO(self.path, self.file_length, header_size,
+                                   self.offset,
+                                   get_tables_capacity(block_size))
+        else:
+            io_class = MappedBlockIO if mapped else FileBlockIO
+            self._io = io_class(self.path, self.file_length, header_size)
 
-    def create_storage_file(self):
-        """Creates empty storage file in <path>"""
+    def _read_block_size(self):
+        """returns block size from header of file in <path> or None
+        if it is file of the first version"""
+        with open(self.path, 'rb') as file:
+            file.seek(self.offset or 0)
+            header = file.read(HEADER_STRUCT.size)
 
-        (first, second) = self._get_encoded_boundary_descriptor(
-            NUMBER_OF_KBYTES * 1024 - 2, 0, True)
-        data = bytearray(1024 * NUMBER_OF_KBYTES)
-        data[0] = first
-        data[1] = second
-        data.extend(self._get_encoded_tables([0], {}))
+        if header[:len(MAGIC)] != MAGIC:
+            return None
+        _, version, block_size = HEADER_STRUCT.unpack(header)
+        if version != 2:
+            raise ValueError(f'unknown version {version} of {self.path}')
+        return block_size
 
-        with open(self.path, 'bw') as file:
-            file.write(data)
+    def create_storage_file(self):
+        """Creates empty storage file in <path>"""
+        data = bytearray()
+        if self.version == 2:
+            data.extend(HEADER_STRUCT.pack(MAGIC, 2, self.file_length))
+        data.extend(self._encode_descriptor(self.capacity, 0, True))
+        self._io.create(data, self._encode_tables([0], {}))
 
     def get_data(self, index):
         """returns list of data that contains in file in <path>
@@ -48,29 +164,46 @@ class SFC:
             if is_empty:
                 datas.append(b'')
             else:
-
-                with open(self.path, 'rb') as file:
-                    file.seek(index + 2)
-                    data = file.read(size)
-                    datas.append(data)
+                datas.append(self._io.read(index + self.descriptor_size, size))
 
         return datas
 
+    def _load_free_index(self):
+        """reads descriptors of empty spots once and builds in-memory index:
+        local index -> capacity, end of spot -> local index and list of
+        (capacity, local index) sorted for best fit search"""
+        empties = self.empties
+        self.empties = []
+        self._free_blocks = {}
+        self._free_ends = {}
+        self._free_order = []
+
+        for index in empties:
+            _, size, number_of_empty = self._get_info_from_file_boundary(index)
+            self._add_free_block(index, size + number_of_empty)
+
+    def _add_free_block(self, index, capacity):
+        self.empties.append(index)
+        self._free_blocks[index] = capacity
+        self._free_ends[index + capacity + self.descriptor_size] = index
+        insort(self._free_order, (capacity, index))
+
+    def _remove_free_block(self, index):
+        """removes empty spot by local <index> from index and
+        returns its capacity"""
+        capacity = self._free_blocks.pop(index)
+        del self._free_ends[index + capacity + self.descriptor_size]
+        del self._free_order[bisect_left(self._free_order, (capacity, index))]
+        self.empties.remove(index)
+        return capacity
+
     def _get_index_of_suitable_spot(self, size):
         """returns local index of most suitable empty spot of file in <path>
          for <size>"""
-        min_difference = NUMBER_OF_KBYTES * 1024 + 1
-        index_of_suitable_spot = -1
-
-        for index in self.empties:
-            _, current_size, number_of_empty = \
-                self._get_info_from_file_boundary(index)
-
-            if 0 <= current_size + number_of_empty - size < min_difference:
-                min_difference = current_size + number_of_empty - size
-                index_of_suitable_spot = index
-
-        return index_of_suitable_spot
+        position = bisect_left(self._free_order, (size, -1))
+        if position == len(self._free_order):
+            return -1
+        return self._free_order[position][1]
 
     def recompose(self):
         """recomposes file in <path> with given <file_length>
@@ -79,6 +212,8 @@ class SFC:
         new_file_data = bytearray()
         new_translation_table = {}
         new_index = 0
+        moves = {}
+        d = self.descriptor_size
 
         for key in self.transitions:
             new_translation_table[key] = []
@@ -87,99 +222,214 @@ class SFC:
                 is_empty, size, empty_num = \
                     self._get_info_from_file_boundary(collision)
 
-                with open(self.path, 'rb') as file:
-                    file.seek(collision + 2)
-                    new_data = file.read(size)
+                new_data = self._io.read(collision + d, size)
 
-                new_empty_num = self.file_length - (new_index+size+2) - 1
-                if new_empty_num > 2:
+                new_empty_num = self.file_length - (new_index+size+d) - 1
+                if new_empty_num > d:
                     new_empty_num = 0
 
-                new_descriptor = self._get_encoded_boundary_descriptor(
+                new_descriptor = self._encode_descriptor(
                     size, new_empty_num, is_empty)
                 new_file_data.extend(new_descriptor)
                 new_file_data.extend(new_data)
                 new_translation_table[key].append(new_index)
-                new_index += size + 2
+                moves[collision] = new_index
+                new_index += size + d
 
         empty_bytes = self.file_length - new_index
-        if empty_bytes <= 2:
+        if empty_bytes <= d:
             new_empties = []
             empty_bytes = 0
         else:
 
             new_empties = [new_index]
-            empty_descriptor = self._get_encoded_boundary_descriptor(
-                empty_bytes - 2, 0, True)
+            empty_descriptor = self._encode_descriptor(
+                empty_bytes - d, 0, True)
             new_file_data.extend(empty_descriptor)
-            empty_bytes -= 2
+            empty_bytes -= d
 
-        tables = self._get_encoded_tables(new_empties,
-                                          new_translation_table)
+        tables = self._encode_tables(new_empties, new_translation_table)
 
-        with open(self.path, 'rb+') as file:
-            file.write(new_file_data)
-            file.seek(self.file_length)
-            file.write(tables)
-            file.truncate()
+        self._io.write(0, new_file_data, tables)
 
         self.transitions = new_translation_table
+        self.moves.append(moves)
         self.empties = new_empties
+        self._load_free_index()
         self.size += empty_bytes - self.size
 
+    def compact(self, size=None, budget=None):
+        """moves records of file in <path> towards its start, one by one,
+        beginning from the first empty spot, until empty spot with capacity
+        of at least <size> appears or <budget> bytes are moved (whole file
+        is compacted if both are None). returns number of moved bytes"""
+        if not self._free_blocks:
+            return 0
+
+        owners = {}
+        for key in self.transitions:
+            for i, local_index in enumerate(self.transitions[key]):
+                owners[local_index] = (key, i)
+
+        d = self.descriptor_size
+        moves = {}
+        start = min(self._free_blocks)
+        gap = start
+        gap_length = self._remove_free_block(start) + d
+        position = start + gap_length
+        moved_data = bytearray()
+        was_changed = False
+
+        while (size is None or gap_length - d < size) \
+                and (budget is None or len(moved_data) < budget):
+            if position in self._free_blocks:
+                length = self._remove_free_block(position) + d
+                gap_length += length
+                position += length
+                was_changed = True
+                continue
+
+            if position not in owners:
+                break
+
+            is_empty, block_size, number_of_empty = \
+                self._get_info_from_file_boundary(position)
+            moved_data.extend(self._encode_descriptor(
+                block_size, 0, is_empty))
+            moved_data.extend(self._io.read(position + d, block_size))
+
+            key, collision = owners.pop(position)
+            self.transitions[key][collision] = gap
+            moves[position] = gap
+            gap += block_size + d
+            gap_length += number_of_empty
+            position += block_size + number_of_empty + d
+        else:
+            position = None
+
+        if not moved_data and not was_changed:
+            self._add_free_block(start, gap_length - d)
+            return 0
+
+        if moves:
+            self.moves.append(moves)
+        gap, capacity = self._merge_with_empty_neighbours(gap, gap_length - d)
+        moved_data.extend(self._encode_descriptor(capacity, 0, True))
+        tables = self._encode_tables(self.empties, self.transitions)
+        self._io.write(start, moved_data, tables)
+
+        if position is not None and len(self.empties) == 1:
+            self.size = capacity
+
+        return len(moved_data) - d
+
+    def get_data_at(self, index, local_index, size):
+        """returns data of <size> bytes written by global <index> to
+        <local_index> or None if there is no such data there (for example
+        it was moved by compaction)"""
+        if local_index not in self.transitions.get(index, ()):
+            return None
+
+        d = self.descriptor_size
+        record = self._io.read(local_index, d + size)
+        is_empty, record_size, _ = self._decode_descriptor(record[:d])
+        if is_empty or record_size != size:
+            return None
+        return memoryview(record)[d:]
+
     def write_data(self, data, index):
-        """writes <data> to file on <path> by global <index> and returns
-        size_change"""
-        local_index = self._get_index_of_suitable_spot(len(data))
+        """writes <data> (bytes-like object or list of them which are
+        written one after another without joining) to file on <path>
+        by global <index> and returns local index of written data"""
+        return self.write_multiple([(index, data)])[0]
+
+    def write_multiple(self, records):
+        """writes data of (global index, data) <records> like write_data()
+        but rewrites tables once and returns local indexes of written data.
+        writing of a record may compact file and move records written
+        before it, so they are found by their positions in transitions"""
+        positions = []
+        try:
+            for index, data in records:
+                self._write_record(data, index)
+                positions.append((index, len(self.transitions[index]) - 1))
+        finally:
+            if positions:
+                self._write_tables()
+        return [self.transitions[index][position]
+                for index, position in positions]
+
+    def _write_record(self, data, index):
+        """writes <data> by global <index> without writing tables
+        and returns local index of written data"""
+        parts = data if isinstance(data, list) else [data]
+        size = sum(memoryview(part).nbytes for part in parts)
+        local_index = self._get_index_of_suitable_spot(size)
         new_space = 0
 
+        if local_index == -1:
+            self.compact(size)
+            local_index = self._get_index_of_suitable_spot(size)
+
         if local_index == -1:
             self.recompose()
-            local_index = self._get_index_of_suitable_spot(len(data))
+            local_index = self._get_index_of_suitable_spot(size)
             if local_index == -1:
                 raise ValueError(f'no place in {self.path} for given data')
 
-        _, size, empty_bytes = self._get_info_from_file_boundary(local_index)
-        write_data = bytearray()
-        empty_bytes = size + empty_bytes - len(data)
+        d = self.descriptor_size
+        empty_bytes = self._remove_free_block(local_index) - size
 
         if index in self.transitions:
             self.transitions[index].append(local_index)
         else:
             self.transitions[index] = [local_index]
 
-        self.empties.remove(local_index)
-        boundary_first, boundary_second = \
-            self._get_encoded_boundary_descriptor(
-                len(data), empty_bytes if empty_bytes <= 2 else 0, False)
-        write_data.append(boundary_first)
-        write_data.append(boundary_second)
-        write_data.extend(data)
-
-        if empty_bytes > 2:
-            empty_descriptor = self._get_encoded_boundary_descriptor(
-                size - len(data) - 2, 0, True)
-            self.empties.append(len(write_data) + local_index)
-            write_data.extend(empty_descriptor)
-            difference = new_space - len(data) - 2
-        else:
-            difference = new_space - len(data)
+        write_data = [bytes(self._encode_descriptor(
+            size, empty_bytes if empty_bytes <= d else 0, False))]
+        write_data.extend(parts)
 
-        table_bytes = self._get_encoded_tables(self.empties, self.transitions)
+        if empty_bytes > d:
+            empty_descriptor = self._encode_descriptor(
+                empty_bytes - d, 0, True)
+            self._add_free_block(local_index + d + size, empty_bytes - d)
+            write_data.append(bytes(empty_descriptor))
+            difference = new_space - size - d
+        else:
+            difference = new_space - size
 
-        with open(self.path, 'rb+') as file:
-            file.seek(local_index)
-            file.write(write_data)
-            file.seek(self.file_length)
-            file.write(table_bytes)
-            file.truncate()
+        self._io.write(local_index, write_data)
 
         self.size += difference
+        return local_index
+
+    def _write_tables(self):
+        self._io.write(0, None, self._encode_tables(self.empties,
+                                                    self.transitions))
 
     def del_data(self, index, index_of_collision):
         """removes data from file on <path> by global <index> and
         <index_of_collisions> and returns file size difference"""
-        if not os.path.isfile(self.path):
+        self._del_record(index, index_of_collision)
+        self._write_tables()
+
+    def del_multiple_at(self, records):
+        """removes data by (global index, local index) <records>.
+        tables are rewritten once"""
+        removed = False
+        try:
+            for index, local_index in records:
+                self._del_record(index,
+                                 self.transitions[index].index(local_index))
+                removed = True
+        finally:
+            if removed:
+                self._write_tables()
+
+    def _del_record(self, index, index_of_collision):
+        """removes data by global <index> and <index_of_collision>
+        without writing tables"""
+        if not self._io.exists():
             raise ValueError(f'no such file {self.path}')
 
         if (index not in self.transitions)\
@@ -189,61 +439,57 @@ class SFC:
         local_index = self.transitions[index][index_of_collision]
         _, size, number_of_empty = self._get_info_from_file_boundary(
             local_index)
-        new_boundary = self._get_encoded_boundary_descriptor(
-            size + number_of_empty, 0, True)
-        self.empties.append(local_index)
+        start, capacity = self._merge_with_empty_neighbours(
+            local_index, size + number_of_empty)
+        new_boundary = self._encode_descriptor(capacity, 0, True)
 
         del self.transitions[index][index_of_collision]
         if len(self.transitions[index]) == 0:
             del self.transitions[index]
 
-        new_tables = self._get_encoded_tables(self.empties, self.transitions)
-        with open(self.path, 'br+') as file:
-            file.seek(local_index)
-            file.write(bytearray(new_boundary))
-            file.seek(self.file_length)
-            file.write(new_tables)
-            file.truncate()
+        self._io.write(start, bytearray(new_boundary))
 
         self.size += size + number_of_empty
-        if self._has_empty_neighbour(local_index):
-            self.size += 2
-            self.size = min(self.size, self.file_length - 2)
-
-    def _has_empty_neighbour(self, index):
-        _, size, empty_num = self._get_info_from_file_boundary(index)
-        for other_index in self.empties:
-            if other_index == index:
-                continue
-            _, new_size, new_empty = self._get_info_from_file_boundary(
-                other_index)
-            if other_index + new_size + new_empty + 2 == index:
-                return True
-            if size + empty_num + 2 + index == other_index:
-                return True
-        return False
+        if capacity != size + number_of_empty:
+            self.size += self.descriptor_size
+            self.size = min(self.size, self.capacity)
+
+    def _merge_with_empty_neighbours(self, index, capacity):
+        """adds spot by local <index> with <capacity> to empty spots joining
+        it with adjacent empty spots and returns (start, capacity)
+        of resulting spot"""
+        d = self.descriptor_size
+        start = index
+        previous = self._free_ends.get(index)
+        if previous is not None:
+            capacity += self._remove_free_block(previous) + d
+            start = previous
+
+        following = start + capacity + d
+        if following in self._free_blocks:
+            capacity += self._remove_free_block(following) + d
+
+        self._add_free_block(start, capacity)
+        return start, capacity
 
     def _get_info_from_file_boundary(self, index):
         """reads boundary descriptor of file in <path> and returns tuple:
         (bool is_empty, int size_of_block, int number_of_empty bytes)"""
-        if not os.path.isfile(self.path):
+        if not self._io.exists():
             raise ValueError(f'{self.path} is not file')
 
-        with open(self.path, 'rb') as file:
-            file.seek(index)
-            boundary = file.read(2)
-
-        return self._get_info_from_bytes(boundary)
+        return self._decode_descriptor(
+            self._io.read(index, self.descriptor_size))
 
     @staticmethod
     def _get_info_from_bytes(boundary):
         if len(boundary) != 2:
             raise ValueError(f'{boundary} is not boundary descriptor')
 
-        info = SFC._get_bin(boundary[0], 8) + SFC._get_bin(boundary[1], 8)[2:]
-        is_empty = info[2] == '0'
-        size = int(info[3:15], 2) + 1
-        number_of_empty_bytes = int(info[15:], 2)
+        info = boundary[0] << 8 | boundary[1]
+        is_empty = not info & 0x8000
+        size = (info >> 3 & 0xfff) + 1
+        number_of_empty_bytes = info & 0b111
 
         return is_empty, size, number_of_empty_bytes
 
@@ -258,11 +504,52 @@ class SFC:
         if number_of_empty_bytes < 0 or number_of_empty_bytes > 7:
             raise ValueError('empty bytes number out of range(8)')
 
-        s = SFC._get_bin(size - 1, 12)
-        first = '0b' + ('0' if is_empty else '1') + s[2:9]
-        second = '0b' + s[-5:] + SFC._get_bin(number_of_empty_bytes, 3)[2:]
+        info = (0 if is_empty else 0x8000) | (size - 1) << 3 \
+            | number_of_empty_bytes
+
+        return info >> 8, info & 0xff
+
+    @staticmethod
+    def _get_info_from_bytes_v2(boundary):
+        if len(boundary) != DESCRIPTOR_V2_STRUCT.size:
+            raise ValueError(f'{boundary} is not boundary descriptor')
+
+        flags, size = DESCRIPTOR_V2_STRUCT.unpack(boundary)
+        return not flags & 0x80, size, flags & 0b111
+
+    @staticmethod
+    def _get_encoded_boundary_descriptor_v2(size, number_of_empty_bytes,
+                                            is_empty):
+        """returns boundary descriptor of the second version (flags byte
+        and 32-bit size) by given <size>, <number_of_empty_bytes>
+        and bool <is_empty>"""
+        if size < 1 or size > MAX_BLOCK_SIZE:
+            raise ValueError(f'size out of range(1, {MAX_BLOCK_SIZE})')
+
+        if number_of_empty_bytes < 0 or number_of_empty_bytes > 7:
+            raise ValueError('empty bytes number out of range(8)')
+
+        flags = (0 if is_empty else 0x80) | number_of_empty_bytes
+        return DESCRIPTOR_V2_STRUCT.pack(flags, size)
 
-        return int(first, 2), int(second, 2)
+    @staticmethod
+    def _get_encoded_tables_v2(empty_table, transition_dict):
+        """returns bytes of tables of the second version: number of empty
+        spots, their 32-bit indexes and translation table"""
+        bytes_array = bytearray(struct.pack(
+            f'<I{len(empty_table)}I', len(empty_table), *empty_table))
+        bytes_array.extend(SFC._encode_transition_table(
+            transition_dict, TRANSITION_V2_STRUCT))
+        return bytes_array
+
+    @staticmethod
+    def _get_tables_from_bytes_v2(table_bytes):
+        (empty_table_length,) = struct.unpack_from('<I', table_bytes)
+        empties = list(struct.unpack_from(f'<{empty_table_length}I',
+                                          table_bytes, 4))
+        transitions = SFC._decode_transition_table(
+            table_bytes[4 * empty_table_length + 4:], TRANSITION_V2_STRUCT)
+        return empties, transitions
 
     @staticmethod
     def _get_encoded_tables(empty_table, transition_dict):
@@ -280,14 +567,10 @@ class SFC:
     def get_tables_from_file(self):
         """returns table of empty spots and translation table
         from file in <path>"""
-        if not os.path.isfile(self.path):
+        if not self._io.exists():
             raise ValueError(f'{self.path} on such storage file')
 
-        with open(self.path, 'rb') as file:
-            file.seek(self.file_length)
-            table_bytes = file.read()
-
-        return self._get_tables_from_bytes(table_bytes)
+        return self._decode_tables(self._io.read_tables())
 
     @staticmethod
     def _get_tables_from_bytes(table_bytes):
@@ -299,51 +582,41 @@ class SFC:
         return empties, transitions
 
     @staticmethod
-    def _encode_transition_table(transition_dict):
+    def _encode_transition_table(transition_dict,
+                                 transition_struct=TRANSITION_STRUCT):
         """returns bytes of encoded translation table"""
-        bytes_table = bytearray()
-
-        for key in transition_dict:
-            for collision in transition_dict[key]:
-                bytes_table.extend(struct.pack('i', key))
-                bytes_table.extend(struct.pack('h', collision))
-
-        return bytes_table
+        pack = transition_struct.pack
+        return bytearray().join(pack(key, collision)
+                                for key in transition_dict
+                                for collision in transition_dict[key])
 
     @staticmethod
-    def _decode_transition_table(transition_bytes):
-        """returns translation table from bytes"""
+    def _decode_transition_table(transition_bytes,
+                                 transition_struct=TRANSITION_STRUCT):
+        """returns translation table from bytes (decoded in one pass)"""
         table = {}
-        index = 0
-
-        while index < len(transition_bytes):
-            (key,) = struct.unpack('i', transition_bytes[index:index+4])
-            (value,) = struct.unpack('h', transition_bytes[index+4:index+6])
 
+        for key, value in transition_struct.iter_unpack(transition_bytes):
             if key in table:
                 table[key].append(value)
             else:
                 table[key] = [value]
 
-            index += 6
-
         return table
 
     @staticmethod
     def _decode_empty_table(bytes_of_empty_table):
-        """returns table of empty spots from bytes"""
+        """returns table of empty spots from bytes (every 3 bytes hold
+        two 12-bit numbers shifted by one, 0 marks missing second one)"""
         empties = []
+        b = bytes_of_empty_table
 
-        for i in range(0, len(bytes_of_empty_table), 3):
-            first = SFC._get_bin(bytes_of_empty_table[i], 8)
-            second = SFC._get_bin(bytes_of_empty_table[i + 1], 8)
-            third = SFC._get_bin(bytes_of_empty_table[i + 2], 8)
-            first_number = int(first + second[2:6], 2) - 1
-            second_number = int('0b' + second[6:] + third[2:], 2) - 1
-            empties.append(first_number)
+        for first, second, third in zip(b[0::3], b[1::3], b[2::3]):
+            empties.append((first << 4 | second >> 4) - 1)
 
-            if second_number >= 0:
-                empties.append(second_number)
+            second_number = (second & 0xf) << 8 | third
+            if second_number:
+                empties.append(second_number - 1)
 
         return empties
 
@@ -362,18 +635,13 @@ class SFC:
                 raise ValueError(
                     f'tables elenemt on position {i+1} is out of range(4095)')
 
-            first = SFC._get_bin(emptyes_table[i] + 1, 12)
-            bytes_table.append(int(first[:10], 2))
-
             if i + 1 == len(emptyes_table):
-                next_byte = SFC._get_bin(0, 12)
+                second = 0
             else:
-                next_byte = SFC._get_bin(emptyes_table[i + 1] + 1, 12)
+                second = emptyes_table[i + 1] + 1
 
-            second = '0b' + first[10:] + next_byte[2:6]
-            third = '0b' + next_byte[6:]
-            bytes_table.append(int(second, 2))
-            bytes_table.append(int(third, 2))
+            pair = (emptyes_table[i] + 1) << 12 | second
+            bytes_table.extend(pair.to_bytes(3, 'big'))
 
         return bytes_table
 
@@ -1,5 +1,8 @@
 import json
 import os
+import threading
+from bisect import bisect_left, insort
+from Modules.scan import scan_sorted
 
 
 class Storage:
@@ -9,6 +12,9 @@ class Storage:
     def __init__(self, dir_path, create_new=False):
         self.path = os.path.join(dir_path, self.FILE_NAME)
         self.key_indexes = {}
+        self._sorted_keys = []
+        # keys are added and deleted from threads of MainNodeClient
+        self._lock = threading.RLock()
         self.key_length = {}
         self.deleted_keys = {}
         self.capacities = []
@@ -24,13 +30,14 @@ class Storage:
                 "key_length": self.key_length,
                 "deleted_keys": self.deleted_keys, 'capacity': self.capacities,
                 'nodes_data': self._nodes_data}
-        with open(self.path, 'w') as file:
+        with self._lock, open(self.path, 'w') as file:
             json.dump(data, file)
 
     def load(self):
         with open(self.path, 'r') as file:
             data = json.load(file)
         self.key_indexes = data["key_compositions"]
+        self._sorted_keys = sorted(self.key_indexes)
         self.key_length = data["key_length"]
         self.deleted_keys = data["deleted_keys"]
         self.capacities = data['capacity']
@@ -99,14 +106,25 @@ class Storage:
         return item in self.key_indexes
 
     def add_index(self, key, index):
-        if key not in self:
-            self.key_indexes[key] = []
-        if index not in self.key_indexes[key]:
-            self.key_indexes[key].append(index)
-            self.dump()
+        with self._lock:
+            if key not in self:
+                self.key_indexes[key] = []
+                insort(self._sorted_keys, key)
+            if index not in self.key_indexes[key]:
+                self.key_indexes[key].append(index)
+                self.dump()
 
     def delete_key(self, key):
-        if key not in self:
-            raise ValueError(f'no such key as {key}')
-        self.key_indexes.pop(key)
-        self.dump()
+        with self._lock:
+            if key not in self:
+                raise ValueError(f'no such key as {key}')
+            self.key_indexes.pop(key)
+            del self._sorted_keys[bisect_left(self._sorted_keys, key)]
+            self.key_length.pop(key, None)
+            self.dump()
+
+    def scan(self, prefix='', start_after=None, limit=None):
+        """returns sorted keys which start with <prefix> and are greater
+        than <start_after>, at most <limit> ones"""
+        with self._lock:
+            return scan_sorted(self._sorted_keys, prefix, start_after, limit)
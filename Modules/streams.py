@@ -0,0 +1,141 @@
+import io
+from bisect import bisect_right
+
+
+class ValueReader(io.RawIOBase):
+    """file-like reader of value of <key> in sfc <node>. value is read
+    chunk by chunk, so only one chunk is kept in memory"""
+
+    def __init__(self, node, key):
+        super().__init__()
+        self._node = node
+        self._key = key
+        self._starts = []
+        self.length = 0
+        for length in node._get_chunk_lengths(key):
+            self._starts.append(self.length)
+            self.length += length
+        self._position = 0
+        self._chunk_index = None
+        self._chunk = b''
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.length
+        elif whence != io.SEEK_SET:
+            raise ValueError(f'invalid whence ({whence})')
+        if offset < 0:
+            raise ValueError(f'negative seek position {offset}')
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer):
+        buffer = memoryview(buffer).cast('B')
+        written = 0
+        while written < len(buffer) and self._position < self.length:
+            chunk_index = bisect_right(self._starts, self._position) - 1
+            if chunk_index != self._chunk_index:
+                self._chunk = self._node._read_chunk(self._key, chunk_index)
+                self._chunk_index = chunk_index
+
+            offset = self._position - self._starts[chunk_index]
+            size = min(len(buffer) - written, len(self._chunk) - offset)
+            buffer[written:written + size] = \
+                self._chunk[offset:offset + size]
+            written += size
+            self._position += size
+        return written
+
+
+class ValueWriter(io.RawIOBase):
+    """file-like writer of value of <key> to sfc <node>. every filled
+    chunk is written to storage file at once, value replaces the old one
+    when writer is closed. if writer is left by exception or garbage
+    collected without close(), written chunks are removed"""
+
+    def __init__(self, node, key):
+        super().__init__()
+        self._node = node
+        self._key = key
+        self._buffer = bytearray()
+        self._locations = []
+        self._chunk_size = node._get_chunk_size(key)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        while len(self._buffer) >= self._chunk_size:
+            self._node._write_chunk(
+                self._key, self._buffer[:self._chunk_size], self._locations)
+            del self._buffer[:self._chunk_size]
+        return len(data)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.abort()
+        return super().__exit__(exc_type, exc_val, exc_tb)
+
+    def __del__(self):
+        self.abort()
+        super().__del__()
+
+    def abort(self):
+        """removes written chunks and closes writer"""
+        if not self.closed:
+            if self._locations:
+                self._node._discard_chunks(self._key, self._locations)
+                self._locations = []
+            super().close()
+
+    def close(self):
+        if not self.closed:
+            self._node._finish_value(self._key, self._buffer,
+                                     self._locations)
+            self._buffer = bytearray()
+        super().close()
+
+
+class BufferedValueWriter(io.RawIOBase):
+    """file-like writer which keeps the whole value of <key> in memory
+    and writes it to <node> when closed. value is dropped if writer is
+    left by exception or garbage collected without close()"""
+
+    def __init__(self, node, key):
+        super().__init__()
+        self._node = node
+        self._key = key
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        return len(data)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self._buffer = None
+        return super().__exit__(exc_type, exc_val, exc_tb)
+
+    def __del__(self):
+        self._buffer = None
+        super().__del__()
+
+    def close(self):
+        if not self.closed and self._buffer is not None:
+            self._node.put_bytes(self._key, self._buffer)
+        super().close()
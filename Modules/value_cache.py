@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+
+class ValueCache:
+    """LRU of whole values keyed by key of node. values are kept while
+    their total size is at most <budget> bytes, values larger than budget
+    are not cached"""
+
+    def __init__(self, budget):
+        if budget < 1:
+            raise ValueError('budget of value cache must be positive')
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._values = OrderedDict()
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def get(self, key):
+        """returns cached bytes of value of <key> or None"""
+        value = self._values.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._values.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """caches bytes-like <value> of <key> evicting least recently
+        used values which do not fit into budget"""
+        self.invalidate(key)
+        if len(value) > self.budget:
+            return
+        value = bytes(value)
+        self._values[key] = value
+        self.size += len(value)
+        while self.size > self.budget:
+            _, old_value = self._values.popitem(last=False)
+            self.size -= len(old_value)
+            self.evictions += 1
+
+    def invalidate(self, key=None):
+        """forgets value of <key> (all values if None)"""
+        if key is None:
+            self._values.clear()
+            self.size = 0
+            return
+        value = self._values.pop(key, None)
+        if value is not None:
+            self.size -= len(value)
+
+    def get_stats(self):
+        requests = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits / requests, 3) if requests else 0,
+                'evictions': self.evictions, 'values': len(self._values),
+                'bytes': self.size, 'budget': self.budget}
@@ -0,0 +1,82 @@
+import os
+
+SLOTS_PER_PACK = 4096
+
+
+class Volume:
+    """storage files placed as fixed-size slots of a few large pack files
+    in <dir_path>. slot <number> is slot number % <slots_per_pack> of pack
+    number // <slots_per_pack>. allocated slots are marked in bitmap file
+    (one bit per slot), pack files are created with their full size"""
+    BITMAP_NAME = 'volume.bitmap'
+    PACK_SUFFIX = '.pack'
+
+    def __init__(self, dir_path, slot_size, slots_per_pack=SLOTS_PER_PACK):
+        self.dir_path = dir_path
+        self.slot_size = slot_size
+        self.slots_per_pack = slots_per_pack
+        self.bitmap_path = os.path.join(dir_path, self.BITMAP_NAME)
+
+        if os.path.isfile(self.bitmap_path):
+            with open(self.bitmap_path, 'rb') as file:
+                self.bitmap = bytearray(file.read())
+        else:
+            self.bitmap = bytearray()
+
+    def __contains__(self, number):
+        """returns whether slot <number> is allocated"""
+        byte, bit = divmod(number, 8)
+        return byte < len(self.bitmap) and bool(self.bitmap[byte] >> bit & 1)
+
+    def __iter__(self):
+        """yields numbers of allocated slots"""
+        for byte, value in enumerate(self.bitmap):
+            if not value:
+                continue
+            for bit in range(8):
+                if value >> bit & 1:
+                    yield byte * 8 + bit
+
+    def _pack_path(self, pack):
+        return os.path.join(self.dir_path, f'{pack}{self.PACK_SUFFIX}')
+
+    def get_missing(self, count):
+        """returns numbers of slots among the first <count> ones which are
+        not allocated or whose pack file does not exist"""
+        packs = {}
+        missing = []
+        for number in range(count):
+            pack = number // self.slots_per_pack
+            if pack not in packs:
+                packs[pack] = os.path.isfile(self._pack_path(pack))
+            if not packs[pack] or number not in self:
+                missing.append(number)
+        return missing
+
+    def locate(self, number):
+        """returns (path of pack, offset of slot in it) of slot <number>"""
+        pack, slot = divmod(number, self.slots_per_pack)
+        return self._pack_path(pack), slot * self.slot_size
+
+    def allocate(self, number):
+        """marks slot <number> as allocated, creates its pack if needed
+        and returns number of the slot"""
+        pack_path = self._pack_path(number // self.slots_per_pack)
+        if not os.path.isfile(pack_path):
+            with open(pack_path, 'wb') as file:
+                file.truncate(self.slots_per_pack * self.slot_size)
+
+        self._set_bit(number)
+        return number
+
+    def _set_bit(self, number):
+        byte, bit = divmod(number, 8)
+        if byte >= len(self.bitmap):
+            self.bitmap.extend(bytes(byte + 1 - len(self.bitmap)))
+
+        self.bitmap[byte] |= 1 << bit
+
+        mode = 'rb+' if os.path.isfile(self.bitmap_path) else 'wb'
+        with open(self.bitmap_path, mode) as file:
+            file.seek(byte)
+            file.write(self.bitmap[byte:byte + 1])
@@ -1,57 +1,256 @@
-import socket
+import asyncio
+import functools
 import struct
 import argparse
 import shlex
-from Modules.socket_controller import recv
-from node import Node
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from Modules.key_order import KeyOrder
+import Modules.protocol as protocol
+from node import Node, open_node, BACKENDS, COMPACTION_BUDGET, \
+    DURABILITY_LEVELS, SCAN_PAGE
+
+WORKERS = 4
+MAX_IN_FLIGHT = 64
+
+
+def get_keys(args):
+    """returns keys touched by request <args> (casefolded, so requests
+    ignoring register are ordered with all keys they may touch), empty
+    tuple for requests which only read the whole node and None
+    for requests which may change any key"""
+    if args.write is not None:
+        return [args.write[0].casefold()]
+    if args.read is not None:
+        return [args.read.casefold()]
+    if args.delete is not None:
+        return [args.delete.casefold()]
+    if args.contains is not None:
+        return [args.contains.casefold()]
+    if args.delete_multiple:
+        return [key.casefold() for key in args.delete_multiple]
+    if args.list or args.stats:
+        return ()
+    return None
+
+
+def get_request_keys(opcode, flags, key, value):
+    """returns keys touched by binary request as get_keys() does"""
+    if opcode in (protocol.OP_CLEAR, protocol.OP_SHUT):
+        return None
+    if opcode == protocol.OP_DELETE_MULTIPLE:
+        return [key.casefold() for key in protocol.unpack_keys(value)]
+    return [key.casefold()]
 
 
 class NodeServer:
-    def __init__(self, path, host, port):
-        self.node = Node(path)
-        self.socket = socket.socket()
-        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.socket.bind((host, port))
-        self.socket.listen(1)
-        self.start()
+    """serves node to many connections at once. requests of one
+    connection are answered in order, node operations run on executor
+    of <workers> threads and operations on the same key are ordered
+    (see Modules/key_order.py). connections may be switched from text
+    to binary protocol (see Modules/protocol.py)"""
+
+    def __init__(self, path, host, port, compaction_interval=None,
+                 compaction_budget=COMPACTION_BUDGET, backend=None,
+                 block_size=None, volume=False, durability=None,
+                 batch_interval=None, batch_size=None,
+                 value_cache_size=None, workers=WORKERS):
+        self.node = open_node(path, backend, block_size=block_size,
+                              volume=volume, durability=durability,
+                              batch_interval=batch_interval,
+                              batch_size=batch_size,
+                              value_cache_size=value_cache_size)
+        if compaction_interval is not None:
+            self.node.start_compaction(compaction_interval, compaction_budget)
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(workers)
+        self.order = None
+        self.server = None
+        self.writers = set()
+        self.parser = Node.get_parser()
+        try:
+            asyncio.run(self.start())
+        finally:
+            self.executor.shutdown()
 
     @staticmethod
-    def send_line(connection, line):
+    def send_line(writer, line):
         encoded = line.encode('utf8')
         length = struct.pack('i', len(encoded))
-        connection.sendall(length+encoded)
+        writer.write(length+encoded)
 
-    def start(self):
-        parser = Node.get_parser()
-        while True:
-            connection, addr = self.socket.accept()
-            print(f'{addr} just connected')
+    async def start(self):
+        self.order = KeyOrder()
+        self.server = await asyncio.start_server(self.serve, self.host,
+                                                 self.port, reuse_address=True)
+        async with self.server:
+            try:
+                await self.server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    async def serve(self, reader, writer):
+        addr = writer.get_extra_info('peername')
+        print(f'{addr} just connected')
+        self.writers.add(writer)
+        try:
             while True:
-                data = recv(connection, 4)
-                if not data:
-                    break
+                data = await reader.readexactly(4)
                 length, = struct.unpack('i', data)
                 if length <= 0:
-                    self.socket.close()
+                    await self.order.run(None, self.shut())
+                    return
+                message = (await reader.readexactly(length)).decode('utf8')
+                if message == f'binary {protocol.VERSION}':
+                    self.send_line(writer, message)
+                    self.send_line(writer, '')
+                    await self.serve_binary(reader, writer)
+                    return
+                await self.answer(writer, message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def shut(self):
+        await self._run(self.node.stop_compaction)
+        await self._run(self.node.close)
+        self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+
+    async def answer(self, writer, message):
+        print('get message:')
+        print(message)
+        try:
+            parsed_message = shlex.split(message)
+            args = None
+            if parsed_message != ['ping']:
+                args = self.parser.parse_args(parsed_message)
+        except (ValueError, SystemExit):
+            self.send_line(writer, 'Error: incorrect params')
+        else:
+            if args is None:
+                self.send_line(writer, 'ping')
+                self.send_line(writer, f'protocol {protocol.VERSION}')
+            else:
+                await self.order.run(get_keys(args),
+                                     self.send_answer(writer, args))
+        self.send_line(writer, '')
+        await writer.drain()
+
+    async def send_answer(self, writer, args):
+        """sends lines of answer to request <args>. failed request is
+        answered with error line like binary ones are"""
+        try:
+            answer = await self._run(self.node.process_args, args)
+            if answer is None:
+                return
+            answer = iter(answer)
+            while True:
+                lines = await self._run(
+                    lambda: list(islice(answer, SCAN_PAGE)))
+                if not lines:
                     return
-                message = recv(connection, length)
-                if not message:
-                    break
-                message = message.decode("utf8")
-                parsed_message = shlex.split(message)
-                print(parsed_message)
-                print('get message:')
-                print(' '.join(map(shlex.quote, parsed_message)))
-                if parsed_message == ['ping']:
-                    self.send_line(connection, 'ping')
-                    self.send_line(connection, '')
-                    continue
-                answer = self.node.process_args(parser.parse_args(
-                    parsed_message))
-                if answer is not None:
-                    for line in answer:
-                        self.send_line(connection, line)
-                self.send_line(connection, '')
+                for line in lines:
+                    self.send_line(writer, line)
+                await writer.drain()
+        except Exception as e:
+            self.send_line(writer, f'Error: {e}')
+
+    async def serve_binary(self, reader, writer):
+        """answers pipelined binary requests of connection until it is
+        closed. up to MAX_IN_FLIGHT requests are run at once and every
+        answer is sent with id of its request as soon as it is ready"""
+        in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+        drain_lock = asyncio.Lock()
+        tasks = set()
+        while True:
+            request_id, opcode, flags, key_length, value_length = \
+                protocol.REQUEST_STRUCT.unpack(
+                    await reader.readexactly(protocol.REQUEST_STRUCT.size))
+            key = (await reader.readexactly(key_length)).decode('utf8')
+            value = await reader.readexactly(value_length)
+            if opcode == protocol.OP_SHUT:
+                await self.order.run(None, self.shut())
+                return
+
+            await in_flight.acquire()
+            task = asyncio.ensure_future(self.answer_binary(
+                writer, drain_lock, request_id, opcode, flags, key, value))
+            task.add_done_callback(lambda task: in_flight.release())
+            task.add_done_callback(functools.partial(
+                self.answer_failed, writer, request_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    async def answer_binary(self, writer, drain_lock, request_id, opcode,
+                            flags, key, value):
+        if opcode == protocol.OP_PING:
+            status, payload = protocol.STATUS_OK, b''
+        else:
+            # tasks start in order of creation, so requests are ordered
+            # by KeyOrder in order of their arrival
+            status, payload = await self.order.run(
+                get_request_keys(opcode, flags, key, value),
+                self._run(self.process_request, opcode, flags, key, value))
+        writer.write(protocol.ANSWER_STRUCT.pack(request_id, status,
+                                                 len(payload)))
+        writer.write(payload)
+        async with drain_lock:
+            await writer.drain()
+
+    @staticmethod
+    def answer_failed(writer, request_id, task):
+        """answers request whose task was failed with error, so it is not
+        waited for forever"""
+        if task.cancelled() or task.exception() is None \
+                or writer.is_closing():
+            return
+        error = task.exception()
+        payload = f'{type(error).__name__}: {error}'.encode('utf8')
+        writer.write(protocol.ANSWER_STRUCT.pack(
+            request_id, protocol.STATUS_ERROR, len(payload)))
+        writer.write(payload)
+
+    def process_request(self, opcode, flags, key, value):
+        """runs binary request on node and returns (status, payload)"""
+        case_sensitive = not flags & protocol.FLAG_IGNORE_REGISTER
+        try:
+            if opcode == protocol.OP_WRITE:
+                self.node.put_bytes(key, value)
+            elif opcode == protocol.OP_READ:
+                boundary = (None, None)
+                if flags & protocol.FLAG_RANGE:
+                    boundary = protocol.unpack_range(value)
+                if case_sensitive:
+                    return protocol.STATUS_OK, self.node.get_bytes(key,
+                                                                   boundary)
+                return protocol.STATUS_OK, protocol.pack_values(
+                    self.node.get_all_bytes(key, boundary))
+            elif opcode == protocol.OP_DELETE:
+                self.node.del_data(key, case_sensitive)
+            elif opcode == protocol.OP_DELETE_MULTIPLE:
+                self.node.del_multiple(case_sensitive,
+                                       *protocol.unpack_keys(value))
+            elif opcode == protocol.OP_CLEAR:
+                self.node.clear()
+            elif opcode == protocol.OP_CONTAINS:
+                contains = self.node.contains_key(key, case_sensitive)
+                return protocol.STATUS_OK, bytes([contains])
+            else:
+                raise ValueError(f'unknown opcode {opcode}')
+        except Exception as e:
+            return protocol.STATUS_ERROR, str(e).encode('utf8')
+        return protocol.STATUS_OK, b''
+
+    async def _run(self, function, *args):
+        """runs <function> on executor when awaited, so coroutine given
+        to KeyOrder does not start before its turn"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, function, *args)
 
 
 if __name__ == '__main__':
@@ -61,6 +260,51 @@ if __name__ == '__main__':
     parser.add_argument('--host', metavar='HOST',
                         default='localhost',
                         help='host')
+    parser.add_argument('--compaction_interval', metavar='SECONDS',
+                        type=float, default=None,
+                        help='compacts storage files in background '
+                             'every SECONDS')
+    parser.add_argument('--compaction_budget', metavar='BYTES', type=int,
+                        default=COMPACTION_BUDGET,
+                        help='maximum number of bytes moved by '
+                             'one background compaction')
+    parser.add_argument('-b', '--backend', choices=list(BACKENDS),
+                        default=None,
+                        help='storage backend of new node (sfc by default)')
+    parser.add_argument('--block_size', metavar='BYTES', type=int,
+                        default=None,
+                        help='size of data region of storage files '
+                             'of new node')
+    parser.add_argument('--volume', action='store_true', default=False,
+                        help='keeps storage files of new node as slots '
+                             'of a few large pack files')
+    parser.add_argument('--durability', choices=DURABILITY_LEVELS,
+                        default=None,
+                        help='none - changes are not flushed to disk, '
+                             'batch - concurrent changes share one flush, '
+                             'always - every change is flushed '
+                             '(none by default)')
+    parser.add_argument('--batch_interval', metavar='SECONDS', type=float,
+                        default=None,
+                        help='time to collect changes into one flush '
+                             'in batch mode')
+    parser.add_argument('--batch_size', metavar='CHANGES', type=int,
+                        default=None,
+                        help='number of changes which are flushed at once '
+                             'in batch mode without waiting')
+    parser.add_argument('--value_cache_size', metavar='BYTES', type=int,
+                        default=None,
+                        help='keeps recently read values in memory up to '
+                             'BYTES in total (off by default)')
+    parser.add_argument('--workers', metavar='THREADS', type=int,
+                        default=WORKERS,
+                        help='number of threads which run operations '
+                             f'of node ({WORKERS} by default)')
 
     args = parser.parse_args()
-    server = NodeServer(args.DIRECTORY, args.host, int(args.PORT))
+    server = NodeServer(args.DIRECTORY, args.host, int(args.PORT),
+                        args.compaction_interval, args.compaction_budget,
+                        args.backend, args.block_size, args.volume,
+                        args.durability, args.batch_interval,
+                        args.batch_size, args.value_cache_size,
+                        args.workers)
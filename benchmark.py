@@ -0,0 +1,221 @@
+import argparse
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from node import Node, open_node, BACKENDS
+from Modules.node_connection import connect, TextConnection
+import Modules.protocol as protocol
+
+SERVER_START_TIMEOUT = 10.0
+
+
+def get_best_file_index_by_scan(sizes, size):
+    """best fit search over all files (placement before free space
+    index) kept for comparison"""
+    min_difference = None
+    index = None
+    for i, free in enumerate(sizes):
+        difference = free - size
+        if difference >= 0 and (min_difference is None
+                                or difference < min_difference):
+            index, min_difference = i, difference
+    return index
+
+
+def fill(node, number_of_files):
+    """gives node <number_of_files> files with random free space
+    without creating them"""
+    node.info.sizes.extend(random.randint(0, node.capacity)
+                           for _ in range(number_of_files))
+    node._load_format()
+
+
+def measure(node, chunks, placement):
+    """returns microseconds per chunk spent to choose file for every
+    chunk of <chunks> sizes by <placement> and to update its free space"""
+    start = time.perf_counter()
+    for size in chunks:
+        file_index = placement(size)
+        if file_index is None:
+            continue
+        free = node.info.sizes[file_index] - size
+        node._update_size(file_index, SimpleNamespace(size=free, moves=[]))
+    return (time.perf_counter() - start) / len(chunks) * 10 ** 6
+
+
+def run_placement(file_counts, number_of_chunks):
+    print(f'{"files":>10} {"index, us":>12} {"scan, us":>12}')
+    for number_of_files in file_counts:
+        dir_path = tempfile.mkdtemp()
+        try:
+            random.seed(number_of_files)
+            node = Node(dir_path)
+            fill(node, number_of_files)
+            sizes = node.info.sizes[:]
+            chunks = [random.randint(1, 512)
+                      for _ in range(number_of_chunks)]
+            by_index = measure(node, chunks, node._get_best_file_index)
+
+            node.info.sizes[:] = sizes
+            node._load_format()
+            by_scan = measure(node, chunks, lambda size:
+                              get_best_file_index_by_scan(node.info.sizes,
+                                                          size))
+            print(f'{number_of_files:>10} {by_index:>12.2f} {by_scan:>12.2f}')
+        finally:
+            shutil.rmtree(dir_path, ignore_errors=True)
+
+
+def get_values(number_of_values, value_size):
+    """returns {key: random bytes of <value_size>} of <number_of_values>
+    keys. seed is fixed, so runs are comparable"""
+    random.seed(number_of_values)
+    return {f'key-{i}': random.getrandbits(8 * value_size).to_bytes(
+        value_size, 'little') for i in range(number_of_values)}
+
+
+def time_operations(operation, items):
+    """returns operations per second of <operation>(*item) for every
+    item of <items>"""
+    start = time.perf_counter()
+    for item in items:
+        operation(*item)
+    return len(items) / (time.perf_counter() - start)
+
+
+def time_pipelined(connection, opcode, items):
+    """returns operations per second of binary requests of <opcode> with
+    (key, value) <items> sent without waiting for previous answers"""
+    start = time.perf_counter()
+    futures = [connection.submit(opcode, key, value) for key, value in items]
+    for future in futures:
+        future.result()
+    return len(items) / (time.perf_counter() - start)
+
+
+def print_row(name, writes, reads):
+    print(f'{name:>20} {writes:>12.0f} {reads:>12.0f}')
+
+
+def run_node(backends, number_of_values, value_size):
+    """measures writes and reads of values of <value_size> bytes
+    by node opened in this process"""
+    values = get_values(number_of_values, value_size)
+    print(f'{"backend":>20} {"writes/s":>12} {"reads/s":>12}')
+    for backend in backends:
+        dir_path = tempfile.mkdtemp()
+        try:
+            node = open_node(dir_path, backend)
+            writes = time_operations(node.put_bytes, values.items())
+            reads = time_operations(node.get_bytes,
+                                    [(key,) for key in values])
+            node.close()
+            print_row(backend, writes, reads)
+        finally:
+            shutil.rmtree(dir_path, ignore_errors=True)
+
+
+def start_server(dir_path, backend):
+    """starts NodeServer.py for node in <dir_path> in new process and
+    returns (process, address) when it accepts connections"""
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        port = sock.getsockname()[1]
+    server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'NodeServer.py')
+    process = subprocess.Popen(
+        [sys.executable, server_path, dir_path, str(port), '-b', backend],
+        stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            socket.create_connection(('localhost', port)).close()
+            return process, ('localhost', port)
+        except ConnectionRefusedError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError('node server did not start')
+            time.sleep(0.05)
+
+
+def run_server(backends, number_of_values, value_size):
+    """measures writes and reads of values of <value_size> bytes through
+    NodeServer.py by text protocol, by binary one waiting for every
+    answer and by binary one with pipelined requests"""
+    values = get_values(number_of_values, value_size)
+    # text protocol sends values as utf-8 command lines
+    text_values = {key: value.hex().encode('utf8')
+                   for key, value in values.items()}
+    reads = [(key,) for key in values]
+    print(f'{"backend, protocol":>20} {"writes/s":>12} {"reads/s":>12}')
+    for backend in backends:
+        dir_path = tempfile.mkdtemp()
+        process = None
+        try:
+            process, address = start_server(dir_path, backend)
+            text = TextConnection(socket.create_connection(address))
+            print_row(f'{backend}, text',
+                      time_operations(text.write, text_values.items()),
+                      time_operations(text.read, reads))
+            text.close()
+
+            binary = connect(address)
+            print_row(f'{backend}, binary',
+                      time_operations(binary.write, values.items()),
+                      time_operations(binary.read, reads))
+            print_row(f'{backend}, pipelined',
+                      time_pipelined(binary, protocol.OP_WRITE,
+                                     values.items()),
+                      time_pipelined(binary, protocol.OP_READ,
+                                     [(key, b'') for key in values]))
+            binary.shut()
+            binary.close()
+            process.wait(SERVER_START_TIMEOUT)
+        finally:
+            if process is not None and process.poll() is None:
+                process.kill()
+            shutil.rmtree(dir_path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='measures node: cost of choosing storage file for '
+                    'written chunk versus number of files, reads and '
+                    'writes of node and of node server')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    placement = commands.add_parser(
+        'placement', help='cost of choosing storage file for written '
+                          'chunk versus number of files of node')
+    placement.add_argument('-f', '--files', metavar='COUNT', type=int,
+                           nargs='+', default=[1000, 10000, 100000],
+                           help='numbers of files to measure')
+    placement.add_argument('-n', '--chunks', metavar='COUNT', type=int,
+                           default=1000, help='number of written chunks')
+
+    for name, help_text in (
+            ('node', 'writes and reads of node opened in this process'),
+            ('server', 'writes and reads through NodeServer.py by text '
+                       'and binary protocols')):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('-b', '--backends', choices=list(BACKENDS),
+                             nargs='+', default=list(BACKENDS),
+                             help='storage backends to measure')
+        command.add_argument('-n', '--values', metavar='COUNT', type=int,
+                             default=1000, help='number of written values')
+        command.add_argument('-s', '--size', metavar='BYTES', type=int,
+                             default=1000, help='size of every value')
+
+    args = parser.parse_args()
+    if args.command == 'placement':
+        run_placement(args.files, args.chunks)
+    elif args.command == 'node':
+        run_node(args.backends, args.values, args.size)
+    else:
+        run_server(args.backends, args.values, args.size)
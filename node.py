@@ -5,74 +5,550 @@ import argparse
 import sys
 import shutil
 import csv
-from Modules.single_file_controller import SFC, NUMBER_OF_KBYTES
+import functools
+import threading
+import io
+from bisect import bisect_left, insort
+from Modules.single_file_controller import SFC, get_capacity, \
+    get_descriptor_size, get_slot_size, MIN_BLOCK_SIZE, MAX_BLOCK_SIZE
+from Modules.volume import Volume
+from Modules.file_cache import FileCache, FILE_CACHE_SIZE
+from Modules.value_cache import ValueCache
+from Modules.log_storage import LogStorage, SEGMENT_SIZE
+from Modules.streams import ValueReader, ValueWriter, BufferedValueWriter
+from Modules.scan import scan_sorted
+
+COMPACTION_INTERVAL = 5.0
+COMPACTION_BUDGET = 64 * 1024
+MERGE_RATIO = 0.5
+
+DURABILITY_NONE = 'none'
+DURABILITY_BATCH = 'batch'
+DURABILITY_ALWAYS = 'always'
+DURABILITY_LEVELS = (DURABILITY_NONE, DURABILITY_BATCH, DURABILITY_ALWAYS)
+BATCH_INTERVAL = 0.01
+BATCH_SIZE = 64
+SCAN_PAGE = 1000
+
+
+def synchronized(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _fsync_path(path):
+    """flushes file or directory in <path> to disk"""
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def durable(method):
+    """makes changes of <method> durable before return according to
+    durability of node. nested calls are flushed by the outermost one"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            self._local.depth = depth
+        if depth == 0:
+            self._wait_durable()
+        return result
+    return wrapper
+
+
+class BaseNode:
+    """operations shared by all node backends"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._compaction = None
+
+    def __getitem__(self, key):
+        return self.get_value(key)
+
+    @durable
+    @synchronized
+    def __setitem__(self, key, value):
+        if key in self:
+            self.replace_data(key, value)
+        else:
+            self.write_data(key, value)
+
+    @durable
+    @synchronized
+    def write_multiple(self, **kwargs):
+        for key in kwargs:
+            self[key] = kwargs[key]
+
+    @durable
+    @synchronized
+    def del_multiple(self, case_sensitive, *keys):
+        for key in keys:
+            self.del_data(key, case_sensitive)
+
+    def _wait_durable(self):
+        """waits until committed changes are flushed to disk"""
+        pass
+
+    def get_stats(self):
+        """returns {name of cache: {name of counter: value}}"""
+        return {}
+
+    def iter_keys(self, prefix='', start_after=None, page_size=SCAN_PAGE):
+        """yields keys of scan(<prefix>, <start_after>) requesting them
+        by pages of <page_size> keys, so the lock is not held and the whole
+        keyspace is not kept in memory while keys are consumed"""
+        while True:
+            keys = self.scan(prefix, start_after, page_size)
+            yield from keys
+            if len(keys) < page_size:
+                return
+            start_after = keys[-1]
+
+    def check_files(self):
+        """looks for missing storage files, removes keys which were kept
+        in them and returns indexes of such files"""
+        return []
+
+    def open_reader(self, key):
+        """returns file-like object which reads utf-8 bytes of value
+        of <key>"""
+        return io.BytesIO(Parser.encode_value(self.get_value(key)[0]))
+
+    def open_writer(self, key):
+        """returns file-like object which writes utf-8 bytes of value
+        of <key> replacing the old one when it is closed"""
+        return BufferedValueWriter(self, key)
+
+    def start_compaction(self, interval=COMPACTION_INTERVAL,
+                         budget=COMPACTION_BUDGET):
+        """starts background thread which calls compact(<budget>)
+        every <interval> seconds"""
+        if self._compaction is not None:
+            return
+        stop = threading.Event()
+
+        def compact_periodically():
+            while not stop.wait(interval):
+                self.compact(budget)
+
+        thread = threading.Thread(target=compact_periodically, daemon=True)
+        self._compaction = (thread, stop)
+        thread.start()
+
+    def stop_compaction(self):
+        if self._compaction is None:
+            return
+        thread, stop = self._compaction
+        stop.set()
+        thread.join()
+        self._compaction = None
+
+    def process_args(self, args):
+        if args.empty:
+            self.clear()
+
+        elif args.contains is not None:
+            contains = self.contains_key(args.contains, args.reg)
+            if contains:
+                return ['YES']
+            return ['NO']
+
+        elif args.write is not None:
+            key, value = args.write
+            try:
+                self[key] = value
+            except ValueError:
+                return ['Error: key is to big']
+
+        elif args.write_multiple is not None:
+            if args.write_multiple:
+                data = args.write_multiple
+            else:
+                data = sys.stdin.readlines()
+                data = [a.rstrip() for a in data]
+            try:
+
+                def get_key_value(line):
+                    splits = list(csv.reader([line],
+                                             delimiter='=',
+                                             quotechar='"'))[0]
+                    if len(splits) <= 1:
+                        raise TypeError()
+                    return splits[0], '='.join(splits[1:])
+
+                data = dict(map(get_key_value, data))
+            except TypeError:
+                return ['Error: input is not in format KEY=VALUE']
+            try:
+                self.write_multiple(**data)
+            except ValueError:
+                return ['Error: key is to big']
+
+        elif args.read is not None:
+
+            def try_int(value):
+                if value is None:
+                    return None
+                return int(value)
+
+            key = args.read
+            r = list(map(try_int, args.range))
+            return list(self.get_value(key, args.reg, r))
+
+        elif args.delete is not None:
+            key = args.delete
+            self.del_data(key, args.reg)
+
+        elif args.delete_multiple is not None:
+            if args.delete_multiple:
+                data = args.delete_multiple
+            else:
+                data = sys.stdin.readlines()
+                data = list(set([a.rstrip() for a in data]))
+            self.del_multiple(args.reg, *data)
+
+        elif args.list:
+            if args.limit is not None:
+                return self.scan(args.prefix, args.start_after, args.limit)
+            return self.iter_keys(args.prefix, args.start_after)
+
+        elif args.check:
+            return [f'fixed files: {len(self.check_files())}']
+
+        elif args.stats:
+            return [f'{name}: ' + ' '.join(f'{counter}={value}'
+                                           for counter, value in stats.items())
+                    for name, stats in self.get_stats().items()]
+
+        elif args.migrate is not None:
+            try:
+                self.migrate(args.migrate or None)
+            except ValueError as e:
+                return [f'Error: {e}']
+
+        else:
+            return None
+
+    @staticmethod
+    def get_parser():
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument('-w', '--write', nargs=2, metavar=('KEY', 'VALUE'),
+                            help='writes VALUE to store by KEY and exit')
+
+        parser.add_argument('-W', '--write_multiple', nargs='*',
+                            metavar=('KEY=VALUE', 'KEY=VALUE'),
+                            help='''writes multiple VALUEs by its KEY,
+                                if no pairs were given - reads data from
+                                                                stdin''')
+
+        parser.add_argument('-r', '--read', metavar='KEY',
+                            help='read value by KEY in storage and exit')
+
+        parser.add_argument('-g', '--range', metavar=('START', 'END'), nargs=2,
+                            default=(None, None),
+                            help='if used with -r, outs values with range')
+
+        parser.add_argument('-d', '--delete', metavar='KEY',
+                            help='delete value in storage by KEY and exit')
+        parser.add_argument('-D', '--delete_multiple', nargs='*',
+                            metavar=('KEY', 'KEY'),
+                            help='''deletes multiple KEYs from node, if no KEY
+                                were given - reads data from stdin''')
+
+        parser.add_argument('-e', '--empty', action='store_true',
+                            default=False,
+                            help='clear the storage and exit')
+
+        parser.add_argument('-c', '--contains', metavar='KEY',
+                            help='writes whether node contains KEY')
+
+        parser.add_argument('-l', '--list', action='store_true', default=False,
+                            help='writes all keys in storage in sorted order '
+                                 'and exit')
+
+        parser.add_argument('--prefix', metavar='PREFIX', default='',
+                            help='if used with -l, writes only keys which '
+                                 'start with PREFIX')
+
+        parser.add_argument('--start_after', metavar='KEY', default=None,
+                            help='if used with -l, writes only keys which '
+                                 'follow KEY (the last key of previous page)')
+
+        parser.add_argument('--limit', metavar='COUNT', type=int,
+                            default=None,
+                            help='if used with -l, writes at most COUNT keys')
 
+        parser.add_argument('--check', action='store_true', default=False,
+                            help='''looks for missing storage files, removes
+                                keys kept in them and exit''')
 
-class Node:
+        parser.add_argument('--stats', action='store_true', default=False,
+                            help='writes counters of caches of node and exit')
+
+        parser.add_argument('-m', '--migrate', metavar='BLOCK_SIZE', type=int,
+                            help='''rewrites all values into storage files
+                                with BLOCK_SIZE bytes of data (0 for 3 KB
+                                files of the first version) and exit''')
+
+        parser.add_argument('-i', '--ignore_register', action='store_false',
+                            dest='reg',
+                            default=True,
+                            help='allows to ignore register in key')
+
+        return parser
+
+
+class Node(BaseNode):
     JSON_NAME = 'local_info.json'
 
-    def __init__(self, dir_path):
+    def __init__(self, dir_path, mapped_io=True, block_size=None,
+                 volume=False, file_cache_size=FILE_CACHE_SIZE,
+                 durability=DURABILITY_NONE, batch_interval=BATCH_INTERVAL,
+                 batch_size=BATCH_SIZE, value_cache_size=0):
+        super().__init__()
         self.dir_path = dir_path
+        self.mapped_io = mapped_io
+        self.file_cache = FileCache(file_cache_size)
+        self.value_cache = ValueCache(value_cache_size) \
+            if value_cache_size else None
+        self._compacted_sizes = {}
+        self._repair = None
+        # locations of chunks of values which are being written by
+        # ValueWriter, kept up to date when their chunks are moved
+        self._unfinished = {}
         info_file_name = os.path.join(dir_path, self.JSON_NAME)
 
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f'unknown durability {durability}')
+        self.durability = durability
+        self.batch_interval = batch_interval
+        self.batch_size = batch_size
+        self._dirty_files = set()
+        self._committed = 0
+        self._synced = 0
+        self._syncing = False
+        self._sync_condition = threading.Condition()
+        self._batch_full = threading.Event()
+
         if not os.path.isdir(dir_path):
             raise ValueError('no such directory')
 
+        if os.path.isdir(os.path.join(dir_path, LogNode.LOG_DIR)):
+            raise ValueError('directory contains node with log backend')
+
+        if block_size is not None \
+                and not MIN_BLOCK_SIZE <= block_size <= MAX_BLOCK_SIZE:
+            raise ValueError(f'block size out of range({MIN_BLOCK_SIZE}, '
+                             f'{MAX_BLOCK_SIZE})')
+
         if not os.path.isfile(info_file_name):
             shutil.rmtree(dir_path, ignore_errors=True)
             os.mkdir(dir_path)
-            self.info = Info(info_file_name, True)
+            self.info = Info(info_file_name, True, block_size, volume)
         else:
             self.info = Info(info_file_name)
+        self._load_format()
+        self._fix_missing_files()
+
+    def _load_format(self):
+        """sets capacity of storage files, opens volume of pack files
+        if node keeps storage files in it and builds index of free space:
+        list of (free bytes, file index) sorted for best fit search"""
+        self._free_order = sorted((size, i)
+                                  for i, size in enumerate(self.info.sizes))
+        self.capacity = get_capacity(self.info.block_size)
+        self.descriptor_size = get_descriptor_size(self.info.block_size)
+        self.volume = None
+        if self.info.volume:
+            self.volume = Volume(self.dir_path,
+                                 get_slot_size(self.info.block_size))
+
+    def _update_size(self, file_index, file):
+        """stores size of changed <file> by <file_index> in metadata
+        and index of free space"""
+        if file_index < len(self.info.sizes):
+            old_size = self.info.sizes[file_index]
+            del self._free_order[bisect_left(self._free_order,
+                                             (old_size, file_index))]
+        self.info.set_size(file_index, file.size)
+        insort(self._free_order, (file.size, file_index))
+        self._apply_moves(file_index, file)
+        if self.durability != DURABILITY_NONE:
+            self._dirty_files.add(file_index)
+
+    def _apply_moves(self, file_index, file):
+        """updates locations of unfinished values by records moved in
+        <file> by <file_index>. locations of written values are not
+        updated, they are looked up when chunks are not found"""
+        for moves in file.moves:
+            for locations in self._unfinished.values():
+                for location in locations:
+                    if location[0] == file_index and location[1] in moves:
+                        location[1] = moves[location[1]]
+        file.moves = []
+
+    def _commit(self):
+        """commits changes of metadata. they are flushed to disk
+        by _wait_durable() of the outermost durable method"""
+        self.info.commit()
+        if self.durability == DURABILITY_NONE:
+            return
+        self._committed += 1
+        if self._committed - self._synced >= self.batch_size:
+            self._batch_full.set()
+
+    def _wait_durable(self):
+        """flushes storage files and journal of metadata. of concurrent
+        callers only one (leader) flushes, the rest wait for it. in batch
+        mode leader waits <batch_interval> seconds or until <batch_size>
+        changes are committed to collect more changes into one flush"""
+        if self.durability == DURABILITY_NONE:
+            return
 
+        with self._sync_condition:
+            target = self._committed
+            while self._synced < target:
+                if not self._syncing:
+                    self._syncing = True
+                    break
+                self._sync_condition.wait()
+            else:
+                return
+
+        synced = self._synced
+        try:
+            if self.durability == DURABILITY_BATCH:
+                self._batch_full.wait(self.batch_interval)
+            with self._lock:
+                self._batch_full.clear()
+                synced = self._committed
+                paths = self._take_dirty_paths()
+            self._sync(paths)
+        finally:
+            with self._sync_condition:
+                self._synced = synced
+                self._syncing = False
+                self._sync_condition.notify_all()
+
+    def _take_dirty_paths(self):
+        """returns paths of storage files changed since the last flush.
+        pack of volume is listed once for all its changed slots"""
+        paths = {self._path(file_index) if self.volume is None
+                 else self.volume.locate(file_index)[0]
+                 for file_index in self._dirty_files}
+        self._dirty_files.clear()
+        return paths
+
+    def _sync(self, paths):
+        """flushes files in <paths>, journal of metadata and directory of
+        node. runs without lock, so files are flushed by their own
+        descriptors instead of cached ones which may be closed meanwhile"""
+        for path in paths:
+            try:
+                _fsync_path(path)
+            except FileNotFoundError:
+                continue
+        self.info.sync()
+        _fsync_path(self.dir_path)
+
+    @synchronized
+    def get_stats(self):
+        stats = {'file_cache': self.file_cache.get_stats()}
+        if self.value_cache is not None:
+            stats['value_cache'] = self.value_cache.get_stats()
+        return stats
+
+    @synchronized
     def __len__(self):
-        self._fix_missing_files()
         return len(self.info.transitions)
 
+    @synchronized
     def __iter__(self):
-        self._fix_missing_files()
-        return iter(self.info.transitions)
-
-    def __getitem__(self, key):
-        return self.get_value(key)
+        return iter(list(self.info.transitions))
 
-    def __setitem__(self, key, value):
-        if key in self:
-            self.replace_data(key, value)
-        else:
-            self.write_data(key, value)
+    @synchronized
+    def scan(self, prefix='', start_after=None, limit=None):
+        return self.info.transitions.scan(prefix, start_after, limit)
 
+    @synchronized
     def __contains__(self, key):
         return key in self.info.transitions
 
-    def write_multiple(self, **kwargs):
-        for key in kwargs:
-            self[key] = kwargs[key]
-
-    def del_multiple(self, case_sensitive, *keys):
-        for key in keys:
-            self.del_data(key, case_sensitive)
-
+    @synchronized
     def contains_key(self, key, case_sensitive=True):
         if case_sensitive:
             return key in self.info.transitions
         lower_key = key.casefold()
         return lower_key in self.info.alternatives
 
+    def close(self):
+        """waits for repair of missing files, closes cached storage files
+        and checkpoints metadata"""
+        if self._repair is not None:
+            self._repair.join()
+        with self._lock:
+            self.file_cache.invalidate()
+            self.info.checkpoint()
+
+    @synchronized
     def clear(self):
+        self.file_cache.invalidate()
+        self._forget_value()
         shutil.rmtree(self.dir_path, ignore_errors=True)
         os.mkdir(self.dir_path)
-        self.info.transitions = {}
-        self.info.sizes = []
-        self.info.alternatives = {}
-        self.info.dump()
-
+        self.info.reset()
+        self._compacted_sizes = {}
+        self._load_format()
+
+    @durable
+    @synchronized
+    def compact(self, budget=None):
+        """compacts storage files with the most free space first until
+        <budget> bytes are moved and returns number of moved bytes.
+        files that were not changed since their last compaction are skipped"""
+        sizes = self.info.sizes
+        candidates = [i for i in range(len(sizes))
+                      if 0 < sizes[i] < self.capacity
+                      and self._compacted_sizes.get(i) != sizes[i]]
+        candidates.sort(key=lambda i: sizes[i], reverse=True)
+
+        moved = 0
+        for file_index in candidates:
+            if budget is not None and moved >= budget:
+                break
+            try:
+                file = self._open_file(file_index, check=True)
+            except FileNotFoundError:
+                continue
+            file_moved = file.compact(
+                budget=None if budget is None else budget - moved)
+            moved += file_moved
+            if file_moved or file.size != sizes[file_index]:
+                self._update_size(file_index, file)
+            if len(file.empties) <= 1:
+                self._compacted_sizes[file_index] = file.size
+
+        self._commit()
+        return moved
+
+    @synchronized
     def get_value(self, key, case_sensitive=True, boundary=(None, None)):
         if case_sensitive:
-            value = self._get_value_by_key(key)
+            value = self._get_value_by_key(key, boundary)
             if value is None:
                 raise ValueError("key doesn't exists")
-            return [self._get_value_by_key(key, boundary)]
+            return [value]
 
         data = []
         lower_key = key.casefold()
@@ -84,306 +560,774 @@ class Node:
 
         return data
 
+    @synchronized
+    def get_bytes(self, key, boundary=(None, None)):
+        """returns bytes of value of <key> in <boundary> as memoryview.
+        value of one chunk is returned as view of read buffer"""
+        data = self._get_bytes_by_key(key, boundary)
+        if data is None:
+            raise ValueError("key doesn't exists")
+        return data
+
+    @synchronized
+    def get_all_bytes(self, key, boundary=(None, None)):
+        """returns list of bytes of values of all keys which are equal
+        to <key> ignoring register like get_value() does"""
+        lower_key = key.casefold()
+        if lower_key not in self.info.alternatives:
+            raise ValueError("key doesn't exists")
+        return [self.get_bytes(new_key, boundary)
+                for new_key in self.info.alternatives[lower_key]]
+
     def _get_value_by_key(self, key, boundary=(None, None)):
+        data = self._get_bytes_by_key(key, boundary)
+        return None if data is None else Parser.get_value(data)
+
+    def _get_bytes_by_key(self, key, boundary=(None, None)):
+        """returns bytes of value of <key> in <boundary> or None. whole
+        values are taken from value cache and put into it if it is on"""
+        if self.value_cache is None or key not in self:
+            return self._read_bytes(key, boundary)
+
+        value = self.value_cache.get(key)
+        if value is not None:
+            return memoryview(value)[boundary[0]:boundary[1]]
+        if tuple(boundary) != (None, None):
+            return self._read_bytes(key, boundary)
+
+        value = self._read_bytes(key)
+        if value is not None:
+            self.value_cache.put(key, value)
+        return value
+
+    def _forget_value(self, key=None):
+        """removes value of <key> (all values if None) from value cache"""
+        if self.value_cache is not None:
+            self.value_cache.invalidate(key)
+
+    def _read_bytes(self, key, boundary=(None, None)):
         if key not in self:
             return None
 
-        pathes = self.info.transitions[key]
-        all_bytes = bytearray()
-        for index in pathes:
-            path = self._path(index)
+        locations = self.info.transitions[key]
+        key_length = len(Parser.encode_key(key))
+        if any(isinstance(location, int) for location in locations):
+            # sizes of chunks are unknown, so whole value is read and sliced
+            start, end = 0, None
+        else:
+            length = sum(location[2] - key_length for location in locations)
+            start, end, _ = slice(*boundary).indices(length)
+            boundary = (None, None)
+
+        parts = []
+        found = list(locations)
+        position = 0
+        for i, location in enumerate(locations):
+            if end is not None:
+                chunk_start = position
+                position += location[2] - key_length
+                if position <= start or chunk_start >= end:
+                    continue
             try:
-                file = SFC(path, self.info.sizes[int(index)])
+                file, found[i], data = self._find_chunk(key, location,
+                                                        found[:i])
             except FileNotFoundError:
-                self._fix_missing_files()
+                self._schedule_repair()
                 return None
-            datas = file.get_data(Parser.get_index(key))
-
-            for data in datas:
-                new_key = Parser.get_key(data)
-                if key == new_key:
-                    all_bytes.extend(Parser.get_value_bytes(data))
-                    break
-            else:
+            if data is None:
                 return None
-        return Parser.get_value(all_bytes[boundary[0]:boundary[1]])
 
+            value_bytes = Parser.get_value_bytes(data)
+            if end is not None:
+                value_bytes = value_bytes[max(start - chunk_start, 0):
+                                          end - chunk_start]
+            parts.append(value_bytes)
+
+        if found != locations:
+            self.info.set_transitions(key, found)
+        data = parts[0] if len(parts) == 1 else memoryview(b''.join(parts))
+        return data[boundary[0]:boundary[1]]
+
+    def _find_chunk(self, key, location, found=(), check=False):
+        """returns (storage file, location, data) of chunk of <key> by its
+        <location>: [file index, local index, size] or file index only
+        (metadata of older versions). if chunk is not there (it was moved
+        by compaction or it is one of <found> ones) it is searched among
+        records with the same hash except <found> ones and returned with
+        its actual location. <check> is passed to _open_file().
+        data is None if chunk was not found"""
+        if isinstance(location, int):
+            file_index, local_index, size = location, None, None
+        else:
+            file_index, local_index, size = location
+
+        file = self._open_file(file_index, check=check)
+        index = Parser.get_index(key)
+        if local_index is not None \
+                and [file_index, local_index, size] not in found:
+            data = file.get_data_at(index, local_index, size)
+            if data is not None and Parser.get_key(data) == key:
+                return file, location, data
+
+        for local_index, data in zip(file.transitions.get(index, ()),
+                                     file.get_data(index) or ()):
+            location = [file_index, local_index, len(data)]
+            if location not in found and Parser.get_key(data) == key:
+                return file, location, data
+        return file, None, None
+
+    @staticmethod
+    def _get_file_index(location):
+        return location if isinstance(location, int) else location[0]
+
+    @durable
+    @synchronized
     def replace_data(self, key, value):
         if key not in self:
             raise ValueError("key doesn't exists")
 
-        self._fix_missing_files()
         self.del_data(key)
         self.write_data(key, value)
 
+    @durable
+    @synchronized
     def del_data(self, key, case_sensitive=True):
         lower_key = key.casefold()
         if case_sensitive:
             self._del_data_by_single_key(key)
-            self.info.alternatives[lower_key].remove(key)
-            if not self.info.alternatives[lower_key]:
-                del self.info.alternatives[lower_key]
-            self.info.dump()
+            self._commit()
             return
 
         if lower_key not in self.info.alternatives:
             raise ValueError("key doesn't exists")
 
-        for key in self.info.alternatives[lower_key]:
+        for key in list(self.info.alternatives[lower_key]):
             self._del_data_by_single_key(key)
-        del self.info.alternatives[lower_key]
-        self.info.dump()
+        self._commit()
 
     def _del_data_by_single_key(self, key):
         if key not in self:
             raise ValueError("key doesn't exists")
 
-        index = Parser.get_index(key)
-        pathses = self.info.transitions[key]
-        for file_index in pathses:
-            try:
-                file = SFC(self._path(file_index), self.info.sizes[file_index])
-            except FileNotFoundError:
-                self._fix_missing_files()
-                raise ValueError("key doesn't exists")
-            datas = file.get_data(index)
-
-            for i in range(len(datas)):
-                new_key, value = Parser.decode_pair(datas[i])
-
-                if new_key == key:
-                    file.del_data(index, i)
-                    self.info.sizes[self.info.transitions[key][i]] = file.size
-                    break
+        self._forget_value(key)
+        self._del_chunks(key, self.info.transitions[key])
+        self.info.del_transitions(key)
+        self._commit()
+
+    def open_reader(self, key):
+        """returns file-like object which reads utf-8 bytes of value
+        of <key> chunk by chunk"""
+        return ValueReader(self, key)
+
+    def open_writer(self, key):
+        """returns file-like object which writes utf-8 bytes of value
+        of <key> chunk by chunk. value replaces the old one when writer
+        is closed"""
+        return ValueWriter(self, key)
+
+    @synchronized
+    def _get_chunk_lengths(self, key):
+        """returns lengths of chunks of value of <key>"""
+        if key not in self:
+            raise ValueError("key doesn't exists")
 
-        del self.info.transitions[key]
-        self.info.dump()
+        locations = list(self.info.transitions[key])
+        for i, location in enumerate(locations):
+            if isinstance(location, int):
+                _, locations[i], data = self._find_chunk(key, location,
+                                                         locations[:i])
+                if data is None:
+                    raise ValueError("key doesn't exists")
+        if locations != self.info.transitions[key]:
+            self.info.set_transitions(key, locations)
+
+        key_length = len(Parser.encode_key(key))
+        return [location[2] - key_length for location in locations]
+
+    @synchronized
+    def _read_chunk(self, key, chunk_index):
+        """returns bytes of chunk of value of <key> by <chunk_index>"""
+        if key not in self:
+            raise ValueError("key doesn't exists")
 
+        locations = self.info.transitions[key]
+        _, location, data = self._find_chunk(key, locations[chunk_index],
+                                             locations[:chunk_index])
+        if data is None:
+            raise ValueError("key doesn't exists")
+        if location != locations[chunk_index]:
+            locations = list(locations)
+            locations[chunk_index] = location
+            self.info.set_transitions(key, locations)
+        return Parser.get_value_bytes(data)
+
+    def _get_chunk_size(self, key):
+        """returns number of bytes of value in one chunk"""
+        size = self.capacity - len(Parser.encode_key(key))
+        if size <= 0:
+            raise ValueError('key is to big')
+        return size
+
+    @synchronized
+    def _write_chunk(self, key, data, locations):
+        """writes chunk of unfinished value of <key> and appends its
+        location to <locations> which are kept up to date until value
+        is finished or discarded"""
+        self._unfinished[id(locations)] = locations
+        locations.append(self._write_short(key, data))
+
+    @durable
+    @synchronized
+    def _finish_value(self, key, data, locations):
+        """writes the last chunk <data> of value of <key> written in
+        chunks by <locations> and makes it replace the old one"""
+        self._write_chunk(key, data, locations)
+        self._unfinished.pop(id(locations))
+        self._forget_value(key)
+        if key in self:
+            self._del_chunks(key, self.info.transitions[key], locations)
+            self.info.del_transitions(key)
+        self.info.set_transitions(key, locations)
+        self._commit()
+
+    @synchronized
+    def _discard_chunks(self, key, locations):
+        self._unfinished.pop(id(locations), None)
+        self._del_chunks(key, locations)
+        self._commit()
+
+    def _del_chunks(self, key, locations, found=()):
+        """removes chunks of <key> by their <locations> from storage
+        files. chunks with <found> locations are not removed"""
+        self._del_chunks_multiple([(key, locations, found)])
+
+    def _del_chunks_multiple(self, values):
+        """removes chunks of values given as (key, locations, found) like
+        _del_chunks(). every storage file and its tables are written once"""
+        groups = {}
+        for key, locations, found in values:
+            index = Parser.get_index(key)
+            found = list(found)
+            for location in locations:
+                try:
+                    _, location, data = self._find_chunk(key, location,
+                                                         found, True)
+                except FileNotFoundError:
+                    self._fix_missing_files()
+                    raise ValueError("key doesn't exists")
+                if data is None:
+                    continue
+                found.append(location)
+                groups.setdefault(location[0], []).append(
+                    (index, location[1]))
+
+        for file_index, records in groups.items():
+            file = self._open_file(file_index, check=True)
+            file.del_multiple_at(records)
+            self._update_size(file_index, file)
+
+    @durable
+    @synchronized
     def write_data(self, key, value):
         if key in self:
             raise ValueError('key already in storage')
 
-        all_data = Parser.encode_value(value)
-        max_size = NUMBER_OF_KBYTES * 1024 - 2
-        key_data = Parser.encode_key(key)
-        self.info.transitions[key] = []
+        self.put_bytes(key, Parser.encode_value(value))
 
-        available_size = max_size - len(key_data)
-        num_of_divides = len(all_data) // available_size
-        for i in range(num_of_divides):
-            data_to_write = all_data[i*available_size:(i+1)*available_size]
-            write_index = self._write_short(key, data_to_write)
-            self.info.transitions[key].append(write_index)
+    @durable
+    @synchronized
+    def put_bytes(self, key, data):
+        """writes bytes-like <data> by <key> replacing the old value.
+        chunks are written as views of <data> without copying"""
+        self._put_multiple({key: data})
 
-        data_to_write = all_data[num_of_divides * available_size:]
-        write_index = self._write_short(key, data_to_write)
-        self.info.transitions[key].append(write_index)
+    def _split_value(self, key, data):
+        """returns views of chunks of bytes-like <data> of value of <key>"""
+        data = memoryview(data).cast('B')
+        available_size = self._get_chunk_size(key)
+        full_size = len(data) // available_size * available_size
 
-        lower_key = key.casefold()
-        if lower_key in self.info.alternatives:
-            self.info.alternatives[lower_key].append(key)
-        else:
-            self.info.alternatives[lower_key] = [key]
-        self.info.dump()
+        chunks = [data[i:i + available_size]
+                  for i in range(0, full_size, available_size)]
+        chunks.append(data[full_size:])
+        return chunks
+
+    @durable
+    @synchronized
+    def write_multiple(self, **kwargs):
+        """writes values of <kwargs> by their keys replacing old values.
+        values are written as one batch (see _put_multiple())"""
+        self._put_multiple({key: Parser.encode_value(value)
+                            for key, value in kwargs.items()})
+
+    def _put_multiple(self, values):
+        """writes bytes-like values of <values> dict by their keys
+        replacing old values. chunks of all values are packed into storage
+        files at once, every touched file and its tables are written once
+        and metadata is committed once"""
+        records = []
+        counts = {}
+        for key, data in values.items():
+            key_data = Parser.encode_key(key)
+            chunks = self._split_value(key, data)
+            for number, chunk in enumerate(chunks):
+                size = len(key_data) + len(chunk)
+                if size > self.capacity:
+                    raise ValueError('data size is to big')
+                records.append((key, number, size, [key_data, chunk]))
+            counts[key] = len(chunks)
+
+        file_indexes = self._pack_chunks([record[2] for record in records])
+        groups = {}
+        for record, file_index in zip(records, file_indexes):
+            groups.setdefault(file_index, []).append(record)
+        while len(self.info.sizes) <= max(groups, default=-1):
+            self._add_new_file()
+
+        locations = {}
+        try:
+            for file_index, group in groups.items():
+                file = self._open_file(file_index, check=True)
+                local_indexes = file.write_multiple(
+                    [(Parser.get_index(key), parts)
+                     for key, _, _, parts in group])
+                self._update_size(file_index, file)
+                for (key, number, size, _), local_index \
+                        in zip(group, local_indexes):
+                    locations[key, number] = [file_index, local_index, size]
+        except FileNotFoundError:
+            self._del_chunks_multiple([(key, [location], ()) for (key, _),
+                                       location in locations.items()])
+            self._fix_missing_files()
+            return self._put_multiple(values)
+
+        new_locations = {key: [locations[key, number]
+                               for number in range(counts[key])]
+                         for key in values}
+        self._del_chunks_multiple(
+            [(key, self.info.transitions[key], new_locations[key])
+             for key in values if key in self])
+        for key in values:
+            self._forget_value(key)
+            self.info.set_transitions(key, new_locations[key])
+        self._commit()
+
+    def _pack_chunks(self, sizes):
+        """assigns chunks of <sizes> to storage files by best fit
+        decreasing and returns list of indexes of files. chunks which fit
+        into no existing file get indexes of new files"""
+        free = list(self._free_order)
+        new_index = len(self.info.sizes)
+        file_indexes = [None] * len(sizes)
+
+        for i in sorted(range(len(sizes)), key=sizes.__getitem__,
+                        reverse=True):
+            position = bisect_left(free, (sizes[i], -1))
+            if position == len(free):
+                free_size, file_index = self.capacity, new_index
+                new_index += 1
+            else:
+                free_size, file_index = free.pop(position)
+            file_indexes[i] = file_index
+            insort(free, (free_size - sizes[i] - self.descriptor_size,
+                          file_index))
+        return file_indexes
+
+    @durable
+    @synchronized
+    def del_multiple(self, case_sensitive, *keys):
+        """removes values of <keys> (all their alternatives if not
+        <case_sensitive>) as one batch: every touched storage file
+        and its tables are written once and metadata is committed once"""
+        removed = []
+        for key in keys:
+            if case_sensitive:
+                if key not in self:
+                    raise ValueError("key doesn't exists")
+                removed.append(key)
+            else:
+                lower_key = key.casefold()
+                if lower_key not in self.info.alternatives:
+                    raise ValueError("key doesn't exists")
+                removed.extend(self.info.alternatives[lower_key])
+        removed = list(dict.fromkeys(removed))
+
+        self._del_chunks_multiple([(key, self.info.transitions[key], ())
+                                   for key in removed])
+        for key in removed:
+            self._forget_value(key)
+            self.info.del_transitions(key)
+        self._commit()
 
     def _write_short(self, key, data_bytes):
+        """writes chunk of value of <key> and returns its location"""
         key_data = Parser.encode_key(key)
-        key_data.extend(data_bytes)
 
-        size = len(key_data)
-        if size > NUMBER_OF_KBYTES * 1024 - 2:
+        size = len(key_data) + len(data_bytes)
+        if size > self.capacity:
             raise ValueError('data size is to big')
 
-        file_index = self._get_best_file_index(len(key_data))
-        path = self._path(file_index)
+        file_index = self._get_best_file_index(size)
         if file_index is None:
             file_index = self._create_new_file()
-            path = self._path(file_index)
 
         index = Parser.get_index(key)
         try:
-            file = SFC(path, self.info.sizes[int(file_index)])
+            file = self._open_file(int(file_index), check=True)
         except FileNotFoundError:
             self._fix_missing_files()
             return self._write_short(key, data_bytes)
-        file.write_data(data=key_data, index=index)
-        self.info.sizes[int(file_index)] = file.size
-        return file_index
+        local_index = file.write_data(data=[key_data, data_bytes],
+                                      index=index)
+        self._update_size(int(file_index), file)
+        return [int(file_index), local_index, size]
+
+    @synchronized
+    def migrate(self, block_size=None, volume=None):
+        """rewrites all values into new storage files with <block_size>
+        bytes of data (None for 3 KB files of the first version), placed
+        into volume of pack files if <volume> (current placement if None)"""
+        if volume is None:
+            volume = self.info.volume
+        if block_size == self.info.block_size and volume == self.info.volume:
+            return
+
+        dir_path = os.path.normpath(self.dir_path)
+        new_path = dir_path + '.migrate'
+        old_path = dir_path + '.old'
+        shutil.rmtree(new_path, ignore_errors=True)
+        os.mkdir(new_path)
+        new_node = None
+        try:
+            new_node = Node(new_path, self.mapped_io, block_size, volume)
+            for key in list(self):
+                data = self._get_bytes_by_key(key)
+                if data is not None:
+                    new_node.put_bytes(key, data)
+        except BaseException:
+            shutil.rmtree(new_path, ignore_errors=True)
+            raise
+        finally:
+            if new_node is not None:
+                new_node.close()
+
+        self.file_cache.invalidate()
+        os.rename(dir_path, old_path)
+        os.rename(new_path, dir_path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        self.info = Info(os.path.join(self.dir_path, self.JSON_NAME))
+        self._load_format()
+        self._compacted_sizes = {}
 
     def _path(self, index):
         return os.path.join(self.dir_path, str(index))
 
+    def _open_file(self, index, create_new=False, check=False):
+        """returns storage file by <index> from file cache. the file
+        stays opened until it is evicted from the cache. cached file is
+        checked to be still in its path if <check>, so changes are not
+        written into deleted files"""
+        path, offset = self._path(index), None
+        if self.volume is not None:
+            if create_new:
+                self.volume.allocate(index)
+            elif index not in self.volume:
+                self.file_cache.invalidate(index)
+                raise FileNotFoundError(f'slot {index} is not allocated')
+            path, offset = self.volume.locate(index)
+
+        if create_new:
+            self.file_cache.invalidate(index)
+            file = SFC(path, create_new=True, mapped=self.mapped_io,
+                       block_size=self.info.block_size, offset=offset)
+            return self.file_cache.put(index, path, file)
+        return self.file_cache.get(
+            index, path, lambda: SFC(path, self.info.sizes[index],
+                                     mapped=self.mapped_io, offset=offset),
+            check)
+
     def _create_new_file(self):
+        path = self._add_new_file()
+        self._commit()
+        return path
+
+    def _add_new_file(self):
+        """creates the next storage file without committing metadata
+        and returns its index"""
         path = len(self.info.sizes)
-        if os.path.isfile(self._path(path)):
+        if self.volume is None and os.path.isfile(self._path(path)):
             os.remove(self._path(path))
-        file = SFC(self._path(path), create_new=True)
-        self.info.sizes.append(file.size)
-        self.info.dump()
+        file = self._open_file(path, create_new=True)
+        self._update_size(path, file)
         return path
 
     def _get_best_file_index(self, size):
-        min_difference = NUMBER_OF_KBYTES * 1024
-        index = -1
+        """returns index of file with the least free space which is
+        at least <size> or None if there is no such file"""
+        position = bisect_left(self._free_order, (size, -1))
+        if position == len(self._free_order):
+            return None
+        return self._free_order[position][1]
 
-        for i in range(len(self.info.sizes)):
-            difference = self.info.sizes[i] - size
+    @durable
+    @synchronized
+    def check_files(self):
+        return self._fix_missing_files()
 
-            if 0 <= difference < min_difference:
-                index = i
-                min_difference = difference
+    def _schedule_repair(self):
+        """starts background thread which fixes missing storage files
+        unless one is running, so reads do not wait for the repair"""
+        if self._repair is not None and self._repair.is_alive():
+            return
+        self._repair = threading.Thread(target=self.check_files, daemon=True)
+        self._repair.start()
 
-        return None if index == - 1 else index
+    def _get_missing_files(self):
+        """returns indexes of storage files which do not exist. directory
+        of node is listed once instead of checking every file"""
+        if self.volume is not None:
+            return self.volume.get_missing(len(self.info.sizes))
 
-    def _fix_missing_files(self):
-        missing_indexes = [i for i in range(len(self.info.sizes))
-                           if not os.path.isfile(self._path(i))]
+        with os.scandir(self.dir_path) as entries:
+            names = {entry.name for entry in entries}
+        return [i for i in range(len(self.info.sizes)) if str(i) not in names]
 
+    @synchronized
+    def _fix_missing_files(self):
+        """removes keys which had chunks in missing storage files and
+        recreates these files empty. runs when node is opened, when
+        storage file can not be opened for a change and in background when
+        it can not be opened for a read. returns indexes of fixed files"""
+        self.file_cache.validate()
+        missing_indexes = self._get_missing_files()
         if not missing_indexes:
-            return
+            return []
 
+        for file_index in missing_indexes:
+            self.file_cache.invalidate(file_index)
         mis = set(missing_indexes)
         missing_keys = {}
-        for key in self.info.transitions:
-            key_set = set(map(int, self.info.transitions[key]))
-            if mis & key_set:
-                missing_keys[key] = list(key_set - mis)
+        for key, locations in self.info.transitions.items():
+            if any(self._get_file_index(location) in mis
+                   for location in locations):
+                missing_keys[key] = [
+                    location for location in locations
+                    if self._get_file_index(location) not in mis]
 
         for key in missing_keys:
-            index_in_file = Parser.get_index(key)
-            for file_index in missing_keys[key]:
-                file = SFC(self._path(file_index), self.info.sizes[file_index])
-                datas = file.get_data(index_in_file)
-
-                for i in range(len(datas)):
-                    new_key = Parser.get_key(datas[i])
-                    if new_key == key:
-                        file.del_data(index_in_file, i)
-                        self.info.sizes[file_index] = file.size
-                        break
-
-            self.info.alternatives[key.casefold()].remove(key)
-            if not self.info.alternatives[key.casefold()]:
-                del self.info.alternatives[key.casefold()]
-            del self.info.transitions[key]
+            self._forget_value(key)
+            self._del_chunks(key, missing_keys[key])
+            self.info.del_transitions(key)
 
         for file_index in missing_indexes:
-            file = SFC(self._path(file_index), create_new=True)
-            self.info.sizes[file_index] = file.size
-        self.info.dump()
+            file = self._open_file(file_index, create_new=True)
+            self._update_size(file_index, file)
+        self._commit()
+        return missing_indexes
 
-    def process_args(self, args):
-        if args.empty:
-            self.clear()
 
-        elif args.contains is not None:
-            contains = self.contains_key(args.contains, args.reg)
-            if contains:
-                return ['YES']
-            return ['NO']
+class LogNode(BaseNode):
+    """node which appends values to segment files of log storage
+    (see Modules/log_storage.py) instead of placing them into
+    storage files"""
+    LOG_DIR = 'log'
 
-        elif args.write is not None:
-            key, value = args.write
-            try:
-                self[key] = value
-            except ValueError:
-                return ['Error: key is to big']
+    def __init__(self, dir_path, segment_size=SEGMENT_SIZE):
+        super().__init__()
+        self.dir_path = dir_path
+        log_path = os.path.join(dir_path, self.LOG_DIR)
 
-        elif args.write_multiple is not None:
-            if args.write_multiple:
-                data = args.write_multiple
-            else:
-                data = sys.stdin.readlines()
-                data = [a.rstrip() for a in data]
-            try:
+        if not os.path.isdir(dir_path):
+            raise ValueError('no such directory')
 
-                def get_key_value(line):
-                    splits = list(csv.reader([line],
-                                             delimiter='=',
-                                             quotechar='"'))[0]
-                    if len(splits) <= 1:
-                        raise TypeError()
-                    return splits[0], '='.join(splits[1:])
+        if os.path.isfile(os.path.join(dir_path, Node.JSON_NAME)):
+            raise ValueError('directory contains node with sfc backend')
 
-                data = dict(map(get_key_value, data))
-            except TypeError:
-                return ['Error: input is not in format KEY=VALUE']
-            try:
-                self.write_multiple(**data)
-            except ValueError:
-                return ['Error: key is to big']
+        if not os.path.isdir(log_path):
+            shutil.rmtree(dir_path, ignore_errors=True)
+            os.mkdir(dir_path)
 
-        elif args.read is not None:
+        self.storage = LogStorage(log_path, segment_size)
+        self.alternatives = {}
+        for key in self.storage:
+            self._add_alternative(key)
+        self._sorted_keys = sorted(self.storage)
 
-            def try_int(value):
-                if value is None:
-                    return None
-                return int(value)
+    @synchronized
+    def __len__(self):
+        return len(self.storage)
 
-            key = args.read
-            r = list(map(try_int, args.range))
-            return list(self.get_value(key, args.reg, r))
+    @synchronized
+    def __iter__(self):
+        return iter(list(self.storage))
 
-        elif args.delete is not None:
-            key = args.delete
-            self.del_data(key, args.reg)
+    @synchronized
+    def __contains__(self, key):
+        return key in self.storage
 
-        elif args.delete_multiple is not None:
-            if args.delete_multiple:
-                data = args.delete_multiple
-            else:
-                data = sys.stdin.readlines()
-                data = list(set([a.rstrip() for a in data]))
-            self.del_multiple(args.reg, *data)
+    def close(self):
+        self.stop_compaction()
+        self.storage.close()
 
-        elif args.list:
-            return list(self)
+    @synchronized
+    def contains_key(self, key, case_sensitive=True):
+        if case_sensitive:
+            return key in self.storage
+        return key.casefold() in self.alternatives
+
+    @synchronized
+    def clear(self):
+        self.storage.clear()
+        self.alternatives = {}
+        self._sorted_keys = []
+
+    def migrate(self, block_size=None):
+        raise ValueError('log backend has no storage files to migrate')
 
+    def compact(self, budget=None):
+        """merges closed segments if at least MERGE_RATIO of them is
+        taken by dead records and returns number of reclaimed bytes"""
+        if self.storage.garbage_ratio() < MERGE_RATIO:
+            return 0
+        return self.storage.merge(budget)
+
+    @synchronized
+    def get_value(self, key, case_sensitive=True, boundary=(None, None)):
+        if case_sensitive:
+            keys = [key] if key in self.storage else []
         else:
-            return None
+            keys = self.alternatives.get(key.casefold(), [])
+        if not keys:
+            raise ValueError("key doesn't exists")
 
-    @staticmethod
-    def get_parser():
-        parser = argparse.ArgumentParser(add_help=False)
-        parser.add_argument('-w', '--write', nargs=2, metavar=('KEY', 'VALUE'),
-                            help='writes VALUE to store by KEY and exit')
+        return [Parser.get_value(self.storage.get(k, *boundary))
+                for k in keys]
 
-        parser.add_argument('-W', '--write_multiple', nargs='*',
-                            metavar=('KEY=VALUE', 'KEY=VALUE'),
-                            help='''writes multiple VALUEs by its KEY,
-                                if no pairs were given - reads data from
-                                                                stdin''')
+    @synchronized
+    def get_bytes(self, key, boundary=(None, None)):
+        if key not in self.storage:
+            raise ValueError("key doesn't exists")
+        return memoryview(self.storage.get(key, *boundary))
 
-        parser.add_argument('-r', '--read', metavar='KEY',
-                            help='read value by KEY in storage and exit')
+    @synchronized
+    def get_all_bytes(self, key, boundary=(None, None)):
+        keys = self.alternatives.get(key.casefold(), [])
+        if not keys:
+            raise ValueError("key doesn't exists")
+        return [memoryview(self.storage.get(k, *boundary)) for k in keys]
 
-        parser.add_argument('-g', '--range', metavar=('START', 'END'), nargs=2,
-                            default=(None, None),
-                            help='if used with -r, outs values with range')
+    @synchronized
+    def put_bytes(self, key, data):
+        Parser.encode_key(key)
+        if key not in self.storage:
+            self._add_key(key)
+        self.storage.put(key, memoryview(data).cast('B'))
 
-        parser.add_argument('-d', '--delete', metavar='KEY',
-                            help='delete value in storage by KEY and exit')
-        parser.add_argument('-D', '--delete_multiple', nargs='*',
-                            metavar=('KEY', 'KEY'),
-                            help='''deletes multiple KEYs from node, if no KEY
-                                were given - reads data from stdin''')
+    @synchronized
+    def replace_data(self, key, value):
+        if key not in self:
+            raise ValueError("key doesn't exists")
+        self.storage.put(key, Parser.encode_value(value))
 
-        parser.add_argument('-e', '--empty', action='store_true',
-                            default=False,
-                            help='clear the storage and exit')
+    @synchronized
+    def del_data(self, key, case_sensitive=True):
+        if case_sensitive:
+            keys = [key] if key in self.storage else []
+        else:
+            keys = list(self.alternatives.get(key.casefold(), []))
+        if not keys:
+            raise ValueError("key doesn't exists")
 
-        parser.add_argument('-c', '--contains', metavar='KEY',
-                            help='writes whether node contains KEY')
+        for k in keys:
+            self.storage.delete(k)
+            self._remove_key(k)
 
-        parser.add_argument('-l', '--list', action='store_true', default=False,
-                            help='writes all keys in storage and exit')
+    @synchronized
+    def write_data(self, key, value):
+        if key in self:
+            raise ValueError('key already in storage')
+        Parser.encode_key(key)
+        self.storage.put(key, Parser.encode_value(value))
+        self._add_key(key)
 
-        parser.add_argument('-i', '--ignore_register', action='store_false',
-                            dest='reg',
-                            default=True,
-                            help='allows to ignore register in key')
+    @synchronized
+    def scan(self, prefix='', start_after=None, limit=None):
+        """returns sorted keys which start with <prefix> and are greater
+        than <start_after>, at most <limit> ones"""
+        return scan_sorted(self._sorted_keys, prefix, start_after, limit)
 
-        return parser
+    def _add_key(self, key):
+        self._add_alternative(key)
+        insort(self._sorted_keys, key)
+
+    def _remove_key(self, key):
+        self._remove_alternative(key)
+        del self._sorted_keys[bisect_left(self._sorted_keys, key)]
+
+    def _add_alternative(self, key):
+        lower_key = key.casefold()
+        if lower_key in self.alternatives:
+            self.alternatives[lower_key].append(key)
+        else:
+            self.alternatives[lower_key] = [key]
+
+    def _remove_alternative(self, key):
+        lower_key = key.casefold()
+        self.alternatives[lower_key].remove(key)
+        if not self.alternatives[lower_key]:
+            del self.alternatives[lower_key]
+
+
+BACKENDS = {'sfc': Node, 'log': LogNode}
+
+
+def open_node(dir_path, backend=None, **options):
+    """opens node in <dir_path>. backend of existing node is detected by
+    its files, new node is created with given <backend> ('sfc' if None).
+    <options> (block_size, volume, durability...) which are set
+    are passed to node of sfc backend"""
+    if os.path.isdir(os.path.join(dir_path, LogNode.LOG_DIR)):
+        existing = 'log'
+    elif os.path.isfile(os.path.join(dir_path, Node.JSON_NAME)):
+        existing = 'sfc'
+    else:
+        existing = None
+
+    if None not in (backend, existing) and backend != existing:
+        raise ValueError(f'directory contains node with {existing} backend')
+
+    backend = existing or backend or 'sfc'
+    options = {name: value for name, value in options.items()
+               if value not in (None, False)}
+    if backend != 'sfc':
+        if options:
+            raise ValueError(f'{backend} backend does not support '
+                             f'{", ".join(options)}')
+        return BACKENDS[backend](dir_path)
+    return Node(dir_path, **options)
+
+
+def stream(node, args):
+    """streams value from stdin for -w KEY - and value to stdout for
+    -r KEY without loading the whole value into memory. returns whether
+    <args> were processed"""
+    if args.write is not None and args.write[1] == '-':
+        try:
+            with node.open_writer(args.write[0]) as writer:
+                shutil.copyfileobj(sys.stdin.buffer, writer)
+        except ValueError:
+            if not args.silent:
+                print('Error: key is to big')
+        return True
+
+    if args.read is not None and args.reg and args.range == (None, None):
+        with node.open_reader(args.read) as reader:
+            if not args.silent:
+                shutil.copyfileobj(reader, sys.stdout.buffer)
+                sys.stdout.buffer.write(b'\n')
+        return True
+
+    return False
 
 
 def answer():
@@ -401,8 +1345,31 @@ def answer():
                         default=False,
                         help='makes program write nothing to the output')
 
+    parser.add_argument('-b', '--backend', choices=list(BACKENDS),
+                        default=None,
+                        help='storage backend of new node (sfc by default)')
+
+    parser.add_argument('--block_size', metavar='BYTES', type=int,
+                        default=None,
+                        help='''size of data region of storage files of new
+                            node (3 KB files of the first version
+                            by default)''')
+
+    parser.add_argument('--volume', action='store_true', default=False,
+                        help='''keeps storage files of new node as slots of
+                            a few large pack files''')
+
+    parser.add_argument('--durability', choices=DURABILITY_LEVELS,
+                        default=None,
+                        help='''flushes changes to disk before exit if
+                            not none (none by default)''')
+
     args = parser.parse_args()
-    node = Node(args.DIRECTORY)
+    node = open_node(args.DIRECTORY, args.backend,
+                     block_size=args.block_size, volume=args.volume,
+                     durability=args.durability)
+    if stream(node, args):
+        return
     result = node.process_args(args)
     if not args.silent and result is not None:
         for line in result:
@@ -0,0 +1,110 @@
+import unittest
+import socket
+import threading
+from unittest import mock
+from Modules.connection_pool import ConnectionPool
+
+
+class FakeConnection:
+    shared = False
+
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+    def ping(self):
+        if not self.alive:
+            raise socket.error('connection was lost')
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.connections = []
+        self.time = 100.0
+        patcher = mock.patch('Modules.connection_pool.time.monotonic',
+                             lambda: self.time)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self):
+        connection = FakeConnection()
+        self.connections.append(connection)
+        return connection
+
+    def test_checkout(self):
+        pool = ConnectionPool(self.connect, 2)
+        first = pool.checkout()
+        second = pool.checkout()
+        self.assertIsNot(first, second)
+
+        taken = []
+        waiting = threading.Thread(target=lambda: taken.append(
+            pool.checkout()))
+        waiting.start()
+        pool.checkin(first)
+        waiting.join(1)
+        self.assertEqual([first], taken)
+        self.assertEqual(2, len(self.connections))
+        pool.checkin(first)
+
+        with self.assertRaises(socket.error):
+            with pool.connection():
+                raise socket.error('connection was lost')
+        self.assertEqual(1, pool.get_stats()['broken'])
+        self.assertTrue(first.closed)
+        with pool.connection() as connection:
+            self.assertIs(self.connections[2], connection)
+
+    def test_shared(self):
+        def connect():
+            connection = self.connect()
+            connection.shared = True
+            return connection
+
+        pool = ConnectionPool(connect, 1)
+        with pool.connection() as first:
+            with pool.connection() as second:
+                self.assertIs(first, second)
+        self.assertTrue(pool.get_stats()['shared'])
+
+        with self.assertRaises(socket.error):
+            with pool.connection():
+                raise socket.error('connection was lost')
+        self.assertTrue(first.closed)
+        self.assertEqual(1, pool.get_stats()['broken'])
+        self.assertFalse(pool.get_stats()['shared'])
+        with pool.connection() as third:
+            self.assertIsNot(first, third)
+        pool.close()
+        self.assertTrue(third.closed)
+        self.assertEqual(0, pool.get_stats()['opened'])
+
+    def test_health_check_and_reaping(self):
+        pool = ConnectionPool(self.connect, 2, idle_timeout=60,
+                              check_interval=5)
+        first, second = pool.checkout(), pool.checkout()
+        pool.checkin(first)
+        self.time += 10
+        pool.checkin(second)
+        second.alive = False
+        self.time += 10
+        self.assertIs(first, pool.checkout())
+        self.assertTrue(second.closed)
+        pool.checkin(first)
+
+        self.time += 100
+        connection = pool.checkout()
+        self.assertTrue(first.closed)
+        self.assertEqual(3, len(self.connections))
+        self.assertEqual(1, pool.get_stats()['reaped'])
+
+        pool.close()
+        self.assertFalse(connection.closed)
+        pool.checkin(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(0, pool.get_stats()['opened'])
+        with self.assertRaises(socket.error):
+            pool.checkout()
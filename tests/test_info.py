@@ -1,16 +1,77 @@
 import unittest
 import os
-from Modules.info import Info
+import json
+from Modules.info import Info, JOURNAL_SUFFIX, INDEX_SUFFIX
 
 
 class InfoTests(unittest.TestCase):
     JSON_PATH = 'tests.json'
 
     def tearDown(self):
-        if os.path.isfile(self.JSON_PATH):
-            os.remove(self.JSON_PATH)
+        for path in (self.JSON_PATH, self.JSON_PATH + JOURNAL_SUFFIX,
+                     self.JSON_PATH + INDEX_SUFFIX):
+            if os.path.isfile(path):
+                os.remove(path)
 
     def test_creation(self):
         info = Info(self.JSON_PATH, True)
-        self.assertListEqual([], info.sizes)
-        self.assertDictEqual({}, info.transitions)
+        self.assertListEqual([], list(info.sizes))
+        self.assertDictEqual({}, dict(info.transitions))
+
+    def test_journal_replay(self):
+        info = Info(self.JSON_PATH, True)
+        info.set_size(0, 100)
+        info.set_transitions('Key', [0])
+        info.commit()
+        info.set_transitions('key', [0, 1])
+        info.set_size(1, 50)
+        info.del_transitions('Key')
+        info.set_size(0, 70)
+        info.commit()
+        self.assertTrue(os.path.isfile(self.JSON_PATH + JOURNAL_SUFFIX))
+        loaded = Info(self.JSON_PATH)
+        self.assertListEqual([70, 50], list(loaded.sizes))
+        self.assertDictEqual({'key': [0, 1]}, dict(loaded.transitions))
+        self.assertListEqual(['key'], loaded.alternatives['key'])
+
+    def test_torn_journal(self):
+        info = Info(self.JSON_PATH, True)
+        info.set_size(0, 100)
+        info.commit()
+        with open(self.JSON_PATH + JOURNAL_SUFFIX, 'a') as file:
+            file.write('["sizes", 1, 2')
+        loaded = Info(self.JSON_PATH)
+        self.assertListEqual([100], list(loaded.sizes))
+        loaded.set_size(1, 30)
+        loaded.commit()
+        self.assertListEqual([100, 30], list(Info(self.JSON_PATH).sizes))
+
+    def test_checkpoint(self):
+        info = Info(self.JSON_PATH, True, checkpoint_records=3)
+        info.set_size(0, 1)
+        info.set_size(1, 2)
+        info.commit()
+        self.assertTrue(os.path.isfile(self.JSON_PATH + JOURNAL_SUFFIX))
+        info.set_size(2, 3)
+        info.commit()
+        self.assertFalse(os.path.isfile(self.JSON_PATH + JOURNAL_SUFFIX))
+        self.assertListEqual([1, 2, 3], list(Info(self.JSON_PATH).sizes))
+
+    def test_legacy_snapshot(self):
+        with open(self.JSON_PATH, 'w') as file:
+            json.dump({'transitions': {'Key': [[0, 0, 5]], 'key': [1]},
+                       'alternatives': {'key': ['Key', 'key']},
+                       'sizes': [100, 200], 'block_size': None}, file)
+        with open(self.JSON_PATH + JOURNAL_SUFFIX, 'w') as file:
+            file.write('["transitions", "Key", null]\n')
+            file.write('["alternatives", "key", ["key"]]\n')
+
+        info = Info(self.JSON_PATH)
+        self.assertDictEqual({'key': [1]}, dict(info.transitions))
+        self.assertListEqual(['key'], info.alternatives['key'])
+        self.assertListEqual([100, 200], list(info.sizes))
+        info.dump()
+        self.assertTrue(os.path.isfile(self.JSON_PATH + INDEX_SUFFIX))
+        loaded = Info(self.JSON_PATH)
+        self.assertDictEqual({'key': [1]}, dict(loaded.transitions))
+        self.assertListEqual([100, 200], list(loaded.sizes))
@@ -0,0 +1,86 @@
+import unittest
+import io
+import random
+from Modules.key_index import KeyIndex
+
+
+class KeyIndexTests(unittest.TestCase):
+    def test_mapping(self):
+        index = KeyIndex()
+        index['key'] = [[0, 10, 20], [1, 0, 5]]
+        index['Key'] = [3]
+        self.assertEqual(2, len(index))
+        self.assertIn('Key', index)
+        self.assertNotIn('KEY', index)
+        self.assertEqual([[0, 10, 20], [1, 0, 5]], index['key'])
+        self.assertEqual([3], index['Key'])
+        self.assertEqual(['key', 'Key'], index.alternatives['key'])
+
+        index['key'] = [[2, 0, 1]]
+        del index['Key']
+        self.assertEqual([('key', [[2, 0, 1]])], list(index.items()))
+        self.assertEqual(['key'], index.alternatives['key'])
+        del index['key']
+        self.assertNotIn('key', index.alternatives)
+        with self.assertRaises(KeyError):
+            t = index['key']
+
+    def test_random_changes(self):
+        random.seed(0)
+        index = KeyIndex()
+        expected = {}
+        keys = [random.choice('aAbBßSs') + str(i % 700) for i in range(3000)]
+        for step in range(20000):
+            key = random.choice(keys)
+            if random.random() < 0.6:
+                expected[key] = [[random.randint(0, 9), step, 1]
+                                 for _ in range(random.randint(1, 3))]
+                index[key] = expected[key]
+            elif key in expected:
+                del expected[key]
+                del index[key]
+        self.assertEqual(list(expected.items()), list(index.items()))
+        self.assertEqual(sorted(expected), index.scan())
+
+        alternatives = {}
+        for key in expected:
+            alternatives.setdefault(key.casefold(), []).append(key)
+        for lower_key, keys in alternatives.items():
+            self.assertEqual(keys, index.alternatives[lower_key])
+
+        file = io.BytesIO()
+        index.dump(file)
+        file.seek(0)
+        loaded = KeyIndex.load(file)
+        self.assertEqual(list(expected.items()), list(loaded.items()))
+        loaded['new'] = [1]
+        self.assertEqual([1], loaded['new'])
+        self.assertEqual(len(expected) + 1, len(loaded))
+
+    def test_scan(self):
+        random.seed(1)
+        index = KeyIndex()
+        keys = set()
+        for i in range(3000):
+            key = random.choice(['a', 'ab', 'b', 'ß', 'Ω']) + str(i)
+            keys.add(key)
+            index[key] = [i]
+        for key in random.sample(sorted(keys), 2000):
+            keys.remove(key)
+            del index[key]
+        index._compact()
+        keys = sorted(keys)
+        self.assertEqual(keys, index.scan())
+
+        for prefix in ['', 'a', 'ab1', 'ß', 'c']:
+            for start_after in [None, 'a', 'ab5', 'ß', 'Ω9']:
+                expected = [key for key in keys if key.startswith(prefix)
+                            and (start_after is None or key > start_after)]
+                self.assertEqual(expected, index.scan(prefix, start_after))
+                self.assertEqual(expected[:10],
+                                 index.scan(prefix, start_after, 10))
+
+        file = io.BytesIO()
+        index.dump(file)
+        file.seek(0)
+        self.assertEqual(keys, KeyIndex.load(file).scan())
@@ -0,0 +1,39 @@
+import unittest
+import asyncio
+from Modules.key_order import KeyOrder
+
+
+class KeyOrderTests(unittest.IsolatedAsyncioTestCase):
+    async def test_order(self):
+        order = KeyOrder()
+        events = []
+        release = asyncio.Event()
+
+        async def operation(name, wait=False):
+            events.append(f'{name} start')
+            if wait:
+                await release.wait()
+            await asyncio.sleep(0)
+            events.append(f'{name} end')
+            return name
+
+        first = asyncio.create_task(order.run(['a'], operation('a1', True)))
+        second = asyncio.create_task(order.run(['a'], operation('a2')))
+        other = asyncio.create_task(order.run(['b'], operation('b')))
+        listing = asyncio.create_task(order.run((), operation('list')))
+        await asyncio.gather(other, listing)
+        self.assertNotIn('a2 start', events)
+        self.assertIn('a1 start', events)
+
+        exclusive = asyncio.create_task(order.run(None, operation('all')))
+        last = asyncio.create_task(order.run(['b'], operation('b2')))
+        await asyncio.sleep(0.01)
+        self.assertNotIn('all start', events)
+        release.set()
+        self.assertEqual(['a1', 'a2', 'all', 'b2'],
+                         await asyncio.gather(first, second, exclusive, last))
+        self.assertLess(events.index('a1 end'), events.index('a2 start'))
+        self.assertLess(events.index('a2 end'), events.index('all start'))
+        self.assertLess(events.index('all end'), events.index('b2 start'))
+        self.assertEqual({}, order._tails)
+        self.assertIsNone(order._barrier)
@@ -0,0 +1,161 @@
+import unittest
+import gc
+import os
+import shutil
+from node import LogNode, Node, open_node
+
+
+class LogNodeTest(unittest.TestCase):
+    PATH = 'testLogDir'
+
+    def setUp(self):
+        if not os.path.isdir(self.PATH):
+            os.mkdir(self.PATH)
+        self.nodes = []
+
+    def tearDown(self):
+        for node in self.nodes:
+            node.close()
+        if os.path.isdir(self.PATH):
+            shutil.rmtree(self.PATH)
+
+    def open(self, segment_size=1024):
+        node = LogNode(self.PATH, segment_size)
+        self.nodes.append(node)
+        return node
+
+    def test_write_read(self):
+        node = self.open()
+        node['asdf'] = 'elrk'
+        node['Asdf'] = 'qwer'
+        self.assertListEqual(['elrk'], node['asdf'])
+        self.assertListEqual(['elrk', 'qwer'], node.get_value('ASDF', False))
+        self.assertListEqual(['lr'], node.get_value('asdf', True, (1, 3)))
+        new_node = self.open()
+        self.assertListEqual(['qwer'], new_node['Asdf'])
+        self.assertEqual(2, len(new_node))
+
+    def test_replace_and_delete(self):
+        node = self.open()
+        node['1'] = 'asdf'
+        node['1'] = 'sdfg'
+        node['2'] = 'zxcv'
+        node.del_data('2')
+        self.assertListEqual(['sdfg'], node['1'])
+        with self.assertRaises(ValueError):
+            t = node['2']
+        new_node = self.open()
+        self.assertListEqual(['1'], list(new_node))
+        with self.assertRaises(ValueError):
+            new_node.del_data('2')
+
+    def test_rotation_and_merge(self):
+        node = self.open(segment_size=256)
+        for i in range(100):
+            node[str(i)] = str(i) * 10
+        for i in range(0, 100, 2):
+            node.del_data(str(i))
+        for i in range(1, 100, 4):
+            node[str(i)] = 'new'
+        self.assertLess(2, len(node.storage.total_bytes))
+        self.assertLess(0, node.storage.merge())
+        self.assertEqual(0, node.storage.garbage_ratio())
+        for i in range(100):
+            if i % 2 == 0:
+                self.assertFalse(str(i) in node)
+            elif i % 4 == 1:
+                self.assertListEqual(['new'], node[str(i)])
+            else:
+                self.assertListEqual([str(i) * 10], node[str(i)])
+        node.close()
+        new_node = self.open(segment_size=256)
+        self.assertEqual(50, len(new_node))
+        self.assertListEqual(['new'], new_node['97'])
+        self.assertListEqual([str(99) * 10], new_node['99'])
+
+    def test_committed_merge_is_installed_at_start(self):
+        node = self.open(segment_size=64)
+        for i in range(20):
+            node[str(i)] = 'value'
+        for i in range(10):
+            node.del_data(str(i))
+        storage = node.storage
+        ids = sorted(storage.total_bytes)[:-1]
+        live = [(key, location) for key, location in storage.index.items()
+                if location[0] in ids]
+        storage._write_merged(ids[-1], ids, live)
+        node.close()
+        new_node = self.open(segment_size=64)
+        self.assertEqual(10, len(new_node))
+        for i in range(10, 20):
+            self.assertListEqual(['value'], new_node[str(i)])
+        self.assertFalse(any(name.endswith('.merge') or name.endswith('.done')
+                             for name in os.listdir(storage.dir_path)))
+
+    def test_torn_tail(self):
+        node = self.open()
+        node['1'] = 'asdf'
+        node['2'] = 'zxcv'
+        node.close()
+        path = node.storage._path(1, '.data')
+        with open(path, 'rb+') as file:
+            file.truncate(os.path.getsize(path) - 1)
+        new_node = self.open()
+        self.assertListEqual(['1'], list(new_node))
+        new_node['3'] = 'qwer'
+        self.assertListEqual(['qwer'], self.open()['3'])
+
+    def test_scan(self):
+        node = self.open()
+        for key in ['b', 'a2', 'a1', 'c']:
+            node[key] = key
+        self.assertEqual(['a1', 'a2', 'b', 'c'], node.scan())
+        self.assertEqual(['a2'], node.scan('a', 'a1'))
+        self.assertEqual(['a2', 'b'], list(node.iter_keys('', 'a1', 1))[:2])
+        node.del_data('a2')
+        node['a3'] = 'a3'
+        self.assertEqual(['a1', 'a3'], node.scan('a'))
+        node.close()
+        node = self.open()
+        self.assertEqual(['a3', 'b'], node.scan('', 'a1', 2))
+
+    def test_clear(self):
+        node = self.open()
+        node['1'] = 'asdf'
+        node.clear()
+        self.assertEqual(0, len(node))
+        self.assertEqual(0, len(self.open()))
+
+    def test_open_node(self):
+        node = open_node(self.PATH, 'log')
+        self.nodes.append(node)
+        self.assertIsInstance(node, LogNode)
+        node['1'] = 'asdf'
+        self.nodes.append(open_node(self.PATH))
+        self.assertIsInstance(self.nodes[-1], LogNode)
+        with self.assertRaises(ValueError):
+            open_node(self.PATH, 'sfc')
+        with self.assertRaises(ValueError):
+            Node(self.PATH)
+
+    def test_bytes(self):
+        node = self.open()
+        node.put_bytes('binary', bytes(range(256)))
+        self.assertEqual(bytes(range(256)), node.get_bytes('binary'))
+        self.assertEqual(b'\x01\x02', node.get_bytes('binary', (1, 3)))
+        self.assertTrue(node.contains_key('BINARY', False))
+        node.put_bytes('Binary', b'other')
+        self.assertEqual([b'\x01\x02', b'th'], list(map(
+            bytes, node.get_all_bytes('BINARY', (1, 3)))))
+
+    def test_writer(self):
+        node = self.open()
+        with node.open_writer('key') as writer:
+            writer.write(b'new ')
+            writer.write(b'value')
+        self.assertEqual(['new value'], node['key'])
+        writer = node.open_writer('key')
+        writer.write(b'partial')
+        del writer
+        gc.collect()
+        self.assertEqual(['new value'], node['key'])
@@ -0,0 +1,108 @@
+import unittest
+import shutil
+import tempfile
+import threading
+from Modules.MainNodeClient import MainNodeClient
+from Modules.connection_pool import ConnectionPool
+
+
+class MainNodeClientTests(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.client = MainNodeClient(self.path, True, workers=2)
+
+    def tearDown(self):
+        self.client.disconnect_all()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_executor(self):
+        threads = set()
+
+        def work(item):
+            threads.add(threading.get_ident())
+            return item * 2
+
+        self.assertEqual([0, 2, 4], self.client.map(work, range(3)))
+        executor = self.client._executor
+        self.assertEqual([6], self.client.map(work, [3]))
+        self.assertIs(executor, self.client._executor)
+        self.assertLessEqual(len(threads), 2)
+        self.assertEqual({'workers': 2, 'pending': 0, 'max_pending': 3,
+                          'submitted': 4}, self.client.get_stats())
+
+        with self.assertRaises(ZeroDivisionError):
+            self.client.map(lambda item: 1 / item, [1, 0])
+        self.assertEqual(0, self.client.get_stats()['pending'])
+
+        self.client.disconnect_all()
+        self.assertIsNone(self.client._executor)
+        self.assertEqual([2], self.client.map(work, [1]))
+
+    def test_ping_is_pipelined(self):
+        log = []
+
+        class Answer:
+            def __init__(self, index):
+                self.index = index
+
+            def result(self):
+                log.append(('wait', self.index))
+
+        class Connection:
+            shared = True
+
+            def __init__(self, index):
+                self.index = index
+
+            def submit(self, opcode):
+                log.append(('ping', self.index))
+                return Answer(self.index)
+
+            def close(self):
+                pass
+
+        self.client.nodes = [ConnectionPool(lambda i=i: Connection(i))
+                             for i in range(2)]
+        self.client.inactive_indexes = set()
+        self.client.ping()
+        self.assertEqual([('ping', 0), ('ping', 1), ('wait', 0), ('wait', 1)],
+                         log)
+        self.assertEqual(set(), self.client.inactive_indexes)
+
+    def use_node(self, connection):
+        self.client.nodes = [ConnectionPool(lambda: connection)]
+        self.client.nodes_data = [('localhost', 0)]
+        self.client.inactive_indexes = set()
+        self.client.storage.add_nodes_data('localhost', 0)
+
+    def test_node_errors(self):
+        class Connection:
+            shared = True
+
+            def __init__(self):
+                self.keys = {'a', 'bad'}
+
+            def delete(self, keys):
+                for key in keys:
+                    if key == 'bad':
+                        raise ValueError('disk error')
+                    if key not in self.keys:
+                        raise ValueError("key doesn't exists")
+                    self.keys.remove(key)
+
+            def write(self, key, value):
+                raise ValueError('key is to big')
+
+            def close(self):
+                pass
+
+        connection = Connection()
+        self.use_node(connection)
+        self.assertEqual({'bad': 'disk error'}, self.client.delete_pure_keys(
+            0, 'missing', 'a', 'bad'))
+        self.assertEqual({'bad'}, connection.keys)
+        self.assertEqual(['bad'], self.client.storage.get_keys_to_delete(0))
+
+        with self.assertRaisesRegex(ValueError, 'key is to big'):
+            self.client.add_key_with_composition('key', 'value', [0])
+        self.assertNotIn('key', self.client)
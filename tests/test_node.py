@@ -1,7 +1,12 @@
 import unittest
+import gc
 import os
 import shutil
+import threading
+from unittest import mock
 from node import Node
+from Modules.single_file_controller import SFC
+import Modules.parse as Parser
 
 
 class NodeTest(unittest.TestCase):
@@ -18,8 +23,8 @@ class NodeTest(unittest.TestCase):
     def test_creation(self):
         node = Node(self.PATH)
         node.clear()
-        self.assertDictEqual({}, node.info.transitions)
-        self.assertListEqual([], node.info.sizes)
+        self.assertEqual(0, len(node.info.transitions))
+        self.assertListEqual([], list(node.info.sizes))
 
     def test_write(self):
         node = Node(self.PATH)
@@ -138,6 +143,59 @@ class NodeTest(unittest.TestCase):
             t = node['bar']
         self.assertEqual(['3'], node['baz'])
 
+    def test_write_multiple_batch(self):
+        node = Node(self.PATH)
+        node.clear()
+        node['replaced'] = 'old'
+        data = {str(i): str(i) * (i % 7) for i in range(300)}
+        data['replaced'] = 'new'
+        data['long'] = 'x' * 10000
+
+        with mock.patch.object(SFC, '_write_tables', autospec=True,
+                               side_effect=SFC._write_tables) as write:
+            node.write_multiple(**data)
+        touched = {location[0] for key in data
+                   for location in node.info.transitions[key]}
+        self.assertEqual(len(touched) + 1, write.call_count)
+
+        for key, value in data.items():
+            self.assertEqual([value], node[key])
+        node = Node(self.PATH)
+        self.assertEqual(len(data), len(node))
+        self.assertEqual(['new'], node['replaced'])
+        self.assertEqual(['x' * 10000], node['long'])
+
+    def test_write_multiple_compacted_batch(self):
+        node = Node(self.PATH)
+        node.clear()
+        node['g'] = 'G' * 305
+        node['k'] = 'O' * 100
+        node['b'] = 'B' * 200
+        node['h'] = 'H' * 100
+        node['c'] = 'C' * 100
+        node['f'] = 'F' * 2135
+        node.del_multiple(True, 'g', 'h')
+        # the second value fits only after compaction which moves the
+        # first one
+        node.write_multiple(k='N' * 100, z='Z' * 306)
+        self.assertEqual(['N' * 100], node['k'])
+        self.assertEqual(['Z' * 306], node['z'])
+        node.close()
+        self.assertEqual(['N' * 100], Node(self.PATH)['k'])
+
+    def test_del_multiple_batch(self):
+        node = Node(self.PATH)
+        node.clear()
+        node.write_multiple(**{str(i): str(i) for i in range(100)})
+        with self.assertRaises(ValueError):
+            node.del_multiple(True, '1', 'missing')
+        self.assertEqual(100, len(node))
+
+        node.del_multiple(True, *map(str, range(50)))
+        node = Node(self.PATH)
+        self.assertEqual(set(map(str, range(50, 100))), set(node))
+        self.assertEqual(['99'], node['99'])
+
     def test_del_multiple_register(self):
         node = Node(self.PATH)
         node.clear()
@@ -184,3 +242,415 @@ class NodeTest(unittest.TestCase):
         os.remove(node._path(0))
         with self.assertRaises(ValueError):
             node.del_data('1')
+
+    def test_fix_lazy(self):
+        node = Node(self.PATH)
+        node.clear()
+        node['1'] = 'z' * 5000
+        node['2'] = 'asdf'
+        os.remove(node._path(0))
+        with mock.patch('os.path.isfile') as isfile, \
+                mock.patch('os.scandir') as scandir:
+            self.assertEqual(2, len(node))
+            self.assertEqual({'1', '2'}, set(node))
+        isfile.assert_not_called()
+        scandir.assert_not_called()
+
+        self.assertEqual([0], node.check_files())
+        self.assertEqual([], node.check_files())
+        self.assertEqual(['2'], list(node))
+
+    def test_fix_on_open(self):
+        node = Node(self.PATH)
+        node.clear()
+        node['1'] = 'z' * 5000
+        node['2'] = 'asdf'
+        node.close()
+        os.remove(os.path.join(self.PATH, '0'))
+        node = Node(self.PATH)
+        self.assertEqual(['2'], list(node))
+        node.write_multiple(**{str(i): 'x' * 1000 for i in range(3, 10)})
+        self.assertEqual(8, len(node))
+
+    def test_compact(self):
+        node = Node(self.PATH)
+        node.clear()
+        for i in range(200):
+            node[str(i)] = str(i) * 10
+        for i in range(0, 200, 2):
+            node.del_data(str(i))
+        self.assertLess(0, node.compact())
+        self.assertEqual(0, node.compact())
+        for i in range(1, 200, 2):
+            self.assertListEqual([str(i) * 10], node[str(i)])
+        new_node = Node(self.PATH)
+        self.assertListEqual([str(199) * 10], new_node['199'])
+
+    def test_background_compaction(self):
+        node = Node(self.PATH)
+        node.clear()
+        for i in range(50):
+            node[str(i)] = 'value'
+        for i in range(0, 50, 3):
+            node.del_data(str(i))
+        node.start_compaction(interval=0.01, budget=100)
+        for i in range(50, 100):
+            node[str(i)] = 'value'
+        node.stop_compaction()
+        self.assertIsNone(node._compaction)
+        for i in range(100):
+            if i < 50 and i % 3 == 0:
+                self.assertFalse(str(i) in node)
+            else:
+                self.assertListEqual(['value'], node[str(i)])
+
+    def test_block_size(self):
+        value = 'x' * 10000
+        node = Node(self.PATH, block_size=16 * 1024)
+        node['big'] = value
+        self.assertListEqual([0], [location[0] for location
+                                   in node.info.transitions['big']])
+        new_node = Node(self.PATH)
+        self.assertEqual(16 * 1024, new_node.info.block_size)
+        self.assertListEqual([value], new_node['big'])
+
+    def test_migrate(self):
+        node = Node(self.PATH)
+        node.clear()
+        for i in range(20):
+            node[str(i)] = str(i) * 500
+        node['Key'] = 'value'
+        node.migrate(32 * 1024)
+        self.assertEqual(32 * 1024, node.info.block_size)
+        self.assertEqual(1, len(node.info.sizes))
+        for i in range(20):
+            self.assertListEqual([str(i) * 500], node[str(i)])
+        self.assertListEqual(['value'], node.get_value('KEY', False))
+        node.migrate(None)
+        self.assertIsNone(Node(self.PATH).info.block_size)
+        self.assertListEqual([str(19) * 500], Node(self.PATH)['19'])
+        self.assertFalse(os.path.exists(self.PATH + '.migrate'))
+        self.assertFalse(os.path.exists(self.PATH + '.old'))
+
+    def test_volume(self):
+        node = Node(self.PATH, volume=True)
+        for i in range(30):
+            node[str(i)] = str(i) * 300
+        node.del_data('3')
+        files = os.listdir(self.PATH)
+        self.assertIn('0.pack', files)
+        self.assertFalse(any(name.isdigit() for name in files))
+        new_node = Node(self.PATH)
+        self.assertIsNotNone(new_node.volume)
+        self.assertEqual(29, len(new_node))
+        self.assertListEqual([str(29) * 300], new_node['29'])
+        self.assertLess(0, new_node.compact())
+        new_node.migrate(volume=False)
+        self.assertIsNone(new_node.volume)
+        self.assertListEqual([str(29) * 300], Node(self.PATH)['29'])
+
+    def test_volume_missing_pack(self):
+        node = Node(self.PATH, volume=True)
+        node['1'] = 'asdf'
+        os.remove(os.path.join(self.PATH, '0.pack'))
+        self.assertEqual(1, len(node))
+        node.file_cache.invalidate()
+        with self.assertRaises(ValueError):
+            t = node['1']
+        node._repair.join()
+        self.assertEqual(0, len(node))
+        node['2'] = 'qwer'
+        self.assertListEqual(['qwer'], Node(self.PATH)['2'])
+
+    def test_file_cache(self):
+        node = Node(self.PATH, file_cache_size=2)
+        node.clear()
+        node['1'] = 'x' * 5000
+        misses = node.file_cache.misses
+        with mock.patch('os.stat') as stat:
+            self.assertListEqual(['x' * 5000], node['1'])
+        stat.assert_not_called()
+        self.assertEqual(misses, node.file_cache.misses)
+        self.assertLess(0, node.file_cache.hits)
+        self.assertEqual(2, len(node.file_cache))
+        node['2'] = 'y' * 5000
+        self.assertEqual(2, len(node.file_cache))
+        self.assertListEqual(['x' * 5000], node['1'])
+        self.assertEqual(misses + 2, node.file_cache.misses)
+
+    def test_file_cache_invalidation(self):
+        node = Node(self.PATH)
+        node.clear()
+        node['1'] = 'asdf'
+        self.assertListEqual(['asdf'], node['1'])
+        os.remove(os.path.join(self.PATH, '0'))
+        self.assertListEqual(['asdf'], node['1'])
+        node.file_cache.invalidate()
+        with self.assertRaises(ValueError):
+            t = node['1']
+        node._repair.join()
+        self.assertListEqual([], list(node))
+        node['3'] = 'qwer'
+        self.assertListEqual(['qwer'], node['3'])
+        node.clear()
+        self.assertEqual(0, len(node.file_cache))
+        node['4'] = 'zxcv'
+        self.assertListEqual(['zxcv'], Node(self.PATH)['4'])
+        node.close()
+
+    def test_durability_always(self):
+        node = Node(self.PATH, durability='always')
+        with mock.patch('os.fsync', wraps=os.fsync) as fsync:
+            node['1'] = 'asdf'
+            self.assertLessEqual(3, fsync.call_count)
+            calls = fsync.call_count
+            node.del_data('1')
+            self.assertLess(calls, fsync.call_count)
+        self.assertFalse(node._dirty_files)
+        self.assertEqual(node._committed, node._synced)
+
+    def test_durability_batch(self):
+        node = Node(self.PATH, durability='batch', batch_interval=0.05,
+                    batch_size=1000)
+        syncs = []
+        original_sync = node._sync
+        node._sync = lambda paths: syncs.append(1) or original_sync(paths)
+
+        def write(thread):
+            for i in range(5):
+                node[f'{thread}-{i}'] = 'value'
+
+        threads = [threading.Thread(target=write, args=(thread,))
+                   for thread in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(len(syncs), 40)
+        self.assertEqual(node._committed, node._synced)
+        self.assertEqual(40, len(Node(self.PATH)))
+
+    def test_durability_volume(self):
+        node = Node(self.PATH, volume=True, durability='always')
+        node.write_multiple(**{str(i): str(i) * 3000 for i in range(4)})
+        self.assertLess(1, len(node.info.sizes))
+        node._dirty_files.update(range(len(node.info.sizes)))
+        with mock.patch('os.fsync', wraps=os.fsync) as fsync:
+            node.compact()
+        self.assertEqual(3, fsync.call_count)
+        self.assertEqual(node._committed, node._synced)
+
+    def test_wrong_durability(self):
+        with self.assertRaises(ValueError):
+            Node(self.PATH, durability='sometimes')
+
+    def test_locations(self):
+        node = Node(self.PATH)
+        node.clear()
+        for i in range(10):
+            node[str(i)] = str(i) * 100
+        self.assertListEqual([[0, 210, 103]], node.info.transitions['2'])
+        node.del_data('0')
+        node.compact()
+        with mock.patch('Modules.parse.get_key',
+                        wraps=Parser.get_key) as get_key:
+            self.assertListEqual(['2' * 100], node['2'])
+            self.assertListEqual([[0, 105, 103]], node.info.transitions['2'])
+            calls = get_key.call_count
+            self.assertListEqual(['2' * 100], node['2'])
+            self.assertEqual(calls + 1, get_key.call_count)
+
+    def test_legacy_locations(self):
+        node = Node(self.PATH)
+        node.clear()
+        node['1'] = 'x' * 5000
+        node.info.transitions['1'] = [location[0] for location
+                                      in node.info.transitions['1']]
+        self.assertListEqual(['x' * 5000], node['1'])
+        self.assertIsInstance(node.info.transitions['1'][0], list)
+        node.info.transitions['1'] = [location[0] for location
+                                      in node.info.transitions['1']]
+        node.del_data('1')
+        self.assertListEqual([3070, 3070], list(node.info.sizes))
+
+    def test_range_reads_needed_chunks(self):
+        node = Node(self.PATH)
+        node.clear()
+        value = ''.join(chr(ord('a') + i % 26) for i in range(8000))
+        node['key'] = value
+        self.assertEqual(3, len(node.info.transitions['key']))
+        for boundary in ((0, 10), (3060, 3080), (5000, None), (None, -5),
+                         (-100, None), (7000, 100), (None, None)):
+            self.assertListEqual([value[slice(*boundary)]],
+                                 node.get_value('key', True, boundary))
+        with mock.patch.object(node, '_find_chunk',
+                               wraps=node._find_chunk) as find_chunk:
+            node.get_value('key', True, (4000, 4100))
+            self.assertEqual(1, find_chunk.call_count)
+
+    def test_streams(self):
+        node = Node(self.PATH)
+        node.clear()
+        node['key'] = 'old'
+        value = bytes(ord('a') + i % 26 for i in range(10000))
+        with node.open_writer('key') as writer:
+            for i in range(0, len(value), 1000):
+                writer.write(value[i:i + 1000])
+            self.assertListEqual(['old'], node['key'])
+        self.assertListEqual([value.decode()], node['key'])
+        self.assertEqual(4, len(node.info.transitions['key']))
+
+        with node.open_reader('key') as reader:
+            self.assertEqual(value, reader.read())
+            reader.seek(3000)
+            self.assertEqual(value[3000:3100], reader.read(100))
+            buffer = bytearray(50)
+            reader.seek(-50, 2)
+            self.assertEqual(50, reader.readinto(buffer))
+            self.assertEqual(value[-50:], buffer)
+            self.assertEqual(b'', reader.read())
+
+        sizes = list(node.info.sizes)
+        with self.assertRaises(RuntimeError):
+            with node.open_writer('key') as writer:
+                writer.write(b'x' * 5000)
+                raise RuntimeError()
+        self.assertListEqual(sizes, list(node.info.sizes[:len(sizes)]))
+        self.assertListEqual([value.decode()], Node(self.PATH)['key'])
+
+        writer = node.open_writer('key')
+        writer.write(b'x' * 5000)
+        del writer
+        gc.collect()
+        self.assertListEqual(sizes, list(node.info.sizes[:len(sizes)]))
+        self.assertListEqual([value.decode()], node['key'])
+
+    def test_stream_chunks_moved_by_compaction(self):
+        node = Node(self.PATH)
+        node.clear()
+        node['a'] = 'A' * 100
+        locations = []
+        node._write_chunk('key', b'new', locations)
+        node['key'] = 'old'
+        node.del_data('a')
+        self.assertLess(0, node.compact())
+        node._finish_value('key', b' value', locations)
+        self.assertListEqual(['new value'], node['key'])
+        self.assertListEqual(['new value'], Node(self.PATH)['key'])
+
+        with self.assertRaises(ValueError):
+            node.open_writer('k' * node.capacity)
+
+    def test_bytes(self):
+        node = Node(self.PATH)
+        node.clear()
+        data = bytes(range(256)) * 40
+        node.put_bytes('binary', data)
+        self.assertEqual(data, node.get_bytes('binary'))
+        self.assertEqual(data[100:5000], node.get_bytes('binary', (100, 5000)))
+        node.put_bytes('Binary', b'other')
+        self.assertEqual([data[1:3], b'th'], list(map(
+            bytes, node.get_all_bytes('BINARY', (1, 3)))))
+        with self.assertRaises(ValueError):
+            node.get_all_bytes('missing')
+        node.put_bytes('binary', memoryview(b'short'))
+        view = node.get_bytes('binary')
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(b'short', view)
+        node['text'] = 'значение'
+        self.assertEqual('значение'.encode(), node.get_bytes('text'))
+        node.migrate(4096)
+        self.assertEqual(b'short', node.get_bytes('binary'))
+        with self.assertRaises(ValueError):
+            node.get_bytes('missing')
+
+    def test_value_cache(self):
+        node = Node(self.PATH, value_cache_size=100)
+        node.clear()
+        node['a'] = 'x' * 60
+        node['b'] = 'y' * 60
+        self.assertEqual(['x' * 60], node['a'])
+        self.assertEqual(['x' * 60], node['a'])
+        self.assertEqual(['xxx'], node.get_value('a', boundary=(0, 3)))
+        self.assertEqual(['y' * 60], node['b'])
+        stats = node.get_stats()['value_cache']
+        self.assertEqual(2, stats['hits'])
+        self.assertEqual(1, stats['evictions'])
+        self.assertEqual(60, stats['bytes'])
+
+        node['b'] = 'z'
+        self.assertEqual(['z'], node['b'])
+        node.write_multiple(b='w')
+        self.assertEqual(['w'], node['b'])
+        node.del_data('b')
+        with self.assertRaises(ValueError):
+            node['b']
+        node.clear()
+        self.assertEqual(0, node.get_stats()['value_cache']['values'])
+        self.assertTrue(node.process_args(
+            Node.get_parser().parse_args(['--stats'])))
+
+    def test_free_space_index(self):
+        node = Node(self.PATH)
+        node.clear()
+
+        def assert_index():
+            self.assertEqual(sorted((size, i) for i, size
+                                    in enumerate(node.info.sizes)),
+                             node._free_order)
+
+        for i in range(100):
+            node[str(i)] = str(i) * (i * 7 % 500)
+        assert_index()
+        node.del_multiple(True, *map(str, range(0, 100, 3)))
+        node.compact()
+        assert_index()
+        size = node.info.sizes[1]
+        self.assertEqual(min(i for i, s in enumerate(node.info.sizes)
+                             if s == size),
+                         node._get_best_file_index(size))
+        self.assertIsNone(node._get_best_file_index(node.capacity + 1))
+        node = Node(self.PATH)
+        assert_index()
+
+    def test_scan(self):
+        node = Node(self.PATH)
+        node.clear()
+        keys = sorted(f'key{i}' for i in range(25)) + ['other']
+        node.write_multiple(**{key: key for key in keys})
+        self.assertEqual(keys, node.scan())
+        self.assertEqual(['key1', 'key10'], node.scan('key1', None, 2))
+        self.assertEqual(['key12', 'key13'], node.scan('key1', 'key11', 2))
+        self.assertEqual(keys, list(node.iter_keys(page_size=4)))
+        self.assertEqual(keys[3:-1],
+                         list(node.iter_keys('key', keys[2], 5)))
+
+        parser = Node.get_parser()
+        self.assertEqual(['key19', 'key2'], node.process_args(
+            parser.parse_args(['-l', '--start_after', 'key18',
+                               '--limit', '2'])))
+        self.assertEqual(['other'], list(node.process_args(
+            parser.parse_args(['-l', '--prefix', 'o']))))
+        node = Node(self.PATH)
+        self.assertEqual(keys, node.scan())
+
+    def test_replace_after_compaction(self):
+        node = Node(self.PATH)
+        node.clear()
+        node.put_bytes('d', b'D' * 100)
+        node.put_bytes('k', b'1' * 100)
+        node.del_data('d')
+        node.compact()
+        node.put_bytes('k', b'2' * 100)
+        self.assertEqual(b'2' * 100, bytes(node.get_bytes('k')))
+
+        node.put_bytes('e', b'E' * 100)
+        node.write_multiple(m='3' * 100)
+        node.del_data('e')
+        node.compact()
+        node.write_multiple(m='4' * 100)
+        self.assertEqual(['4' * 100], node.get_value('m'))
+
+        node = Node(self.PATH)
+        self.assertEqual(b'2' * 100, bytes(node.get_bytes('k')))
+        self.assertEqual(['4' * 100], node.get_value('m'))
@@ -0,0 +1,69 @@
+import unittest
+import socket
+from Modules.node_connection import NodeConnection
+from Modules.socket_controller import recv
+import Modules.protocol as protocol
+
+
+class NodeConnectionTests(unittest.TestCase):
+    def setUp(self):
+        self.sock, self.node = socket.socketpair()
+        self.connection = NodeConnection(self.sock)
+
+    def tearDown(self):
+        self.connection.close()
+        self.node.close()
+
+    def read_request(self):
+        request_id, opcode, flags, key_length, value_length = \
+            protocol.REQUEST_STRUCT.unpack(
+                recv(self.node, protocol.REQUEST_STRUCT.size))
+        key = recv(self.node, key_length).decode('utf8')
+        return request_id, opcode, key, recv(self.node, value_length)
+
+    def answer(self, request_id, payload, status=protocol.STATUS_OK):
+        self.node.sendall(protocol.ANSWER_STRUCT.pack(
+            request_id, status, len(payload)) + payload)
+
+    def test_answers_out_of_order(self):
+        first = self.connection.submit(protocol.OP_READ, 'a')
+        second = self.connection.submit(protocol.OP_WRITE, 'b', b'\x00\xff')
+        third = self.connection.submit(protocol.OP_READ, 'c')
+        requests = [self.read_request() for _ in range(3)]
+        self.assertEqual((protocol.OP_WRITE, 'b', b'\x00\xff'),
+                         requests[1][1:])
+
+        self.answer(requests[2][0], b'c value')
+        self.assertEqual(b'c value', third.result(1))
+        self.assertFalse(first.done())
+        self.answer(requests[1][0], b'')
+        self.answer(requests[0][0], b'no key', protocol.STATUS_ERROR)
+        self.assertEqual(b'', second.result(1))
+        with self.assertRaisesRegex(ValueError, 'no key'):
+            first.result(1)
+
+    def test_lost_connection_in_answer(self):
+        first = self.connection.submit(protocol.OP_READ, 'a')
+        second = self.connection.submit(protocol.OP_READ, 'b')
+        self.assertFalse(first.cancel())
+        request_id = self.read_request()[0]
+        self.read_request()
+        self.answer(request_id, b'\xff\xfe', protocol.STATUS_ERROR)
+        with self.assertRaises(ValueError):
+            first.result(1)
+        self.node.sendall(protocol.ANSWER_STRUCT.pack(request_id, 0, 10)
+                          + b'abc')
+        self.node.close()
+        with self.assertRaisesRegex(socket.error, 'connection was lost'):
+            second.result(1)
+        with self.assertRaises(socket.error):
+            self.connection.submit(protocol.OP_PING)
+
+    def test_lost_connection(self):
+        waiting = self.connection.submit(protocol.OP_PING)
+        self.read_request()
+        self.node.close()
+        with self.assertRaises(socket.error):
+            waiting.result(1)
+        with self.assertRaises(socket.error):
+            self.connection.submit(protocol.OP_PING)
@@ -0,0 +1,94 @@
+import unittest
+import os
+import shutil
+import socket
+import threading
+import time
+from NodeServer import NodeServer
+from Modules.node_connection import connect, TextConnection
+import Modules.protocol as protocol
+
+
+class NodeServerTests(unittest.TestCase):
+    PATH = 'testServerDir'
+
+    def setUp(self):
+        os.mkdir(self.PATH)
+        with socket.socket() as sock:
+            sock.bind(('localhost', 0))
+            self.address = sock.getsockname()
+        self.server = threading.Thread(
+            target=NodeServer, args=(self.PATH, *self.address), daemon=True)
+        self.server.start()
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                self.connection = connect(self.address)
+                break
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def tearDown(self):
+        self.connection.shut()
+        self.server.join(5)
+        self.connection.close()
+        shutil.rmtree(self.PATH, ignore_errors=True)
+
+    def test_read_ignoring_register(self):
+        self.connection.write('Key', b'first')
+        self.connection.write('KEY', b'second')
+        self.assertEqual(b'first', self.connection.read('Key'))
+        self.assertEqual({b'first', b'second'},
+                         set(self.connection.read_all('key')))
+        self.assertEqual({b'ir', b'ec'},
+                         set(self.connection.read_all('key', (1, 3))))
+        with self.assertRaises(ValueError):
+            self.connection.read('key')
+
+    def test_failed_request(self):
+        future = self.connection.submit(protocol.OP_DELETE_MULTIPLE,
+                                        value=b'\x01')
+        with self.assertRaisesRegex(ValueError, 'error'):
+            future.result(5)
+        self.connection.ping()
+
+    def open_text(self):
+        connection = TextConnection(socket.create_connection(self.address))
+        self.addCleanup(connection.close)
+        return connection
+
+    def test_text_errors(self):
+        connection = self.open_text()
+        connection.write('k', 'ключ'.encode('utf8'))
+        self.assertEqual(["Error: key doesn't exists"],
+                         connection.request('-r nope'))
+        self.assertEqual(1, len(connection.request('-r k -g 1 2')))
+        self.assertTrue(connection.request('-r k -g 1 2')[0]
+                        .startswith('Error: '))
+        self.assertEqual('ключ'.encode('utf8'), connection.read('k'))
+        with self.assertRaisesRegex(ValueError, "^key doesn't exists$"):
+            connection.delete(['nope'])
+
+    def test_concurrent_connections(self):
+        errors = []
+
+        def work(number):
+            try:
+                connection = self.open_text()
+                for i in range(20):
+                    key = f'{number}-{i}'
+                    connection.write(key, key.encode('utf8'))
+                    self.assertEqual(key.encode('utf8'), connection.read(key))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(number,))
+                   for number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        self.assertEqual(80, len(self.open_text().request('-l')))
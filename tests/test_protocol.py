@@ -0,0 +1,23 @@
+import unittest
+import Modules.protocol as protocol
+
+
+class ProtocolTests(unittest.TestCase):
+    def test_request(self):
+        data = protocol.pack_request(7, protocol.OP_WRITE, 'ключ'.encode(),
+                                     b'\x00\xff', protocol.FLAG_RANGE)
+        header = data[:protocol.REQUEST_STRUCT.size]
+        self.assertEqual((7, protocol.OP_WRITE, protocol.FLAG_RANGE, 8, 2),
+                         protocol.REQUEST_STRUCT.unpack(header))
+        self.assertEqual('ключ'.encode() + b'\x00\xff',
+                         data[protocol.REQUEST_STRUCT.size:])
+
+    def test_values(self):
+        self.assertEqual((3, 10),
+                         protocol.unpack_range(protocol.pack_range((3, 10))))
+        keys = ['a', '', 'ключ', 'b c']
+        self.assertEqual(keys, protocol.unpack_keys(protocol.pack_keys(keys)))
+        self.assertEqual([], protocol.unpack_keys(protocol.pack_keys([])))
+        values = [b'\x00\xff', b'', 'значение'.encode()]
+        self.assertEqual(values, protocol.unpack_values(
+            protocol.pack_values(values)))
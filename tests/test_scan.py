@@ -0,0 +1,14 @@
+import unittest
+from Modules.scan import scan_sorted
+
+
+class ScanTests(unittest.TestCase):
+    def test_scan_sorted(self):
+        keys = ['a', 'ab', 'abc', 'b', 'ba']
+        self.assertEqual(keys, scan_sorted(keys))
+        self.assertEqual(['ab', 'abc'], scan_sorted(keys, 'ab'))
+        self.assertEqual(['abc'], scan_sorted(keys, 'ab', 'ab'))
+        self.assertEqual(['ab', 'abc'], scan_sorted(keys, 'ab', 'a'))
+        self.assertEqual(['b', 'ba'], scan_sorted(keys, '', 'abc', 5))
+        self.assertEqual(['a'], scan_sorted(keys, limit=1))
+        self.assertEqual([], scan_sorted(keys, 'c'))
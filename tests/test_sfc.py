@@ -38,6 +38,14 @@ class SFCTests(unittest.TestCase):
             num_of_empty = randint(0, 2)
             self.run_boundary_test(size, is_empty, num_of_empty)
 
+    def test_encoding_layout(self):
+        self.assertEqual((0x5f, 0xe8),
+                         SFC._get_encoded_boundary_descriptor(3070, 0, True))
+        self.assertEqual((0xdf, 0xea),
+                         SFC._get_encoded_boundary_descriptor(3070, 2, False))
+        self.assertEqual(b'\x00\x1f\xff\xff\xf0\x00',
+                         bytes(SFC._encode_empty_table([0, 4094, 4094])))
+
     def run_empty_table_test(self, exp_table):
         table = SFC._decode_empty_table(SFC._encode_empty_table(exp_table))
         self.assertListEqual(exp_table, table)
@@ -144,6 +152,22 @@ class SFCTests(unittest.TestCase):
         unpackes_datas = [struct.unpack('h', d)[0] for d in actual_datas]
         self.assertListEqual(datas, unpackes_datas)
 
+    def test_write_del_batch(self):
+        file = SFC(self.PATH, create_new=True)
+        local_indexes = file.write_multiple(
+            [(1, b'first'), (2, [b'sec', b'ond']), (1, b'third')])
+        self.assertEqual(3, len(local_indexes))
+        file.del_multiple_at([(1, local_indexes[0])])
+        file.close()
+
+        file = SFC(self.PATH, file.size)
+        self.assertEqual([b'second'], file.get_data(2))
+        self.assertEqual([b'third'], file.get_data(1))
+        file.del_multiple_at([(1, local_indexes[2]), (2, local_indexes[1])])
+        self.assertIsNone(file.get_data(1))
+        self.assertIsNone(file.get_data(2))
+        self.assertEqual(1, len(file.empties))
+
     def test_del_no_collisions(self):
         file = SFC(self.PATH, create_new=True)
         file.write_data(data=bytes(1), index=1)
@@ -185,3 +209,122 @@ class SFCTests(unittest.TestCase):
         exp = bytes(3070)
         act = file.get_data(1)[0]
         self.assertEqual(exp, act)
+
+    def test_mapped_write_read(self):
+        with SFC(self.PATH, create_new=True, mapped=True) as file:
+            file.write_data(data=bytes(3), index=1)
+            file.write_data(data=b'abc', index=1)
+            self.assertListEqual([bytes(3), b'abc'], file.get_data(1))
+        file = SFC(self.PATH)
+        self.assertListEqual([bytes(3), b'abc'], file.get_data(1))
+
+    def test_mapped_recomposition(self):
+        with SFC(self.PATH, create_new=True, mapped=True) as file:
+            file.write_data(data=b'a', index=1)
+            file.write_data(data=b'bb', index=2)
+            file.write_data(data=b'c', index=3)
+            file.del_data(2, 0)
+            file.recompose()
+            self.assertEqual([b'a'], file.get_data(1))
+            self.assertEqual([b'c'], file.get_data(3))
+        with SFC(self.PATH, mapped=True) as file:
+            self.assertEqual([b'c'], file.get_data(3))
+
+    def test_coalesce_empty_spots(self):
+        file = SFC(self.PATH, create_new=True)
+        file.write_data(data=bytes(1), index=1)
+        file.write_data(data=bytes(2), index=2)
+        file.write_data(data=bytes(1), index=3)
+        file.del_data(3, 0)
+        file.del_data(1, 0)
+        self.assertListEqual([0, 7], sorted(file.empties))
+        file.del_data(2, 0)
+        self.assertListEqual([0], file.empties)
+        reopened = SFC(self.PATH)
+        self.assertDictEqual({0: file.file_length - 2},
+                             reopened._free_blocks)
+
+    def test_best_fit_without_recomposition(self):
+        file = SFC(self.PATH, create_new=True)
+        for index in range(1, 5):
+            file.write_data(data=bytes(10 * index), index=index)
+        file.del_data(2, 0)
+        file.del_data(3, 0)
+        self.assertEqual(12, file._get_index_of_suitable_spot(50))
+        file.write_data(data=bytes(50), index=5)
+        self.assertEqual([12], file.transitions[5])
+        self.assertEqual(bytes(40), file.get_data(4)[0])
+
+    def test_compact_moves_only_needed_records(self):
+        file = SFC(self.PATH, create_new=True)
+        for index in range(1, 6):
+            file.write_data(data=bytes([index]) * 100, index=index)
+        file.del_data(1, 0)
+        file.del_data(3, 0)
+        moved = file.compact(150)
+        self.assertEqual(102, moved)
+        self.assertListEqual([0], file.transitions[2])
+        self.assertListEqual([306], file.transitions[4])
+        self.assertEqual(file._get_index_of_suitable_spot(150), 102)
+        reopened = SFC(self.PATH)
+        for index in (2, 4, 5):
+            self.assertEqual(bytes([index]) * 100, reopened.get_data(index)[0])
+
+    def test_compact_whole_file(self):
+        file = SFC(self.PATH, create_new=True)
+        for index in range(1, 6):
+            file.write_data(data=bytes([index]) * 100, index=index)
+        file.del_data(2, 0)
+        file.del_data(4, 0)
+        file.compact()
+        self.assertListEqual([306], file.empties)
+        self.assertEqual(file.file_length - 308, file.size)
+        self.assertEqual(0, file.compact())
+        for index in (1, 3, 5):
+            self.assertEqual(bytes([index]) * 100, file.get_data(index)[0])
+
+    def test_compact_budget(self):
+        file = SFC(self.PATH, create_new=True)
+        for index in range(1, 6):
+            file.write_data(data=bytes([index]) * 100, index=index)
+        file.del_data(1, 0)
+        self.assertEqual(102, file.compact(budget=50))
+        self.assertListEqual([0], file.transitions[2])
+        self.assertListEqual([102, 510], sorted(file.empties))
+        self.assertEqual(bytes([3]) * 100, SFC(self.PATH).get_data(3)[0])
+
+    def test_v2_boundary(self):
+        descriptor = SFC._get_encoded_boundary_descriptor_v2(70000, 3, False)
+        self.assertEqual(5, len(descriptor))
+        self.assertTupleEqual((False, 70000, 3),
+                              SFC._get_info_from_bytes_v2(descriptor))
+        self.assertTupleEqual((True, 5, 0), SFC._get_info_from_bytes_v2(
+            SFC._get_encoded_boundary_descriptor_v2(5, 0, True)))
+
+    def test_v2_tables(self):
+        empties, transitions = [0, 70000], {5: [100000], -3: [7, 9]}
+        self.assertTupleEqual((empties, transitions),
+                              SFC._get_tables_from_bytes_v2(
+                                  SFC._get_encoded_tables_v2(empties,
+                                                             transitions)))
+
+    def test_v2_write_read(self):
+        file = SFC(self.PATH, create_new=True, block_size=64 * 1024)
+        self.assertEqual(2, file.version)
+        self.assertEqual(64 * 1024 - 5, file.size)
+        data = bytes(range(256)) * 100
+        file.write_data(data=data, index=7)
+        file.write_data(data=b'short', index=7)
+        file.del_data(7, 1)
+        for mapped in (False, True):
+            with SFC(self.PATH, mapped=mapped) as reopened:
+                self.assertEqual(64 * 1024, reopened.block_size)
+                self.assertListEqual([data], reopened.get_data(7))
+        with open(self.PATH, 'rb') as raw:
+            self.assertEqual(b'SF\x02', raw.read(3))
+
+    def test_block_size_range(self):
+        with self.assertRaises(ValueError):
+            SFC(self.PATH, create_new=True, block_size=100)
+        self.assertEqual(1, SFC(self.PATH, create_new=True).version)
+        self.assertIsNone(SFC(self.PATH).block_size)
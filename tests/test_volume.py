@@ -0,0 +1,42 @@
+import unittest
+import os
+import shutil
+from Modules.volume import Volume
+from Modules.single_file_controller import SFC, get_slot_size
+
+
+class VolumeTest(unittest.TestCase):
+    PATH = 'testVolumeDir'
+
+    def setUp(self):
+        if not os.path.isdir(self.PATH):
+            os.mkdir(self.PATH)
+
+    def tearDown(self):
+        if os.path.isdir(self.PATH):
+            shutil.rmtree(self.PATH)
+
+    def test_bitmap(self):
+        volume = Volume(self.PATH, 16, slots_per_pack=4)
+        self.assertListEqual([0, 1], [volume.allocate(i) for i in range(2)])
+        self.assertEqual(9, volume.allocate(9))
+        self.assertIn(9, volume)
+        self.assertNotIn(2, volume)
+        reopened = Volume(self.PATH, 16, slots_per_pack=4)
+        self.assertListEqual([0, 1, 9], list(reopened))
+        self.assertListEqual([2, 3, 4, 5, 6, 7, 8], reopened.get_missing(9))
+        self.assertEqual(64, os.path.getsize(os.path.join(self.PATH,
+                                                          '2.pack')))
+
+    def test_slots(self):
+        volume = Volume(self.PATH, get_slot_size(), slots_per_pack=2)
+        for number in range(3):
+            path, offset = volume.locate(volume.allocate(number))
+            with SFC(path, create_new=True, offset=offset) as file:
+                for index in range(20):
+                    file.write_data(data=bytes([number]) * 10, index=index)
+        for number in range(3):
+            path, offset = volume.locate(number)
+            with SFC(path, offset=offset) as file:
+                self.assertListEqual([bytes([number]) * 10],
+                                     file.get_data(19))